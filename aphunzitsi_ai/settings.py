@@ -185,6 +185,52 @@ LOGGING = {
     },
 }
 
+# AI generation tuning
+AI_GENERATION_MAX_WORKERS = 8  # Shared thread pool size for concurrent LLM calls
+AI_LEVEL_DEADLINE_SECONDS = 12  # Wall-clock budget for all AI items of one level
+AI_INVENTORY_WATERMARK = 20  # Ready items kept per (game, difficulty, age band, topic) bucket
+AI_CONNECT_TIMEOUT_SECONDS = 3  # Connect timeout for LLM provider calls
+AI_READ_TIMEOUT_SECONDS = 10  # Read timeout for LLM provider calls
+AI_CLIENT_MAX_RETRIES = 0  # SDK retries per call; the breaker and back-fill handle failures
+AI_BREAKER_FAILURE_THRESHOLD = 5  # Consecutive failures/timeouts before the breaker opens
+AI_BREAKER_COOLDOWN_SECONDS = 30  # Open period before a single half-open probe
+AI_CACHE_VARIANTS = 3  # Distinct results kept and rotated per generation cache key
+AI_CACHE_TTL_SECONDS = 3600  # Lifetime of a generation cache entry
+AI_CACHE_MAX_KEYS = 2000  # Keys kept before least recently used ones are evicted
+AI_HTTP_MAX_CONNECTIONS = 20  # Connection pool size of the shared LLM HTTP client
+AI_HTTP_MAX_KEEPALIVE = 10  # Idle keep-alive connections kept in that pool
+AI_HTTP_KEEPALIVE_EXPIRY = 60  # Seconds an idle keep-alive connection is reused
+AI_PROVIDER = 'groq'  # 'groq', 'openai_compatible' (AI_PROVIDER_BASE_URL) or 'fake' (offline stand-in)
+AI_MODEL = 'llama-3.1-8b-instant'  # Model requested from the provider when AI_MODELS is empty
+AI_MODELS = [  # Models the router picks from, in order of preference until it has measurements
+    'llama-3.1-8b-instant',
+    'llama-3.3-70b-versatile',
+]
+AI_PROVIDER_BASE_URL = ''  # e.g. http://127.0.0.1:8765/v1 for the run_fake_llm_server stub
+AI_FAKE_LATENCY_MS = 400  # Fake provider: base latency per completion
+AI_FAKE_JITTER_MS = 200  # Fake provider: mean extra (exponential) latency
+AI_FAKE_ERROR_RATE = 0.0  # Fake provider: share of calls that fail
+AI_FAKE_MALFORMED_RATE = 0.0  # Fake provider: share of completions with broken JSON
+AI_FAKE_SEED = 0  # Fake provider: RNG seed
+AI_LEVEL_LOAD_BUDGET_SECONDS = 4  # Target wait for a level's AI items; slower providers get DB content mixed in
+AI_POLICY_WINDOW_SECONDS = 300  # Age of the latency samples the mixing policy looks at
+AI_POLICY_MIN_SAMPLES = 10  # Samples needed before the policy moves slots away from the AI
+AI_ROUTER_PRIOR_LATENCY_MS = 1500  # Assumed latency of a model the router has not measured yet
+AI_ROUTER_EXPLORE_RATE = 0.05  # Share of calls sent to a non-best model to keep its score current
+AI_HEDGE_ENABLED = True  # Send a duplicate request when a generation call runs into the latency tail
+AI_HEDGE_PERCENTILE = 0.9  # Recent-latency percentile after which a call is hedged
+AI_HEDGE_MIN_SAMPLES = 20  # Measurements a route needs before its calls are hedged
+AI_HEDGE_MAX_RATIO = 0.1  # Hedges allowed per call, at most (caps the extra spend)
+AI_HEDGE_MAX_WORKERS = 32  # Threads running sync attempts while they may be hedged
+MATH_LOCAL_TEMPLATE_RATIO = 0.8  # Share of math slots built by the local template engine; the rest go to the LLM
+MATH_BANK_PROBLEMS_PER_LEVEL = 20000  # Problems build_math_bank keeps in each level's database bank
+DB_SAMPLER_TTL_SECONDS = 300  # How long a worker reuses its cached id lists for random level content
+SEEN_CONTENT_MAX_ITEMS = 2000  # Row ids / content hashes remembered per learner and game (oldest dropped)
+SEEN_CONTENT_RECENT_TEXTS = 100  # Recent generated texts kept per learner for near-duplicate checks
+SEEN_CONTENT_TTL_SECONDS = 7 * 24 * 3600  # A learner's seen content is forgotten after this long without play
+WORD_SEARCH_PUZZLES_PER_PAIR = 200  # Puzzles farm_word_search keeps for each word-search level and category
+WORD_SEARCH_CATALOGUE_TTL_SECONDS = 300  # How long a worker reuses its in-memory word search catalogue
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'login'
@@ -195,3 +195,10 @@ admin.site.register(RiddleQuestion)
 admin.site.register(RiddleLevel)
 admin.site.register(RiddleGameSession)
 admin.site.register(UserRiddleProgress)
+
+@admin.register(AIInventoryItem)
+class AIInventoryItemAdmin(admin.ModelAdmin):
+    list_display = ['game', 'difficulty', 'age_band', 'topic', 'created_at']
+    list_filter = ['game', 'difficulty', 'age_band']
+    search_fields = ['topic']
+    readonly_fields = ['created_at']
@@ -0,0 +1,166 @@
+"""
+Circuit breakers and timeout policy shared by the Groq generator modules.
+
+Each (provider, model) pair has its own breaker, so one failing model does
+not cut off the others. After AI_BREAKER_FAILURE_THRESHOLD consecutive failed
+or timed-out calls to a model its breaker opens and calls to it fail fast with
+CircuitOpenError; the router ranks that model last, and once every model is
+open the game views go straight to their database/fallback content. Once
+AI_BREAKER_COOLDOWN_SECONDS have passed a single half-open probe is let
+through; its outcome closes the breaker again or restarts the cool-down.
+"""
+import asyncio
+import logging
+import threading
+import time
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the breaker is open"""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, cooldown=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                return HALF_OPEN
+            return self._state
+
+    def allow_request(self):
+        """Whether a call may go out now; claims the probe slot when half-open"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                self._state = HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info("Circuit '%s' closed after successful probe", self.name)
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning(
+                        "Circuit '%s' opened after %s consecutive failures; cooling down for %ss",
+                        self.name, self._failures, self.cooldown
+                    )
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def call(self, func, *args, **kwargs):
+        """Run `func` through the breaker, failing fast while it is open"""
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    async def acall(self, func, *args, **kwargs):
+        """Awaitable form of `call` for coroutine functions"""
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            # Cancelled is not failed; just hand back a claimed probe slot
+            with self._lock:
+                self._probe_in_flight = False
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+def get_client_timeout():
+    """Explicit connect/read timeouts for provider HTTP calls"""
+    return httpx.Timeout(
+        getattr(settings, 'AI_READ_TIMEOUT_SECONDS', 10),
+        connect=getattr(settings, 'AI_CONNECT_TIMEOUT_SECONDS', 3)
+    )
+
+
+def get_client_max_retries():
+    """SDK-level retries; kept low so the breaker sees failures promptly"""
+    return getattr(settings, 'AI_CLIENT_MAX_RETRIES', 0)
+
+
+class ModelBreakers:
+    """One CircuitBreaker per (provider, model), created on first use"""
+
+    def __init__(self):
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, model, provider=None):
+        key = (provider or getattr(settings, 'AI_PROVIDER', 'groq'), model)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(key)
+                if breaker is None:
+                    breaker = CircuitBreaker(
+                        '/'.join(key),
+                        failure_threshold=getattr(settings, 'AI_BREAKER_FAILURE_THRESHOLD', 5),
+                        cooldown=getattr(settings, 'AI_BREAKER_COOLDOWN_SECONDS', 30)
+                    )
+                    self._breakers[key] = breaker
+        return breaker
+
+    def is_open(self, model, provider=None):
+        return self.get(model, provider).state == OPEN
+
+    def all_open(self, models, provider=None):
+        """Whether every one of `models` is cooling down"""
+        return bool(models) and all(self.is_open(model, provider) for model in models)
+
+    def reset(self):
+        with self._lock:
+            self._breakers.clear()
+
+    def snapshot(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.state for breaker in breakers}
+
+
+model_breakers = ModelBreakers()
@@ -0,0 +1,157 @@
+"""
+Content-addressed cache in front of the AI generators.
+
+Results are keyed on the generator and its normalized call parameters. Each
+key keeps up to AI_CACHE_VARIANTS distinct results: the first lookups of a
+key each fill a new variant from the LLM, later lookups rotate through the
+stored variants without any network call. Entries expire after
+AI_CACHE_TTL_SECONDS and the least recently used keys are evicted once
+AI_CACHE_MAX_KEYS is exceeded.
+
+Only single-item generators are cached. A learner's seen set rejects items
+already served to them, so a stored batch replayed to the same learner would
+turn every slot into a rejected one. Callers that need an item the learner
+has not seen (repeat retries) use `.uncached`.
+"""
+import copy
+import inspect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Log the hit ratio every this many lookups
+REPORT_EVERY = 100
+
+
+class VariantCache:
+    def __init__(self, variants=3, ttl=3600, max_keys=2000):
+        self.variants = variants
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key):
+        """Next stored variant for `key`, or None when another variant should be generated"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry['created'] > self.ttl:
+                del self._entries[key]
+                entry = None
+
+            if entry is None or len(entry['items']) < self.variants:
+                self.misses += 1
+                self._report()
+                return None
+
+            self._entries.move_to_end(key)
+            value = entry['items'][entry['cursor'] % len(entry['items'])]
+            entry['cursor'] += 1
+            self.hits += 1
+            self._report()
+            return copy.deepcopy(value)
+
+    def store(self, key, value):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {'created': time.monotonic(), 'items': [], 'cursor': 0}
+                self._entries[key] = entry
+            if len(entry['items']) < self.variants:
+                entry['items'].append(copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'keys': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hit_ratio(), 3),
+            }
+
+    def _report(self):
+        lookups = self.hits + self.misses
+        if lookups % REPORT_EVERY == 0:
+            logger.info(
+                "AI generation cache: %s hits / %s lookups (%.1f%%), %s keys",
+                self.hits, lookups, self.hit_ratio() * 100, len(self._entries)
+            )
+
+
+generation_cache = VariantCache(
+    variants=getattr(settings, 'AI_CACHE_VARIANTS', 3),
+    ttl=getattr(settings, 'AI_CACHE_TTL_SECONDS', 3600),
+    max_keys=getattr(settings, 'AI_CACHE_MAX_KEYS', 2000)
+)
+
+
+def normalize(value):
+    if isinstance(value, str):
+        return ' '.join(value.lower().split())
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(item) for item in value)
+    return value
+
+
+def cached_generation(func):
+    """
+    Serve `func` through the generation cache. Failed or empty results are
+    never stored. The undecorated generator stays reachable as `.uncached`
+    for callers that need fresh content every time (the inventory warmer).
+    """
+    signature = inspect.signature(func)
+    # Async twins (`*_async`) share cache entries with their sync generator
+    name = func.__name__.removesuffix('_async')
+
+    def make_key(args, kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return (func.__module__, name) + tuple(
+            (arg, normalize(value)) for arg, value in bound.arguments.items()
+        )
+
+    def remember(key, result):
+        # Partial batches (some slots None) are never stored either
+        if result and not (isinstance(result, list) and any(item is None for item in result)):
+            generation_cache.store(key, result)
+        return result
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = make_key(args, kwargs)
+            cached = generation_cache.lookup(key)
+            if cached is not None:
+                return cached
+            return remember(key, await func(*args, **kwargs))
+    else:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(args, kwargs)
+            cached = generation_cache.lookup(key)
+            if cached is not None:
+                return cached
+            return remember(key, func(*args, **kwargs))
+
+    wrapper.uncached = func
+    return wrapper
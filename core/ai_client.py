@@ -0,0 +1,133 @@
+"""
+Shared Groq client for the AI generator modules.
+
+The client is created on first use rather than at import time, and every
+provider reuses the same keep-alive HTTP connection pool so consecutive
+completions skip the TCP/TLS handshake. The async views get the same
+treatment through one pooled httpx.AsyncClient per event loop, closed when
+that loop shuts down (under WSGI every async view runs on a loop of its own).
+"""
+import asyncio
+import logging
+import os
+import threading
+import weakref
+import httpx
+from dotenv import load_dotenv
+from django.conf import settings
+from .ai_breaker import get_client_timeout, get_client_max_retries
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.RLock()
+_client_checked = False
+_http_client = None
+
+# Async connections belong to the event loop that opened them; under ASGI
+# that is one loop per process, under WSGI each async view gets its own.
+# loop -> (client, closer)
+_async_clients = weakref.WeakKeyDictionary()
+_async_groq_clients = weakref.WeakKeyDictionary()
+
+
+def get_api_key():
+    return os.getenv('GROQ_API_KEY') or getattr(settings, 'GROQ_API_KEY', None)
+
+
+def get_pool_limits():
+    """Connection pool limits for the shared HTTP client"""
+    return httpx.Limits(
+        max_connections=getattr(settings, 'AI_HTTP_MAX_CONNECTIONS', 20),
+        max_keepalive_connections=getattr(settings, 'AI_HTTP_MAX_KEEPALIVE', 10),
+        keepalive_expiry=getattr(settings, 'AI_HTTP_KEEPALIVE_EXPIRY', 60)
+    )
+
+
+def get_http_client():
+    """Return the shared keep-alive HTTP client used for provider calls"""
+    global _http_client
+    if _http_client is None:
+        with _client_lock:
+            if _http_client is None:
+                _http_client = httpx.Client(limits=get_pool_limits(), timeout=get_client_timeout())
+    return _http_client
+
+
+def get_client():
+    """Return the shared Groq client, or None when no API key is configured"""
+    global _client, _client_checked
+    if not _client_checked:
+        with _client_lock:
+            if not _client_checked:
+                api_key = get_api_key()
+                if api_key:
+                    # Imported here so loading the URLconf does not pay for the SDK
+                    from groq import Groq
+                    _client = Groq(
+                        api_key=api_key,
+                        timeout=get_client_timeout(),
+                        max_retries=get_client_max_retries(),
+                        http_client=get_http_client()
+                    )
+                else:
+                    logger.warning("GROQ_API_KEY not configured - AI generation will use fallbacks")
+                _client_checked = True
+    return _client
+
+
+async def _close_at_loop_shutdown(client):
+    """
+    Parked at its yield for the life of the loop. asyncio.run() (used by
+    asgiref's async_to_sync and by ASGI servers) calls
+    loop.shutdown_asyncgens() before closing the loop, which resumes it here.
+    """
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+def close_with_loop(client):
+    """Close `client` when the running loop shuts down; keep the returned closer referenced"""
+    closer = _close_at_loop_shutdown(client)
+    try:
+        # Runs the generator to its yield without awaiting, registering it with the loop
+        closer.asend(None).send(None)
+    except StopIteration:
+        pass
+    return closer
+
+
+def get_async_http_client():
+    """Return the keep-alive async HTTP client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is None:
+        with _client_lock:
+            entry = _async_clients.get(loop)
+            if entry is None:
+                client = httpx.AsyncClient(limits=get_pool_limits(), timeout=get_client_timeout())
+                entry = (client, close_with_loop(client))
+                _async_clients[loop] = entry
+    return entry[0]
+
+
+def get_async_client():
+    """Return an AsyncGroq client for the running event loop, or None without an API key"""
+    if get_client() is None:
+        return None
+    loop = asyncio.get_running_loop()
+    client = _async_groq_clients.get(loop)
+    if client is None:
+        from groq import AsyncGroq
+        client = AsyncGroq(
+            api_key=get_api_key(),
+            timeout=get_client_timeout(),
+            max_retries=get_client_max_retries(),
+            http_client=get_async_http_client()
+        )
+        _async_groq_clients[loop] = client
+    return client
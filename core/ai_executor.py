@@ -0,0 +1,244 @@
+"""
+Shared worker pool for fanning out AI generation calls, and the asyncio
+equivalents used by the async level views
+"""
+import asyncio
+import logging
+import threading
+import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from django.conf import settings
+from .ai_singleflight import level_flights, shuffled_copy
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process-wide generation pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                max_workers = getattr(settings, 'AI_GENERATION_MAX_WORKERS', 8)
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-gen')
+    return _executor
+
+
+def get_level_deadline():
+    """Wall-clock budget (seconds) for generating all AI items of one level"""
+    return getattr(settings, 'AI_LEVEL_DEADLINE_SECONDS', 12)
+
+
+def run_with_deadline(calls, deadline=None):
+    """
+    Run every callable on the shared pool and wait at most `deadline` seconds
+    for the whole batch.
+    Returns a list aligned with `calls`: the callable's result, or None for
+    slots that raised or were still pending when the deadline passed.
+    """
+    if not calls:
+        return []
+    if deadline is None:
+        deadline = get_level_deadline()
+
+    executor = get_executor()
+    futures = [executor.submit(call) for call in calls]
+    done, pending = wait(futures, timeout=deadline)
+
+    results = []
+    for index, future in enumerate(futures):
+        if future in pending:
+            # Queued work is dropped; calls already in flight finish in the background
+            future.cancel()
+            logger.warning("AI generation slot %s missed the %ss level deadline", index + 1, deadline)
+            results.append(None)
+            continue
+        try:
+            results.append(future.result())
+        except Exception as exc:
+            logger.error("AI generation slot %s failed: %s", index + 1, exc)
+            results.append(None)
+    return results
+
+
+def run_batch_with_backfill(batch_call, single_call, count, deadline=None, flight_key=None):
+    """
+    Fetch `count` items with one batched LLM call, then back-fill only the
+    slots it left invalid with single-item calls, all inside one deadline.
+    `batch_call(count)` returns a list aligned with the slots (None = invalid);
+    `single_call(slot)` returns the item for a 0-based slot.
+    Returns `count` items, with None where nothing valid arrived in time.
+    """
+    results = [None] * max(count, 0)
+    for slot, item in iter_batch_with_backfill(batch_call, single_call, count, deadline, flight_key):
+        results[slot] = item
+    return results
+
+
+def iter_batch_with_backfill(batch_call, single_call, count, deadline=None, flight_key=None):
+    """
+    Streaming form of run_batch_with_backfill: yields (slot, item) pairs as
+    soon as each slot is settled, so callers can send items on before the
+    slowest back-fill returns. Every slot is yielded exactly once; item is
+    None when nothing valid arrived before the deadline.
+    With a `flight_key`, concurrent identical requests are coalesced: the
+    first one generates and the others receive a shuffled copy of its items.
+    """
+    if count <= 0:
+        return
+    if deadline is None:
+        deadline = get_level_deadline()
+
+    if flight_key is None:
+        yield from generate_batch_with_backfill(batch_call, single_call, count, deadline)
+        return
+
+    key = flight_key + (count,)
+    flight, leader = level_flights.join(key)
+    if not leader:
+        shared = flight.result if flight.wait(deadline) else None
+        items = shuffled_copy(shared or [None] * count)
+        yield from enumerate(items)
+        return
+
+    results = [None] * count
+    try:
+        for slot, item in generate_batch_with_backfill(batch_call, single_call, count, deadline):
+            results[slot] = item
+            yield slot, item
+    finally:
+        # Also publishes partial results if the caller stopped early
+        level_flights.finish(key, flight, result=results)
+
+
+def generate_batch_with_backfill(batch_call, single_call, count, deadline):
+    """Uncoalesced body of iter_batch_with_backfill"""
+    started = time.monotonic()
+    batch = run_with_deadline([partial(batch_call, count)], deadline)[0]
+    results = list(batch or [])[:count]
+    results += [None] * (count - len(results))
+
+    missing = []
+    for slot, item in enumerate(results):
+        if item is None:
+            missing.append(slot)
+        else:
+            yield slot, item
+
+    remaining = deadline - (time.monotonic() - started)
+    if not missing or remaining <= 0:
+        for slot in missing:
+            yield slot, None
+        return
+
+    logger.info("Back-filling %s of %s batch slots", len(missing), count)
+    executor = get_executor()
+    futures = {executor.submit(single_call, slot): slot for slot in missing}
+    settled = set()
+    try:
+        for future in as_completed(futures, timeout=remaining):
+            slot = futures[future]
+            settled.add(slot)
+            try:
+                yield slot, future.result()
+            except Exception as exc:
+                logger.error("AI back-fill slot %s failed: %s", slot + 1, exc)
+                yield slot, None
+    except FuturesTimeoutError:
+        logger.warning("%s back-fill slots missed the %ss level deadline", len(futures) - len(settled), deadline)
+    for future, slot in futures.items():
+        if slot not in settled:
+            future.cancel()
+            yield slot, None
+
+
+
+async def gather_with_deadline(coros, deadline=None):
+    """
+    Async form of run_with_deadline: await every coroutine concurrently for
+    at most `deadline` seconds. Returns a list aligned with `coros`, with
+    None for slots that raised or were still pending at the deadline.
+    """
+    if not coros:
+        return []
+    if deadline is None:
+        deadline = get_level_deadline()
+
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+
+    results = []
+    for index, task in enumerate(tasks):
+        if task in pending:
+            task.cancel()
+            logger.warning("AI generation slot %s missed the %ss level deadline", index + 1, deadline)
+            results.append(None)
+            continue
+        try:
+            results.append(task.result())
+        except Exception as exc:
+            logger.error("AI generation slot %s failed: %s", index + 1, exc)
+            results.append(None)
+    return results
+
+
+async def gather_batch_with_backfill(batch_call, single_call, count, deadline=None, flight_key=None):
+    """
+    Async form of run_batch_with_backfill: `batch_call(count)` and
+    `single_call(slot)` return coroutines. Coalesces with the sync callers
+    through the same flights when a `flight_key` is given.
+    """
+    if count <= 0:
+        return []
+    if deadline is None:
+        deadline = get_level_deadline()
+
+    if flight_key is None:
+        return await generate_batch_with_backfill_async(batch_call, single_call, count, deadline)
+
+    key = flight_key + (count,)
+    flight, leader = level_flights.join(key)
+    if not leader:
+        return shuffled_copy(await wait_for_flight(flight, deadline) or [None] * count)
+
+    results = None
+    try:
+        results = await generate_batch_with_backfill_async(batch_call, single_call, count, deadline)
+    finally:
+        level_flights.finish(key, flight, result=results or [None] * count)
+    return results
+
+
+async def wait_for_flight(flight, timeout, interval=0.05):
+    """Poll a flight from the event loop without parking a thread on it"""
+    waited = 0.0
+    while not flight.done.is_set():
+        if waited >= timeout:
+            return None
+        await asyncio.sleep(interval)
+        waited += interval
+    return flight.result
+
+
+async def generate_batch_with_backfill_async(batch_call, single_call, count, deadline):
+    """Uncoalesced body of gather_batch_with_backfill"""
+    started = time.monotonic()
+    batch = (await gather_with_deadline([batch_call(count)], deadline))[0]
+    results = list(batch or [])[:count]
+    results += [None] * (count - len(results))
+
+    missing = [slot for slot, item in enumerate(results) if item is None]
+    remaining = deadline - (time.monotonic() - started)
+    if not missing or remaining <= 0:
+        return results
+
+    logger.info("Back-filling %s of %s batch slots", len(missing), count)
+    backfilled = await gather_with_deadline([single_call(slot) for slot in missing], remaining)
+    for slot, item in zip(missing, backfilled):
+        results[slot] = item
+    return results
@@ -0,0 +1,202 @@
+"""
+Hedged completions to cut the latency tail of AI generation.
+
+A call that has not returned after the AI_HEDGE_PERCENTILE latency of its
+route (task, difficulty, single/batch) gets a duplicate request. The
+duplicate goes to the router's next-best model, or to the same model over
+another pooled connection when only one is configured. The first attempt
+that returns a valid, parsed item wins. The async path cancels the loser;
+the sync path stops waiting for it and lets it finish in the background.
+
+Hedges are paid for from a token bucket that earns AI_HEDGE_MAX_RATIO
+tokens per call, so hedging adds at most that share of extra requests.
+Routes with fewer than AI_HEDGE_MIN_SAMPLES measurements are not hedged.
+"""
+import asyncio
+import logging
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+from .ai_metrics import current_usage, note_usage
+from .ai_policy import percentile
+from .ai_router import model_router
+
+logger = logging.getLogger(__name__)
+
+# Latencies kept per route for the hedge delay
+HEDGE_SAMPLES_KEPT = 200
+# Unused hedge tokens saved up for bursts
+HEDGE_BURST = 5
+
+
+class HedgePolicy:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._latencies = defaultdict(lambda: deque(maxlen=HEDGE_SAMPLES_KEPT))
+            self._tokens = 0.0
+            self.calls = 0
+            self.hedges = 0
+            self.hedge_wins = 0
+
+    def observe(self, route, latency_ms):
+        with self._lock:
+            self._latencies[route].append(latency_ms)
+
+    def delay(self, route):
+        """Seconds to wait before hedging a call on `route`, or None to not hedge"""
+        if not getattr(settings, 'AI_HEDGE_ENABLED', True):
+            return None
+        with self._lock:
+            samples = sorted(self._latencies[route])
+        if len(samples) < getattr(settings, 'AI_HEDGE_MIN_SAMPLES', 20):
+            return None
+        return percentile(samples, getattr(settings, 'AI_HEDGE_PERCENTILE', 0.9)) / 1000
+
+    def note_call(self):
+        with self._lock:
+            self.calls += 1
+            self._tokens = min(HEDGE_BURST, self._tokens + getattr(settings, 'AI_HEDGE_MAX_RATIO', 0.1))
+
+    def take_hedge(self):
+        """Spend a hedge token; False once the hedge budget is used up"""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            self.hedges += 1
+            return True
+
+    def note_hedge_win(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'hedge_ratio': round(self.hedges / self.calls, 3) if self.calls else 0.0,
+                'delays_ms': {
+                    '/'.join(route): round(percentile(sorted(samples), getattr(settings, 'AI_HEDGE_PERCENTILE', 0.9)), 1)
+                    for route, samples in self._latencies.items() if samples
+                },
+            }
+
+
+hedge_policy = HedgePolicy()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_hedge_executor():
+    """Pool the sync attempts run on, apart from the level generation pool"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'AI_HEDGE_MAX_WORKERS', 32),
+                    thread_name_prefix='ai-hedge'
+                )
+    return _executor
+
+
+def hedge_model(route, primary):
+    """The next-best model for `route`, or the primary when it is the only one"""
+    others = [model for model in model_router.ranked(route) if model != primary]
+    return others[0] if others else primary
+
+
+def with_usage(attempt, model):
+    # Attempts run in their own context; carry the winner's usage back
+    result = attempt(model)
+    return result, current_usage()
+
+
+def call_hedged(route, attempt):
+    """
+    Run `attempt(model)` for the routed model, hedging it with a second
+    model once it is slower than the route's hedge delay
+    """
+    primary = model_router.choose(route)
+    hedge_policy.note_call()
+    delay = hedge_policy.delay(route)
+    if delay is None:
+        return attempt(primary)
+
+    executor = get_hedge_executor()
+    futures = [executor.submit(with_usage, attempt, primary)]
+    done, pending = wait(futures, timeout=delay)
+    if pending and hedge_policy.take_hedge():
+        logger.info("Hedging %s call after %.0fms", '/'.join(route), delay * 1000)
+        futures.append(executor.submit(with_usage, attempt, hedge_model(route, primary)))
+
+    error = None
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result, usage = future.result()
+            except Exception as exc:
+                error = error or exc
+                continue
+            for other in pending:
+                # Not started yet: dropped; in flight: left to finish unobserved
+                other.cancel()
+            if future is not futures[0]:
+                hedge_policy.note_hedge_win()
+            if usage:
+                note_usage(*usage)
+            return result
+    raise error
+
+
+async def awith_usage(attempt, model):
+    result = await attempt(model)
+    return result, current_usage()
+
+
+async def acall_hedged(route, attempt):
+    """Async form of call_hedged; the losing attempt is cancelled"""
+    primary = model_router.choose(route)
+    hedge_policy.note_call()
+    delay = hedge_policy.delay(route)
+    if delay is None:
+        return await attempt(primary)
+
+    first = asyncio.ensure_future(awith_usage(attempt, primary))
+    tasks = [first]
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=delay)
+        if pending and hedge_policy.take_hedge():
+            logger.info("Hedging %s call after %.0fms", '/'.join(route), delay * 1000)
+            tasks.append(asyncio.ensure_future(awith_usage(attempt, hedge_model(route, primary))))
+
+        error = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = error or task.exception()
+                    continue
+                result, usage = task.result()
+                if task is not first:
+                    hedge_policy.note_hedge_win()
+                if usage:
+                    note_usage(*usage)
+                return result
+        raise error
+    finally:
+        # Also reached when the level deadline cancels this call
+        for task in tasks:
+            if not task.done():
+                task.cancel()
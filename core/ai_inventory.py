@@ -0,0 +1,97 @@
+"""
+Warm inventory of pre-generated AI content.
+
+Items are bucketed by (game, difficulty, age band, topic). The level
+endpoints pop ready-made items and only call the LLM inline when a bucket
+is empty; the warm_ai_inventory command keeps every bucket topped up.
+"""
+import logging
+from functools import partial
+from django.conf import settings
+from .models import AIInventoryItem
+from .game_utils import get_age_band
+from .ai_executor import run_with_deadline
+from .ai_metrics import ai_metrics
+
+logger = logging.getLogger(__name__)
+
+
+def get_watermark():
+    """Number of ready items each bucket should hold"""
+    return getattr(settings, 'AI_INVENTORY_WATERMARK', 20)
+
+
+def math_topic(operations, min_value, max_value):
+    """Inventory topic key for a math level's configuration"""
+    ops = ''.join(operations or ['+'])
+    return f"{ops} {min_value}-{max_value}"
+
+
+def get_bucket(game, difficulty, age_band, topic):
+    return AIInventoryItem.objects.filter(
+        game=game,
+        difficulty=difficulty,
+        age_band=age_band,
+        topic=topic[:100]
+    )
+
+
+def pop_items(game, difficulty, age, topic, count=1):
+    """
+    Claim up to `count` ready-made items for a player of the given age.
+    Claimed rows are deleted one by one so concurrent requests never serve
+    the same item twice.
+    """
+    if count <= 0:
+        return []
+
+    bucket = get_bucket(game, difficulty, get_age_band(age), topic)
+    candidates = list(bucket.values_list('pk', 'payload')[:count])
+
+    items = []
+    for pk, payload in candidates:
+        deleted, _ = AIInventoryItem.objects.filter(pk=pk).delete()
+        if deleted:
+            items.append(payload)
+            ai_metrics.record_tier(game, 'inventory')
+
+    if len(items) < count:
+        logger.info("AI inventory %s/%s/%s short by %s items", game, difficulty, topic, count - len(items))
+    return items
+
+
+def pop_item(game, difficulty, age, topic):
+    """Claim a single ready-made item, or None when the bucket is empty"""
+    items = pop_items(game, difficulty, age, topic, 1)
+    return items[0] if items else None
+
+
+def top_up(game, difficulty, age_band, topic, generate, watermark=None, deadline=120):
+    """
+    Generate items until the bucket holds `watermark` of them.
+    `generate` receives the item's slot number (starting at 1) and must raise
+    on failure so that fallback content never ends up in the inventory.
+    Returns the number of items added.
+    """
+    watermark = watermark or get_watermark()
+    missing = watermark - get_bucket(game, difficulty, age_band, topic).count()
+    if missing <= 0:
+        return 0
+
+    results = run_with_deadline(
+        [partial(generate, slot) for slot in range(1, missing + 1)],
+        deadline=deadline
+    )
+    new_items = [
+        AIInventoryItem(
+            game=game,
+            difficulty=difficulty,
+            age_band=age_band,
+            topic=topic[:100],
+            payload=payload
+        )
+        for payload in results
+        if payload is not None
+    ]
+    AIInventoryItem.objects.bulk_create(new_items)
+    return len(new_items)
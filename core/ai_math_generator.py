@@ -1,29 +1,20 @@
 import json
 import logging
-import os
-from dotenv import load_dotenv
-from groq import Groq
-from django.conf import settings
-
-load_dotenv()
+from .ai_providers import request_completion, request_completion_async
+from .ai_cache import cached_generation
+from .ai_metrics import instrumented
 
 logger = logging.getLogger(__name__)
 
-api_key = os.getenv('GROQ_API_KEY') or getattr(settings, 'GROQ_API_KEY', None)
-if api_key:
-    client = Groq(api_key=api_key)
-else:
-    client = None
-    logger.warning("GROQ_API_KEY not configured. Math AI generation will fall back to defaults.")
+SYSTEM_PROMPT = "You are a fun tutor who makes learning exciting by creating engaging math problems for children. Always respond with valid JSON."
 
+# Completion budget for batched requests
+BATCH_TOKENS_PER_ITEM = 200
+BATCH_MAX_TOKENS = 6000
 
-def generate_ai_math_problem(difficulty, operations, min_value, max_value, age, problem_number=1):
-    """
-    Generate an AI math problem with JSON structure similar to quiz logic.
-    """
-    if not client:
-        raise ValueError("Groq client not available.")
 
+def build_math_problem_request(difficulty, operations, min_value, max_value, age, problem_number=1):
+    """Completion request (request_completion keyword arguments) for one math problem"""
     ops = operations or ['+']
     ops_text = ", ".join(ops)
 
@@ -45,35 +36,149 @@ Return valid JSON with this structure:
 
 Ensure correct_answer is an integer and matches the problem.
 """
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[
+    return {
+        'task': 'math',
+        'messages': [
             {
                 "role": "system",
-                "content": "You are a fun tutor who makes learning exciting by creating engaging math problems for children. Always respond with valid JSON."
+                "content": SYSTEM_PROMPT
             },
             {
                 "role": "user",
                 "content": prompt
             }
         ],
-        temperature=0.8,
-        max_tokens=400,
-        response_format={"type": "json_object"}
-
-        # "llama-3.1-8b-instant",
-        # "llama-3.3-70b-versatile",
-        # "mixtral-8x7b-32768",
-        # "gemma2-9b-it"
-    )
+        'temperature': 0.8,
+        'max_tokens': 400,
+        'difficulty': difficulty
+    }
+
 
-    content = response.choices[0].message.content
+def parse_math_problem(content):
+    """Validate the completion for one math problem"""
     data = json.loads(content)
+    return validate_ai_math_problem(data)
+
+
+@cached_generation
+@instrumented('math')
+def generate_ai_math_problem(difficulty, operations, min_value, max_value, age, problem_number=1):
+    """
+    Generate an AI math problem with JSON structure similar to quiz logic.
+    """
+    return request_completion(
+        **build_math_problem_request(difficulty, operations, min_value, max_value, age, problem_number),
+        parse=parse_math_problem
+    )
+
+
+@cached_generation
+@instrumented('math')
+async def generate_ai_math_problem_async(difficulty, operations, min_value, max_value, age, problem_number=1):
+    """Async form of generate_ai_math_problem for the ASGI endpoints"""
+    return await request_completion_async(
+        **build_math_problem_request(difficulty, operations, min_value, max_value, age, problem_number),
+        parse=parse_math_problem
+    )
+
+
+def build_math_problems_batch_request(difficulty, operations, min_value, max_value, age, count, start_number=1):
+    """Completion request (request_completion keyword arguments) for `count` math problems"""
+    ops = operations or ['+']
+    ops_text = ", ".join(ops)
+
+    prompt = f"""
+Create {count} different {difficulty} level math problems that only use these operations: {ops_text}.
+Use whole numbers between {min_value} and {max_value}.
+Target age: {age}. Mix word-problems and expressions, and spread the problems across the operations.
+
+Return valid JSON with this structure:
+{{
+  "items": [
+    {{
+      "problem_text": "12 + 7",
+      "display_text": "12 + 7 = ?",
+      "correct_answer": 19,
+      "operation": "+",
+      "tip": "Add the numbers carefully.",
+      "hint": "Start by adding the tens first.",
+      "explanation": "12 plus 7 equals 19."
+    }}
+  ]
+}}
+
+The "items" array must contain exactly {count} problems.
+Ensure every correct_answer is an integer and matches its problem.
+"""
+    return {
+        'task': 'math',
+        'messages': [
+            {
+                "role": "system",
+                "content": SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        'temperature': 0.8,
+        'max_tokens': min(BATCH_TOKENS_PER_ITEM * count, BATCH_MAX_TOKENS),
+        'count': count,
+        'difficulty': difficulty
+    }
+
+
+def parse_math_problems_batch(result_text, count, start_number=1):
+    """Validate a batched completion into a slot-aligned list (None = invalid item)"""
+    items = json.loads(result_text).get('items')
+    if not isinstance(items, list):
+        raise ValueError("Batch response has no items array.")
+
+    results = []
+    for offset in range(count):
+        try:
+            results.append(validate_ai_math_problem(items[offset]))
+        except (IndexError, TypeError, ValueError) as exc:
+            logger.warning("Batch math problem %s invalid: %s", start_number + offset, exc)
+            results.append(None)
+    return results
+
+
+@instrumented('math')
+def generate_ai_math_problems_batch(difficulty, operations, min_value, max_value, age, count, start_number=1):
+    """
+    Generate `count` AI math problems in a single call.
+    Returns a list aligned with the requested slots; invalid items are None.
+    """
+    return request_completion(
+        **build_math_problems_batch_request(difficulty, operations, min_value, max_value, age, count, start_number),
+        parse=lambda result_text: parse_math_problems_batch(result_text, count, start_number)
+    )
+
+
+@instrumented('math')
+async def generate_ai_math_problems_batch_async(difficulty, operations, min_value, max_value, age, count, start_number=1):
+    """Async form of generate_ai_math_problems_batch for the ASGI endpoints"""
+    return await request_completion_async(
+        **build_math_problems_batch_request(difficulty, operations, min_value, max_value, age, count, start_number),
+        parse=lambda result_text: parse_math_problems_batch(result_text, count, start_number)
+    )
+
 
+def validate_ai_math_problem(data):
+    """Check required fields and coerce correct_answer to an exact integer."""
     required_keys = ['problem_text', 'display_text', 'correct_answer', 'operation']
-    if not all(key in data for key in required_keys):
+    if not isinstance(data, dict) or not all(key in data for key in required_keys):
         raise ValueError("AI math problem missing required fields.")
 
-    data['correct_answer'] = int(data['correct_answer'])
+    answer = data['correct_answer']
+    if isinstance(answer, bool):
+        raise ValueError("AI math problem answer is not an integer.")
+    if isinstance(answer, float):
+        if not answer.is_integer():
+            raise ValueError("AI math problem answer is not an integer.")
+        answer = int(answer)
+    data['correct_answer'] = int(answer)
     return data
 
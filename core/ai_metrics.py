@@ -0,0 +1,249 @@
+"""
+In-process instrumentation for the AI generation paths.
+
+Every generator call records its latency, model, token usage and outcome;
+the level endpoints record how long a whole level took and which tier each
+item came from (AI, database, canned fallback), and the inventory records
+its hits. Everything is aggregated per process and exposed by
+core.ai_views.get_ai_metrics.
+"""
+import contextvars
+import inspect
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from functools import wraps
+from .ai_breaker import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000]
+
+# Most recent call latencies kept per (task, model) for the mixing policy
+RECENT_CALLS_KEPT = 200
+
+OUTCOME_OK = 'ok'
+OUTCOME_INVALID_JSON = 'invalid_json'
+OUTCOME_VALIDATION = 'validation_failure'
+OUTCOME_TIMEOUT = 'timeout'
+OUTCOME_CIRCUIT_OPEN = 'circuit_open'
+OUTCOME_ERROR = 'error'
+
+# Tiers served because the AI could not be used; 'template' math problems are planned, not a fallback
+FALLBACK_TIERS = ('db', 'fallback', 'generated')
+
+
+class Histogram:
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-quantile, or the largest
+        observation for the overflow bucket (None when empty)
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.bounds[index] if index < len(self.bounds) else round(self.max, 1)
+        return round(self.max, 1)
+
+    def snapshot(self):
+        buckets = {f"le_{bound}": count for bound, count in zip(self.bounds, self.counts)}
+        buckets['le_inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count, 1) if self.count else None,
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'max_ms': round(self.max, 1),
+            'buckets': buckets,
+        }
+
+
+class AIMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.call_latency = defaultdict(Histogram)   # (task, model) -> Histogram
+            self.outcomes = defaultdict(int)             # (task, model, outcome) -> count
+            self.tokens = defaultdict(lambda: [0, 0])    # (task, model) -> [prompt, completion]
+            self.level_latency = defaultdict(Histogram)  # game -> Histogram
+            self.tiers = defaultdict(int)                # (game, tier) -> count
+            self.recent = defaultdict(lambda: deque(maxlen=RECENT_CALLS_KEPT))  # (task, model) -> (at, ms)
+            self.last_model = {}                         # task -> model of the latest answered call
+            self.started = time.time()
+
+    def record_call(self, task, model, outcome, latency_ms, prompt_tokens=0, completion_tokens=0):
+        with self._lock:
+            self.call_latency[(task, model)].observe(latency_ms)
+            self.outcomes[(task, model, outcome)] += 1
+            tokens = self.tokens[(task, model)]
+            tokens[0] += prompt_tokens or 0
+            tokens[1] += completion_tokens or 0
+            # Calls the breaker refused never reached a model and say nothing about its speed
+            if outcome != OUTCOME_CIRCUIT_OPEN and model != 'none':
+                self.recent[(task, model)].append((time.monotonic(), latency_ms))
+                self.last_model[task] = model
+
+    def recent_latencies(self, task, max_age=None):
+        """
+        Sorted latencies (ms) of the latest calls for `task` on the model it
+        last used, optionally only those from the last `max_age` seconds
+        """
+        with self._lock:
+            model = self.last_model.get(task)
+            if model is None:
+                return model, []
+            since = time.monotonic() - max_age if max_age else None
+            samples = [ms for at, ms in self.recent[(task, model)] if since is None or at >= since]
+        return model, sorted(samples)
+
+    def record_level(self, game, latency_ms):
+        with self._lock:
+            self.level_latency[game].observe(latency_ms)
+
+    def record_tier(self, game, tier):
+        with self._lock:
+            self.tiers[(game, tier)] += 1
+
+    def snapshot(self):
+        with self._lock:
+            calls = {}
+            for (task, model), histogram in self.call_latency.items():
+                prompt_tokens, completion_tokens = self.tokens[(task, model)]
+                calls[f"{task}/{model}"] = {
+                    'latency': histogram.snapshot(),
+                    'outcomes': {
+                        outcome: count
+                        for (t, m, outcome), count in self.outcomes.items()
+                        if (t, m) == (task, model)
+                    },
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                }
+
+            tiers = defaultdict(dict)
+            for (game, tier), count in self.tiers.items():
+                tiers[game][tier] = count
+            for game, counts in tiers.items():
+                # Inventory hits are also counted under 'ai' when served
+                served = sum(count for tier, count in counts.items() if tier != 'inventory')
+                if served:
+                    fell_back = sum(counts.get(tier, 0) for tier in FALLBACK_TIERS)
+                    counts['fallback_ratio'] = round(fell_back / served, 3)
+
+            return {
+                'since': self.started,
+                'calls': calls,
+                'levels': {game: histogram.snapshot() for game, histogram in self.level_latency.items()},
+                'tiers': dict(tiers),
+            }
+
+
+ai_metrics = AIMetrics()
+
+# The provider layer reports the model and token usage of the call in
+# flight here, so the generator-level wrapper can attach it to its record.
+# A context variable rather than a thread-local, so coroutines sharing the
+# event loop thread each see their own call
+_call_usage = contextvars.ContextVar('ai_call_usage', default=None)
+
+
+def note_usage(model, prompt_tokens=0, completion_tokens=0):
+    _call_usage.set((model, prompt_tokens, completion_tokens))
+
+
+def current_usage():
+    """The (model, prompt_tokens, completion_tokens) last noted in this context"""
+    return _call_usage.get()
+
+
+def classify_error(exc):
+    if isinstance(exc, json.JSONDecodeError):
+        return OUTCOME_INVALID_JSON
+    if isinstance(exc, CircuitOpenError):
+        return OUTCOME_CIRCUIT_OPEN
+    if isinstance(exc, TimeoutError) or 'timeout' in type(exc).__name__.lower():
+        return OUTCOME_TIMEOUT
+    if isinstance(exc, (ValueError, KeyError, TypeError)):
+        return OUTCOME_VALIDATION
+    return OUTCOME_ERROR
+
+
+def instrumented(task):
+    """Record latency, model, tokens and outcome of every call to a generator"""
+    def record(started, outcome):
+        model, prompt_tokens, completion_tokens = _call_usage.get() or ('none', 0, 0)
+        ai_metrics.record_call(
+            task, model, outcome, (time.monotonic() - started) * 1000,
+            prompt_tokens, completion_tokens
+        )
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                _call_usage.set(None)
+                started = time.monotonic()
+                outcome = OUTCOME_OK
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as exc:
+                    outcome = classify_error(exc)
+                    raise
+                finally:
+                    record(started, outcome)
+            return wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            _call_usage.set(None)
+            started = time.monotonic()
+            outcome = OUTCOME_OK
+            try:
+                return func(*args, **kwargs)
+            except Exception as exc:
+                outcome = classify_error(exc)
+                raise
+            finally:
+                record(started, outcome)
+        return wrapper
+    return decorator
+
+
+def track_level(game, items, started=None):
+    """
+    Pass a level's (source, item) generator through, recording the tier
+    each item was served from and the total time the level took.
+    `started` lets the async views count the AI round-trips they awaited
+    before handing over their results.
+    """
+    started = started if started is not None else time.monotonic()
+    try:
+        for source, item in items:
+            ai_metrics.record_tier(game, source)
+            yield source, item
+    finally:
+        ai_metrics.record_level(game, (time.monotonic() - started) * 1000)
@@ -0,0 +1,87 @@
+"""
+Latency-aware mixing of AI and database content for the level endpoints.
+
+Before a level is built, plan_ai_slots looks at the rolling p50/p95 latency
+of recent generator calls for that game on the model currently in use and
+decides how many slots to generate and how many to serve straight from the
+database bank:
+
+- p95 within AI_LEVEL_LOAD_BUDGET_SECONDS: every slot goes to the AI
+- p50 over the budget: slots the database can cover are served from it at once
+- in between: the AI gets the share of slots matching the share of recent
+  calls that finished within the budget
+
+Slots the database cannot cover always go to the AI. Until there are
+AI_POLICY_MIN_SAMPLES recent calls (cold start, or the provider has been
+skipped long enough for its samples to age out) every slot goes to the AI,
+so the policy keeps probing a provider that has recovered.
+"""
+import logging
+import math
+from django.conf import settings
+from .ai_breaker import model_breakers
+from .ai_metrics import ai_metrics
+from .ai_router import model_router
+
+logger = logging.getLogger(__name__)
+
+
+def get_level_load_budget():
+    """Seconds a child should wait, at most, for the AI part of a level"""
+    return getattr(settings, 'AI_LEVEL_LOAD_BUDGET_SECONDS', 4)
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of sorted samples"""
+    return samples[min(len(samples) - 1, max(0, math.ceil(q * len(samples)) - 1))]
+
+
+def latency_summary(game):
+    """Rolling p50/p95 (ms) for `game` on its current model"""
+    model, samples = ai_metrics.recent_latencies(game, getattr(settings, 'AI_POLICY_WINDOW_SECONDS', 300))
+    return {
+        'model': model,
+        'samples': len(samples),
+        'p50_ms': percentile(samples, 0.5) if samples else None,
+        'p95_ms': percentile(samples, 0.95) if samples else None,
+        'within_budget': (
+            round(sum(1 for ms in samples if ms <= get_level_load_budget() * 1000) / len(samples), 3)
+            if samples else None
+        ),
+    }
+
+
+def plan_ai_slots(game, slots, db_available, budget=None):
+    """
+    Number of the level's `slots` to fill from the AI; the rest are served
+    from the `db_available` database items.
+    """
+    if slots <= 0:
+        return 0
+    # Slots the database cannot cover are worth waiting for
+    floor = max(0, slots - db_available)
+
+    if model_breakers.all_open(model_router.models()):
+        return floor
+
+    budget_ms = (budget if budget is not None else get_level_load_budget()) * 1000
+    model, samples = ai_metrics.recent_latencies(game, getattr(settings, 'AI_POLICY_WINDOW_SECONDS', 300))
+    if len(samples) < getattr(settings, 'AI_POLICY_MIN_SAMPLES', 10):
+        return slots
+
+    p50, p95 = percentile(samples, 0.5), percentile(samples, 0.95)
+    if p95 <= budget_ms:
+        planned = slots
+    elif p50 > budget_ms:
+        planned = 0
+    else:
+        within = sum(1 for ms in samples if ms <= budget_ms) / len(samples)
+        planned = math.ceil(slots * within)
+
+    planned = max(planned, floor)
+    if planned < slots:
+        logger.info(
+            "%s on %s is slow (p50 %.0fms, p95 %.0fms, budget %.0fms): %s of %s slots from AI",
+            game, model, p50, p95, budget_ms, planned, slots
+        )
+    return planned
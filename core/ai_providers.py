@@ -0,0 +1,326 @@
+"""
+LLM providers behind the AI generator modules.
+
+The generators describe what they want (a task, chat messages and sampling
+options) and `request_completion` sends it to the provider selected by
+settings.AI_PROVIDER, through the circuit breaker of the chosen model:
+
+- 'groq': the hosted Groq API (default)
+- 'openai_compatible': any OpenAI-style /chat/completions endpoint at
+  AI_PROVIDER_BASE_URL, e.g. the local `run_fake_llm_server` stub
+- 'fake': an in-process deterministic stand-in with configurable latency,
+  error and malformed-JSON rates, for load tests without a network
+
+Every provider also has an awaitable `acomplete`, reached through
+`request_completion_async` from the async (ASGI) level views.
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from django.conf import settings
+from .ai_breaker import model_breakers
+from .ai_client import get_async_client, get_async_http_client, get_client, get_http_client
+from .ai_hedging import acall_hedged, call_hedged, hedge_policy
+from .ai_metrics import OUTCOME_CIRCUIT_OPEN, OUTCOME_OK, classify_error, note_usage
+from .ai_router import model_router, route_for
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "llama-3.1-8b-instant"
+
+
+class ProviderError(Exception):
+    """A provider call failed (simulated or upstream)"""
+
+
+class GroqProvider:
+    name = 'groq'
+
+    def available(self):
+        return get_client() is not None
+
+    def complete(self, task, messages, temperature=0.8, max_tokens=500, count=None, model=None):
+        response = get_client().chat.completions.create(
+            model=model or getattr(settings, 'AI_MODEL', DEFAULT_MODEL),
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"}
+        )
+        return self.read_response(response)
+
+    async def acomplete(self, task, messages, temperature=0.8, max_tokens=500, count=None, model=None):
+        response = await get_async_client().chat.completions.create(
+            model=model or getattr(settings, 'AI_MODEL', DEFAULT_MODEL),
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"}
+        )
+        return self.read_response(response)
+
+    def read_response(self, response):
+        usage = response.usage
+        note_usage(response.model, usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0)
+        return response.choices[0].message.content
+
+
+class OpenAICompatibleProvider:
+    name = 'openai_compatible'
+
+    def __init__(self, base_url, api_key=None):
+        self.base_url = (base_url or '').rstrip('/')
+        self.api_key = api_key
+
+    def available(self):
+        return bool(self.base_url)
+
+    def build_request(self, task, messages, temperature, max_tokens, count, model):
+        headers = {'Authorization': f"Bearer {self.api_key}"} if self.api_key else {}
+        return dict(
+            url=f"{self.base_url}/chat/completions",
+            headers=headers,
+            json={
+                'model': model or getattr(settings, 'AI_MODEL', DEFAULT_MODEL),
+                'messages': messages,
+                'temperature': temperature,
+                'max_tokens': max_tokens,
+                'response_format': {'type': 'json_object'},
+                # Lets the local stub shape its answer; real endpoints ignore it
+                'metadata': {'task': task, 'count': count},
+            }
+        )
+
+    def complete(self, task, messages, temperature=0.8, max_tokens=500, count=None, model=None):
+        response = get_http_client().post(
+            **self.build_request(task, messages, temperature, max_tokens, count, model)
+        )
+        return self.read_response(response)
+
+    async def acomplete(self, task, messages, temperature=0.8, max_tokens=500, count=None, model=None):
+        response = await get_async_http_client().post(
+            **self.build_request(task, messages, temperature, max_tokens, count, model)
+        )
+        return self.read_response(response)
+
+    def read_response(self, response):
+        if response.status_code >= 400:
+            raise ProviderError(f"Provider returned HTTP {response.status_code}")
+        body = response.json()
+        usage = body.get('usage') or {}
+        note_usage(body.get('model', 'unknown'), usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+        return body['choices'][0]['message']['content']
+
+
+class FakeProvider:
+    """
+    Deterministic offline stand-in. Each call draws from a RNG seeded with
+    the configured seed, the prompt and a call counter, so a given sequence
+    of calls always produces the same latencies, failures and content.
+    """
+    name = 'fake'
+
+    RIDDLE_ANSWERS = ['a shadow', 'a candle', 'the moon', 'an echo', 'a river', 'a map', 'a clock', 'a cloud']
+    RIDDLE_WORDS = ['quiet', 'bright', 'round', 'hungry', 'cold', 'busy', 'tiny', 'tall', 'old', 'lazy',
+                    'baobab', 'lake', 'drum', 'mango', 'market', 'village', 'kettle', 'road', 'goat', 'hill']
+
+    def __init__(self, latency_ms=400, jitter_ms=200, error_rate=0.0, malformed_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.seed = seed
+        self._calls = itertools.count()
+        self._lock = threading.Lock()
+
+    def available(self):
+        return True
+
+    def rng_for(self, messages):
+        with self._lock:
+            call_number = next(self._calls)
+        digest = hashlib.sha256(f"{self.seed}:{call_number}:{json.dumps(messages)}".encode()).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    def complete(self, task, messages, temperature=0.8, max_tokens=500, count=None, model=None):
+        rng = self.rng_for(messages)
+        delay_ms = self.draw_delay_ms(rng)
+        time.sleep(delay_ms / 1000)
+        return self.make_content(task, messages, count, rng, delay_ms)
+
+    async def acomplete(self, task, messages, temperature=0.8, max_tokens=500, count=None, model=None):
+        rng = self.rng_for(messages)
+        delay_ms = self.draw_delay_ms(rng)
+        await asyncio.sleep(delay_ms / 1000)
+        return self.make_content(task, messages, count, rng, delay_ms)
+
+    def draw_delay_ms(self, rng):
+        # Exponential jitter on top of the base latency gives a realistic long tail
+        return self.latency_ms + (rng.expovariate(1 / self.jitter_ms) if self.jitter_ms else 0)
+
+    def make_content(self, task, messages, count, rng, delay_ms):
+        if rng.random() < self.error_rate:
+            raise ProviderError(f"Simulated {task} failure after {delay_ms:.0f}ms")
+
+        if count is None:
+            content = json.dumps(self.make_item(task, rng))
+        else:
+            content = json.dumps({'items': [self.make_item(task, rng) for _ in range(count)]})
+
+        if rng.random() < self.malformed_rate:
+            content = content[:len(content) // 2]
+        # Rough 4-characters-per-token estimate
+        note_usage('fake', len(json.dumps(messages)) // 4, len(content) // 4)
+        return content
+
+    def make_item(self, task, rng):
+        code = rng.randint(1000, 9999)
+        if task == 'math':
+            a, b = rng.randint(1, 20), rng.randint(1, 20)
+            return {
+                'problem_text': f"{a} + {b}",
+                'display_text': f"{a} + {b} = ?",
+                'correct_answer': a + b,
+                'operation': '+',
+                'hint': f"Start at {a} and count on {b}.",
+                'explanation': f"{a} + {b} = {a + b}"
+            }
+        if task == 'riddle':
+            answer, *distractors = rng.sample(self.RIDDLE_ANSWERS, 4)
+            words = rng.sample(self.RIDDLE_WORDS, 6)
+            return {
+                'question': f"{' '.join(words)} {code}: what am I?",
+                'answer': answer,
+                'distractors': distractors,
+                'explanation': f"Practice riddle {code}.",
+                'hint': f"It starts with '{answer.split()[-1][0]}'."
+            }
+        correct = rng.choice('ABCD')
+        return {
+            'question': f"Practice question {code}: which option is {correct}?",
+            'options': [f"Option {letter}" for letter in 'ABCD'],
+            'correct': correct,
+            'explanation': f"Option {correct} is the marked answer."
+        }
+
+
+def build_provider(name=None):
+    name = name or getattr(settings, 'AI_PROVIDER', 'groq')
+    if name == 'fake':
+        return FakeProvider(
+            latency_ms=getattr(settings, 'AI_FAKE_LATENCY_MS', 400),
+            jitter_ms=getattr(settings, 'AI_FAKE_JITTER_MS', 200),
+            error_rate=getattr(settings, 'AI_FAKE_ERROR_RATE', 0.0),
+            malformed_rate=getattr(settings, 'AI_FAKE_MALFORMED_RATE', 0.0),
+            seed=getattr(settings, 'AI_FAKE_SEED', 0)
+        )
+    if name == 'openai_compatible':
+        return OpenAICompatibleProvider(
+            getattr(settings, 'AI_PROVIDER_BASE_URL', ''),
+            getattr(settings, 'AI_PROVIDER_API_KEY', None)
+        )
+    if name != 'groq':
+        logger.warning("Unknown AI_PROVIDER %r - using groq", name)
+    return GroqProvider()
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """Return the configured provider, building it on first use"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = build_provider()
+    return _provider
+
+
+def record_attempt(route, model, outcome, started):
+    """Feed one attempt's outcome to the model router and the hedge delays"""
+    if outcome is None or outcome == OUTCOME_CIRCUIT_OPEN:
+        # Cancelled, or never reached the model
+        return
+    latency_ms = (time.monotonic() - started) * 1000
+    model_router.record(route, model, outcome, latency_ms)
+    if outcome == OUTCOME_OK:
+        hedge_policy.observe(route, latency_ms)
+
+
+def request_completion(task, messages, temperature=0.8, max_tokens=500, count=None, difficulty=None, parse=None):
+    """
+    Send one JSON-mode completion to the configured provider through the
+    model's circuit breaker and return the raw message content, or `parse(content)`
+    when a parser is given.
+    `task` is 'quiz', 'riddle' or 'math'; `count` is set for batched requests.
+    The model is chosen by core.ai_router for the task and `difficulty`, and
+    slow calls are hedged (core.ai_hedging); a response only wins once
+    `parse` accepts it.
+    """
+    provider = get_provider()
+    if not provider.available():
+        raise ProviderError(f"AI provider '{provider.name}' not available.")
+    route = route_for(task, difficulty, count)
+
+    def attempt(model):
+        started = time.monotonic()
+        outcome = OUTCOME_OK
+        try:
+            content = model_breakers.get(model, provider.name).call(
+                provider.complete,
+                task,
+                messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                count=count,
+                model=model
+            )
+            return parse(content) if parse else content
+        except Exception as exc:
+            outcome = classify_error(exc)
+            raise
+        finally:
+            record_attempt(route, model, outcome, started)
+
+    return call_hedged(route, attempt)
+
+
+async def request_completion_async(task, messages, temperature=0.8, max_tokens=500, count=None, difficulty=None, parse=None):
+    """Awaitable form of request_completion, used by the async level views"""
+    provider = get_provider()
+    if not provider.available():
+        raise ProviderError(f"AI provider '{provider.name}' not available.")
+    route = route_for(task, difficulty, count)
+
+    async def attempt(model):
+        started = time.monotonic()
+        outcome = OUTCOME_OK
+        try:
+            content = await model_breakers.get(model, provider.name).acall(
+                provider.acomplete,
+                task,
+                messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                count=count,
+                model=model
+            )
+            return parse(content) if parse else content
+        except asyncio.CancelledError:
+            # Lost to its hedge, or the level deadline passed
+            outcome = None
+            raise
+        except Exception as exc:
+            outcome = classify_error(exc)
+            raise
+        finally:
+            record_attempt(route, model, outcome, started)
+
+    return await acall_hedged(route, attempt)
@@ -1,34 +1,70 @@
-from groq import Groq
-from django.conf import settings
 import json
 import random
 import logging
+from .ai_providers import request_completion, request_completion_async
+from .ai_cache import cached_generation
+from .ai_metrics import ai_metrics, instrumented
 
 logger = logging.getLogger(__name__)
 
-client = Groq(api_key=settings.GROQ_API_KEY)
+question_types = {
+    'easy': ['Presidents of Africa','basic fact', 'identification', 'matching','multiple choice', 'fill-in-blank'],
+    'medium': ['African natural resources','application', 'comparison', 'explanation', 'analysis', 'short answer', 'sequence'],
+    'hard': ['Malawian History','Mining in Africa','critical thinking', 'problem solving', 'evaluation', 'synthesis']
+}
+
+SYSTEM_PROMPT = "You are a fun tutor who makes learning exciting by creating engaging quiz questions for children. Always respond with valid JSON. Create unique questions each time."
+
+# Completion budget for batched requests
+BATCH_TOKENS_PER_ITEM = 300
+BATCH_MAX_TOKENS = 6000
 
 def generate_ai_question(difficulty, age, topic, question_number=1):
     """
     Generate an AI question with variety based on question number
     """
-    available_models = [
-        "llama-3.1-8b-instant",
-        "llama-3.3-70b-versatile",
-        "mixtral-8x7b-32768",
-        "gemma2-9b-it"
-    ]
-    
-    model = available_models[0]  # Use the first available model
-    #model = random.choice(available_models)
+    try:
+        return request_ai_question(difficulty, age, topic, question_number)
+    except Exception as e:
+        return fallback_ai_question(difficulty, topic, question_number, e)
+
+
+async def generate_ai_question_async(difficulty, age, topic, question_number=1):
+    """Async form of generate_ai_question"""
+    try:
+        return await request_ai_question_async(difficulty, age, topic, question_number)
+    except Exception as e:
+        return fallback_ai_question(difficulty, topic, question_number, e)
+
+
+def fallback_ai_question(difficulty, topic, question_number, error):
+    """A canned question in the AI response format, used when generation failed"""
+    logger.error(f"AI question generation failed for question {question_number}: {error}")
+    ai_metrics.record_tier('quiz', 'fallback')
     
-    # Add variety based on question number and topic
-    question_types = {
-        'easy': ['Presidents of Africa','basic fact', 'identification', 'matching','multiple choice', 'fill-in-blank'],
-        'medium': ['African natural resources','application', 'comparison', 'explanation', 'analysis', 'short answer', 'sequence'],
-        'hard': ['Malawian History','Mining in Africa','critical thinking', 'problem solving', 'evaluation', 'synthesis']
+    # Map difficulty to level number
+    difficulty_to_level = {
+        'easy': 1,
+        'medium': 2, 
+        'hard': 3
     }
+    level_number = difficulty_to_level.get(difficulty, 1)
+    index = question_number - 1
+    
+    fallback_result = create_unique_fallback_question(level_number, index, difficulty, topic)
     
+    # Convert the fallback format to match AI response format
+    return {
+        'question': fallback_result['question_text'],
+        'options': [opt['text'] for opt in fallback_result['options']],
+        'correct': fallback_result['correct_option'],
+        'explanation': fallback_result['explanation']
+    }
+
+
+def build_question_request(difficulty, age, topic, question_number=1):
+    """Completion request (request_completion keyword arguments) for one quiz question"""
+    # Add variety based on question number and topic
     q_types = question_types.get(difficulty, question_types['easy'])
     question_type = q_types[(question_number - 1) % len(q_types)]
     
@@ -73,63 +109,145 @@ Respond with JSON:
     
     prompt = random.choice(prompt_templates)
 
-    try:
-        logger.info(f"Generating AI question {question_number} for {age}y/o, {difficulty}, {topic}")
-        
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "system", 
-                    "content": "You are a fun tutor who makes learning exciting by creating engaging quiz questions for children. Always respond with valid JSON. Create unique questions each time."
-                },
-                {
-                    "role": "user", 
-                    "content": prompt
-                }
-            ],
-            temperature=0.8,  # Higher temperature for more variety
-            max_tokens=500,
-            response_format={"type": "json_object"}
-        )
-        
-        result_text = response.choices[0].message.content
-        logger.info(f"AI response received for question {question_number}")
-        
-        result = json.loads(result_text)
-        
-        # Validate the response
-        required_keys = ['question', 'options', 'correct', 'explanation']
-        if all(key in result for key in required_keys):
-            if len(result['options']) == 4 and result['correct'] in ['A', 'B', 'C', 'D']:
-                logger.info(f"AI question {question_number} generated successfully")
-                return result
-            else:
-                raise ValueError("Invalid options or correct answer format")
-        else:
-            raise ValueError("Missing required fields in AI response")
-            
-    except Exception as e:
-        logger.error(f"AI question generation failed for question {question_number}: {e}")
-        
-        # Map difficulty to level number
-        difficulty_to_level = {
-            'easy': 1,
-            'medium': 2, 
-            'hard': 3
-        }
-        level_number = difficulty_to_level.get(difficulty, 1)
-        index = question_number - 1
-        
-        fallback_result = create_unique_fallback_question(level_number, index, difficulty, topic)
-        
-        # Convert the fallback format to match AI response format
-        return {
-            'question': fallback_result['question_text'],
-            'options': [opt['text'] for opt in fallback_result['options']],
-            'correct': fallback_result['correct_option'],
-            'explanation': fallback_result['explanation']
-        }
+    logger.info(f"Generating AI question {question_number} for {age}y/o, {difficulty}, {topic}")
+    
+    return {
+        'task': 'quiz',
+        'messages': [
+            {
+                "role": "system", 
+                "content": SYSTEM_PROMPT
+            },
+            {
+                "role": "user", 
+                "content": prompt
+            }
+        ],
+        'temperature': 0.8,  # Higher temperature for more variety
+        'max_tokens': 500,
+        'difficulty': difficulty
+    }
+
+
+def parse_question(result_text, question_number=1):
+    """Validate the completion for one quiz question"""
+    logger.info(f"AI response received for question {question_number}")
+    
+    result = validate_ai_question(json.loads(result_text))
+    logger.info(f"AI question {question_number} generated successfully")
+    return result
+
+
+@cached_generation
+@instrumented('quiz')
+def request_ai_question(difficulty, age, topic, question_number=1):
+    """
+    Ask the LLM for one quiz question; raises instead of falling back
+    """
+    return request_completion(
+        **build_question_request(difficulty, age, topic, question_number),
+        parse=lambda result_text: parse_question(result_text, question_number)
+    )
+
+
+@cached_generation
+@instrumented('quiz')
+async def request_ai_question_async(difficulty, age, topic, question_number=1):
+    """Async form of request_ai_question for the ASGI endpoints"""
+    return await request_completion_async(
+        **build_question_request(difficulty, age, topic, question_number),
+        parse=lambda result_text: parse_question(result_text, question_number)
+    )
+
+
+def build_questions_batch_request(difficulty, age, topic, count, start_number=1):
+    """Completion request (request_completion keyword arguments) for `count` quiz questions"""
+    q_types = question_types.get(difficulty, question_types['easy'])
+    slot_types = [
+        q_types[(start_number + offset - 1) % len(q_types)]
+        for offset in range(count)
+    ]
+    
+    prompt = f"""Create {count} different {difficulty} level quiz questions about {topic} for a {age}-year-old.
+Use these question types, one per question, in order: {", ".join(slot_types)}
+Make each one engaging, educational and unlike the others.
+
+Format your response as JSON:
+{{
+    "items": [
+        {{
+            "question": "question here",
+            "options": ["A", "B", "C", "D"],
+            "correct": "A",
+            "explanation": "brief explanation"
+        }}
+    ]
+}}
+The "items" array must contain exactly {count} questions."""
+
+    logger.info(f"Generating {count} AI questions in one batch for {age}y/o, {difficulty}, {topic}")
+    
+    return {
+        'task': 'quiz',
+        'messages': [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        'temperature': 0.8,
+        'max_tokens': min(BATCH_TOKENS_PER_ITEM * count, BATCH_MAX_TOKENS),
+        'count': count,
+        'difficulty': difficulty
+    }
+
+
+def parse_questions_batch(result_text, count, start_number=1):
+    """Validate a batched completion into a slot-aligned list (None = invalid item)"""
+    items = json.loads(result_text).get('items')
+    if not isinstance(items, list):
+        raise ValueError("Batch response has no items array")
+    
+    results = []
+    for offset in range(count):
+        try:
+            results.append(validate_ai_question(items[offset]))
+        except (IndexError, TypeError, ValueError) as e:
+            logger.warning(f"Batch question {start_number + offset} invalid: {e}")
+            results.append(None)
+    
+    logger.info(f"AI batch returned {sum(r is not None for r in results)}/{count} valid questions")
+    return results
+
+
+@instrumented('quiz')
+def request_ai_questions_batch(difficulty, age, topic, count, start_number=1):
+    """
+    Ask the LLM for `count` quiz questions in a single call.
+    Returns a list aligned with the requested slots; items that fail
+    validation are None so the caller can back-fill just those slots.
+    """
+    return request_completion(
+        **build_questions_batch_request(difficulty, age, topic, count, start_number),
+        parse=lambda result_text: parse_questions_batch(result_text, count, start_number)
+    )
+
+
+@instrumented('quiz')
+async def request_ai_questions_batch_async(difficulty, age, topic, count, start_number=1):
+    """Async form of request_ai_questions_batch for the ASGI endpoints"""
+    return await request_completion_async(
+        **build_questions_batch_request(difficulty, age, topic, count, start_number),
+        parse=lambda result_text: parse_questions_batch(result_text, count, start_number)
+    )
+
+
+def validate_ai_question(result):
+    """Check an AI quiz question has 4 options and a correct letter in A-D"""
+    required_keys = ['question', 'options', 'correct', 'explanation']
+    if not isinstance(result, dict) or not all(key in result for key in required_keys):
+        raise ValueError("Missing required fields in AI response")
+    if not isinstance(result['options'], list) or len(result['options']) != 4 or result['correct'] not in ['A', 'B', 'C', 'D']:
+        raise ValueError("Invalid options or correct answer format")
+    return result
 
 
 def create_unique_fallback_question(level_number, index, difficulty, topic):
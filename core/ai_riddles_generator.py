@@ -1,51 +1,60 @@
-from groq import Groq
-from django.conf import settings
 import json
 import random
 import logging
-import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+from .ai_providers import get_provider, request_completion, request_completion_async
+from .ai_cache import cached_generation
+from .ai_metrics import ai_metrics, instrumented
 
 logger = logging.getLogger(__name__)
 
-# Get API key safely
-api_key = os.getenv('GROQ_API_KEY') or getattr(settings, 'GROQ_API_KEY', None)
+# Topic types
+question_types = {
+    'easy': ['Malawian primary school riddles', 'Basic riddles', 'Funny riddles'],
+    'medium': ['Advanced riddles', 'Thought-provoking riddles'],
+    'hard': ['Critical thinking riddles', 'Challenging logical riddles']
+}
 
-if api_key:
-    client = Groq(api_key=api_key)
-else:
-    logger.warning("GROQ_API_KEY not found - using fallback riddles only")
-    client = None
+SYSTEM_PROMPT = "You are an educational AI that creates riddles for kids. Always reply in VALID JSON with question, answer, distractors[], and explanation."
 
+# Completion budget for batched requests
+BATCH_TOKENS_PER_ITEM = 250
+BATCH_MAX_TOKENS = 6000
 
 def generate_ai_riddle(difficulty, age, topic, riddle_number=1):
     """
     Generate an AI riddle INCLUDING SMART DISTRACTORS.
     """
 
-    if not client:
-        logger.error("Groq client not initialized - using fallback riddles")
+    if not get_provider().available():
+        logger.error("AI provider not available - using fallback riddles")
+        ai_metrics.record_tier('riddle', 'fallback')
         return create_unique_fallback_riddle(1, riddle_number - 1, difficulty, topic)
 
-    available_models = [
-        "llama-3.1-8b-instant",
-        "llama-3.3-70b-versatile",
-        "mixtral-8x7b-32768",
-        "gemma2-9b-it"
-    ]
+    try:
+        return request_ai_riddle(difficulty, age, topic, riddle_number)
 
-    model = available_models[0]
+    except Exception as e:
+        logger.error(f"AI riddle generation failed: {e}")
+        ai_metrics.record_tier('riddle', 'fallback')
 
-    # Topic types
-    question_types = {
-        'easy': ['Malawian primary school riddles', 'Basic riddles', 'Funny riddles'],
-        'medium': ['Advanced riddles', 'Thought-provoking riddles'],
-        'hard': ['Critical thinking riddles', 'Challenging logical riddles']
-    }
+        difficulty_to_level = {'easy': 1, 'medium': 2, 'hard': 3}
+        level_number = difficulty_to_level.get(difficulty, 1)
+        index = riddle_number - 1
+
+        fallback = create_unique_fallback_riddle(level_number, index, difficulty, topic)
+
+        # ADD SIMPLE FALLBACK DISTRACTORS
+        fallback["distractors"] = [
+            "I don’t know",
+            "Something else",
+            "Not sure"
+        ]
+
+        return fallback
 
+
+def build_riddle_request(difficulty, age, topic, riddle_number=1):
+    """Completion request (request_completion keyword arguments) for one riddle"""
     q_types = question_types.get(difficulty, question_types['easy'])
     question_type = q_types[(riddle_number - 1) % len(q_types)]
 
@@ -98,55 +107,148 @@ Return JSON only:
 
     prompt = random.choice(prompt_templates)
 
-    try:
-        logger.info(f"Generating AI riddle {riddle_number} for {age}y/o, {difficulty}, {topic}")
+    logger.info(f"Generating AI riddle {riddle_number} for {age}y/o, {difficulty}, {topic}")
+
+    return {
+        'task': 'riddle',
+        'messages': [
+            {
+                "role": "system",
+                "content": SYSTEM_PROMPT
+            },
+            {"role": "user", "content": prompt}
+        ],
+        'temperature': 0.8,
+        'max_tokens': 500,
+        'difficulty': difficulty
+    }
 
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an educational AI that creates riddles for kids. Always reply in VALID JSON with question, answer, distractors[], and explanation."
-                },
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.8,
-            max_tokens=500,
-            response_format={"type": "json_object"}
-        )
 
-        result_text = response.choices[0].message.content
-        logger.info(f"AI response received for riddle {riddle_number}")
+def parse_riddle(result_text, riddle_number=1):
+    """Validate the completion for one riddle"""
+    logger.info(f"AI response received for riddle {riddle_number}")
 
-        result = json.loads(result_text)
+    result = validate_ai_riddle(json.loads(result_text))
+    logger.info(f"AI riddle generated successfully with distractors")
+    return result
 
-        # REQUIRED FIELDS INCLUDING DISTRACTORS
-        required_keys = ['question', 'answer', 'explanation', 'distractors']
 
-        if all(key in result for key in required_keys):
-            if isinstance(result["distractors"], list) and len(result["distractors"]) == 3:
-                logger.info(f"AI riddle generated successfully with distractors")
-                return result
+@cached_generation
+@instrumented('riddle')
+def request_ai_riddle(difficulty, age, topic, riddle_number=1):
+    """
+    Ask the LLM for one riddle with distractors; raises instead of falling back.
+    """
+    return request_completion(
+        **build_riddle_request(difficulty, age, topic, riddle_number),
+        parse=lambda result_text: parse_riddle(result_text, riddle_number)
+    )
 
-        raise ValueError("AI response missing required fields or distractors")
 
-    except Exception as e:
-        logger.error(f"AI riddle generation failed: {e}")
+@cached_generation
+@instrumented('riddle')
+async def request_ai_riddle_async(difficulty, age, topic, riddle_number=1):
+    """Async form of request_ai_riddle for the ASGI endpoints"""
+    return await request_completion_async(
+        **build_riddle_request(difficulty, age, topic, riddle_number),
+        parse=lambda result_text: parse_riddle(result_text, riddle_number)
+    )
 
-        difficulty_to_level = {'easy': 1, 'medium': 2, 'hard': 3}
-        level_number = difficulty_to_level.get(difficulty, 1)
-        index = riddle_number - 1
 
-        fallback = create_unique_fallback_riddle(level_number, index, difficulty, topic)
+def build_riddles_batch_request(difficulty, age, topic, count, start_number=1):
+    """Completion request (request_completion keyword arguments) for `count` riddles"""
+    q_types = question_types.get(difficulty, question_types['easy'])
+    slot_types = [
+        q_types[(start_number + offset - 1) % len(q_types)]
+        for offset in range(count)
+    ]
 
-        # ADD SIMPLE FALLBACK DISTRACTORS
-        fallback["distractors"] = [
-            "I don’t know",
-            "Something else",
-            "Not sure"
-        ]
+    prompt = f"""
+Create {count} different {difficulty} educational riddles about {topic} for a {age}-year-old.
+Use these types, one per riddle, in order: {", ".join(slot_types)}.
+Each riddle needs 1 correct answer AND 3 plausible but wrong distractor answers.
 
-        return fallback
+Respond ONLY in JSON:
+{{
+    "items": [
+        {{
+            "question": "riddle text",
+            "answer": "correct answer",
+            "distractors": ["wrong option 1", "wrong option 2", "wrong option 3"],
+            "explanation": "short explanation"
+        }}
+    ]
+}}
+The "items" array must contain exactly {count} riddles.
+"""
+
+    logger.info(f"Generating {count} AI riddles in one batch for {age}y/o, {difficulty}, {topic}")
+
+    return {
+        'task': 'riddle',
+        'messages': [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        'temperature': 0.8,
+        'max_tokens': min(BATCH_TOKENS_PER_ITEM * count, BATCH_MAX_TOKENS),
+        'count': count,
+        'difficulty': difficulty
+    }
+
+
+def parse_riddles_batch(result_text, count, start_number=1):
+    """Validate a batched completion into a slot-aligned list (None = invalid item)"""
+    items = json.loads(result_text).get('items')
+    if not isinstance(items, list):
+        raise ValueError("Batch response has no items array")
+
+    results = []
+    for offset in range(count):
+        try:
+            results.append(validate_ai_riddle(items[offset]))
+        except (IndexError, TypeError, ValueError) as e:
+            logger.warning(f"Batch riddle {start_number + offset} invalid: {e}")
+            results.append(None)
+
+    logger.info(f"AI batch returned {sum(r is not None for r in results)}/{count} valid riddles")
+    return results
+
+
+@instrumented('riddle')
+def request_ai_riddles_batch(difficulty, age, topic, count, start_number=1):
+    """
+    Ask the LLM for `count` riddles in a single call.
+    Returns a list aligned with the requested slots; invalid items are None.
+    """
+    return request_completion(
+        **build_riddles_batch_request(difficulty, age, topic, count, start_number),
+        parse=lambda result_text: parse_riddles_batch(result_text, count, start_number)
+    )
+
+
+@instrumented('riddle')
+async def request_ai_riddles_batch_async(difficulty, age, topic, count, start_number=1):
+    """Async form of request_ai_riddles_batch for the ASGI endpoints"""
+    return await request_completion_async(
+        **build_riddles_batch_request(difficulty, age, topic, count, start_number),
+        parse=lambda result_text: parse_riddles_batch(result_text, count, start_number)
+    )
+
+
+def validate_ai_riddle(result):
+    """
+    Check an AI riddle has a question, answer, explanation and exactly 3 distractors.
+    """
+
+    # REQUIRED FIELDS INCLUDING DISTRACTORS
+    required_keys = ['question', 'answer', 'explanation', 'distractors']
+
+    if isinstance(result, dict) and all(key in result for key in required_keys):
+        if isinstance(result["distractors"], list) and len(result["distractors"]) == 3:
+            return result
+
+    raise ValueError("AI response missing required fields or distractors")
 
 
 def create_unique_fallback_riddle(level_number, index, difficulty, topic):
@@ -0,0 +1,126 @@
+"""
+Latency- and error-aware routing across the configured models.
+
+Every generator call is sent to the model with the lowest expected time to
+a valid item for its (task, difficulty, single/batch) route:
+
+    expected_ms = latency_ewma / ((1 - error_rate) * (1 - validation_failure_rate))
+
+so a fast model that keeps returning invalid JSON is demoted below a slower
+one that answers cleanly. Models without samples are scored with
+AI_ROUTER_PRIOR_LATENCY_MS, scaled by their position in AI_MODELS so the
+configured order decides until there is data, and a small share of calls
+(AI_ROUTER_EXPLORE_RATE) goes to another model to keep the scoreboard fresh.
+Models whose circuit breaker is open (core.ai_breaker) are ranked last.
+"""
+import logging
+import random
+import threading
+from django.conf import settings
+from .ai_breaker import model_breakers
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODELS = [
+    "llama-3.1-8b-instant",
+    "llama-3.3-70b-versatile",
+]
+
+# Weight of the newest observation in the moving averages
+EWMA_ALPHA = 0.2
+# Floor on the chance of a valid item, so a failing model scores high but finite
+MIN_VALID_PROBABILITY = 0.05
+
+VALIDATION_OUTCOMES = ('invalid_json', 'validation_failure')
+ERROR_OUTCOMES = ('timeout', 'error')
+
+
+class ModelScore:
+    def __init__(self):
+        self.calls = 0
+        self.latency_ms = None
+        self.error_rate = 0.0
+        self.validation_failure_rate = 0.0
+
+    def observe(self, outcome, latency_ms):
+        self.calls += 1
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms += EWMA_ALPHA * (latency_ms - self.latency_ms)
+        self.error_rate += EWMA_ALPHA * ((outcome in ERROR_OUTCOMES) - self.error_rate)
+        self.validation_failure_rate += EWMA_ALPHA * (
+            (outcome in VALIDATION_OUTCOMES) - self.validation_failure_rate
+        )
+
+    def expected_ms(self, prior_ms):
+        valid = (1 - self.error_rate) * (1 - self.validation_failure_rate)
+        latency = self.latency_ms if self.latency_ms is not None else prior_ms
+        return latency / max(valid, MIN_VALID_PROBABILITY)
+
+    def snapshot(self, prior_ms):
+        return {
+            'calls': self.calls,
+            'latency_ms': round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            'error_rate': round(self.error_rate, 3),
+            'validation_failure_rate': round(self.validation_failure_rate, 3),
+            'expected_ms': round(self.expected_ms(prior_ms), 1),
+        }
+
+
+class ModelRouter:
+    def __init__(self):
+        self._scores = {}  # (route, model) -> ModelScore
+        self._lock = threading.Lock()
+
+    def models(self):
+        return list(getattr(settings, 'AI_MODELS', None) or [getattr(settings, 'AI_MODEL', DEFAULT_MODELS[0])])
+
+    def prior_ms(self, index):
+        return getattr(settings, 'AI_ROUTER_PRIOR_LATENCY_MS', 1500) * (index + 1)
+
+    def ranked(self, route):
+        """Models for `route`, best expected latency for a valid item first; open circuits last"""
+        models = self.models()
+        cooling = {model for model in models if model_breakers.is_open(model)}
+        with self._lock:
+            scored = [
+                (model in cooling, self._scores.get((route, model), ModelScore()).expected_ms(self.prior_ms(index)), index, model)
+                for index, model in enumerate(models)
+            ]
+        return [model for _, expected, index, model in sorted(scored)]
+
+    def choose(self, route):
+        ranked = self.ranked(route)
+        others = [model for model in ranked[1:] if not model_breakers.is_open(model)]
+        if others and random.random() < getattr(settings, 'AI_ROUTER_EXPLORE_RATE', 0.05):
+            return random.choice(others)
+        return ranked[0]
+
+    def record(self, route, model, outcome, latency_ms):
+        with self._lock:
+            score = self._scores.setdefault((route, model), ModelScore())
+            previous_rate = score.validation_failure_rate
+            score.observe(outcome, latency_ms)
+            if score.validation_failure_rate >= 0.5 > previous_rate:
+                logger.warning("Model %s is failing validation for %s; its routing score drops", model, route)
+
+    def reset(self):
+        with self._lock:
+            self._scores.clear()
+
+    def snapshot(self):
+        models = self.models()
+        with self._lock:
+            board = {}
+            for (route, model), score in self._scores.items():
+                index = models.index(model) if model in models else len(models)
+                board.setdefault('/'.join(str(part) for part in route), {})[model] = score.snapshot(self.prior_ms(index))
+            return board
+
+
+model_router = ModelRouter()
+
+
+def route_for(task, difficulty=None, count=None):
+    return (task, difficulty or 'any', 'batch' if count else 'single')
@@ -0,0 +1,85 @@
+"""
+Single-flight coalescing of identical concurrent AI generations.
+
+When many players open the same level at once (a whole class starting
+level 1), only the first request - the leader - generates; the others wait
+for its result and each receive their own shuffled deep copy, so one LLM
+round-trip serves the whole herd.
+"""
+import copy
+import logging
+import random
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+    def wait(self, timeout=None):
+        """Block until the leader finishes; False when the timeout passed first"""
+        return self.done.wait(timeout)
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """Return (flight, is_leader) for `key`, starting a new flight when none is running"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                return flight, False
+            flight = Flight()
+            self._flights[key] = flight
+            return flight, True
+
+    def finish(self, key, flight, result=None, error=None):
+        """Publish the leader's outcome and release every waiting follower"""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.result = result
+        flight.error = error
+        flight.done.set()
+        if flight.followers:
+            logger.info("Coalesced %s identical AI generations for %s", flight.followers, key)
+
+    def do(self, key, func, timeout=None):
+        """
+        Run `func` once for all concurrent callers with the same key.
+        Followers get a shuffled copy of a list result, or None when the
+        leader failed or did not finish within `timeout`.
+        """
+        flight, leader = self.join(key)
+        if leader:
+            try:
+                result = func()
+            except Exception as exc:
+                self.finish(key, flight, error=exc)
+                raise
+            self.finish(key, flight, result=result)
+            return result
+
+        if not flight.wait(timeout) or flight.error is not None:
+            return None
+        return shuffled_copy(flight.result)
+
+
+def shuffled_copy(result):
+    """A caller-private copy of a shared result; lists come back re-ordered"""
+    result = copy.deepcopy(result)
+    if isinstance(result, list):
+        random.shuffle(result)
+    return result
+
+
+level_flights = SingleFlight()
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+from .ai_metrics import ai_metrics
+from .ai_cache import generation_cache
+from .ai_breaker import model_breakers
+from .ai_policy import get_level_load_budget, latency_summary
+from .ai_router import model_router
+from .ai_hedging import hedge_policy
+
+
+@require_http_methods(["GET"])
+def get_ai_metrics(request):
+    """Aggregated AI generation metrics for this process (staff only outside DEBUG)"""
+    if not settings.DEBUG and not (request.user.is_authenticated and request.user.is_staff):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    metrics = ai_metrics.snapshot()
+    metrics['cache'] = generation_cache.stats()
+    metrics['breakers'] = model_breakers.snapshot()
+    metrics['router'] = model_router.snapshot()
+    metrics['hedging'] = hedge_policy.snapshot()
+    metrics['policy'] = {
+        'budget_seconds': get_level_load_budget(),
+        'games': {game: latency_summary(game) for game in ('quiz', 'riddle', 'math')},
+    }
+    return JsonResponse(metrics)
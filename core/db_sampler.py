@@ -0,0 +1,123 @@
+"""
+Random sampling of game content without ORDER BY RANDOM().
+
+Each process keeps the primary keys matching a (model, filters) pair, such
+as the active questions of a level's categories, and draws random ids from
+that list. Only the drawn rows are fetched, with just the columns the payload
+needs, so a request costs O(k) instead of sorting the whole bank.
+
+The id lists are dropped when rows of their model are saved or deleted (see
+core.signals) and after DB_SAMPLER_TTL_SECONDS. A version key in the cache
+carries invalidations to other workers that share the cache backend. Ids
+drawn from a stale list are re-filtered by the query, so a row deactivated in
+the meantime is skipped rather than served.
+"""
+import random
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+# Rows fetched per query when a sample runs out
+SAMPLE_BATCH_SIZE = 10
+
+
+def version_key(model):
+    return f"db_sampler_version_{model._meta.label_lower}"
+
+
+def filters_key(filters):
+    return tuple(sorted(
+        (name, tuple(value) if isinstance(value, (list, tuple, set)) else value)
+        for name, value in filters.items()
+    ))
+
+
+class PkSampler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pks = {}  # (label, filters) -> (version, loaded_at, pks)
+
+    def pks(self, model, filters):
+        key = (model._meta.label_lower, filters_key(filters))
+        version = cache.get(version_key(model), 0)
+        ttl = getattr(settings, 'DB_SAMPLER_TTL_SECONDS', 300)
+        entry = self._pks.get(key)
+        if entry is None or entry[0] != version or time.monotonic() - entry[1] > ttl:
+            pks = list(model.objects.filter(**filters).values_list('pk', flat=True))
+            entry = (version, time.monotonic(), pks)
+            with self._lock:
+                self._pks[key] = entry
+        return entry[2]
+
+    def invalidate(self, model):
+        label = model._meta.label_lower
+        with self._lock:
+            for key in [key for key in self._pks if key[0] == label]:
+                del self._pks[key]
+        try:
+            cache.incr(version_key(model))
+        except ValueError:
+            cache.set(version_key(model), 1, None)
+
+    def sample(self, model, filters, exclude=(), fields=None, batch_size=SAMPLE_BATCH_SIZE):
+        """Rows of `model` matching `filters` in random order, fetched as they are popped"""
+        return SampledRows(model, filters, self.pks(model, filters), exclude, fields, batch_size)
+
+
+pk_sampler = PkSampler()
+
+
+class SampledRows:
+    """
+    List-like stand-in for list(queryset.order_by('?')): len() is the number
+    of candidates left and pop(0) hands out the next random row, fetching
+    `batch_size` rows at a time.
+    """
+
+    def __init__(self, model, filters, pks, exclude=(), fields=None, batch_size=SAMPLE_BATCH_SIZE):
+        self.queryset = model.objects.filter(**filters)
+        if fields:
+            self.queryset = self.queryset.only(*fields)
+        self.pks = pks
+        self.batch_size = batch_size
+        self.drawn = set(exclude)
+        self.remaining = len(pks) - len(self.drawn.intersection(pks)) if self.drawn else len(pks)
+        self.rows = []
+
+    def __len__(self):
+        # No query here: the async views take len() on the event loop
+        return len(self.rows) + self.remaining
+
+    def __bool__(self):
+        # Ids whose rows were deleted since the list was loaded don't count
+        self.fill()
+        return bool(self.rows)
+
+    def draw_ids(self, count):
+        # Oversample by the ids already drawn, so the draw stays O(drawn + count)
+        candidates = random.sample(self.pks, min(len(self.pks), len(self.drawn) + count))
+        ids = [pk for pk in candidates if pk not in self.drawn][:count]
+        self.drawn.update(ids)
+        self.remaining = max(0, self.remaining - len(ids)) if ids else 0
+        return ids
+
+    def fetch(self, ids):
+        found = {row.pk: row for row in self.queryset.filter(pk__in=ids)}
+        return [found[pk] for pk in ids if pk in found]
+
+    def fill(self):
+        while not self.rows and self.remaining > 0:
+            self.rows = self.fetch(self.draw_ids(self.batch_size))
+
+    def pop(self, index=0):
+        self.fill()
+        return self.rows.pop(index)
+
+    def take(self, count):
+        """Up to `count` rows, fetched in one query when none are buffered"""
+        taken = self.rows[:count]
+        del self.rows[:count]
+        while len(taken) < count and self.remaining > 0:
+            taken += self.fetch(self.draw_ids(count - len(taken)))
+        return taken
@@ -42,6 +42,27 @@ def get_age_range_for_difficulty(difficulty):
     }
     return difficulty_map.get(difficulty, None)
 
+def get_age_band(age):
+    """
+    Bucket an age into the bands used for AI content inventory
+    Returns: '3-6', '7-9', '10-12' or '13+'
+    """
+    if age is None or age <= 6:
+        return '3-6'
+    elif age <= 9:
+        return '7-9'
+    elif age <= 12:
+        return '10-12'
+    return '13+'
+
+# Representative age used when generating content for a whole age band
+AGE_BAND_SAMPLE_AGES = {
+    '3-6': 5,
+    '7-9': 8,
+    '10-12': 11,
+    '13+': 13,
+}
+
 def filter_by_age_appropriate(user, queryset, difficulty_field='difficulty'):
     """
     Filter a queryset by user's age-appropriate difficulty level
@@ -58,7 +79,18 @@ def filter_by_age_appropriate(user, queryset, difficulty_field='difficulty'):
     
     profile = user.profile
     age = get_age_from_birthdate(profile.date_of_birth)
-    
+    return filter_by_age(queryset, age, difficulty_field)
+
+def filter_by_age(queryset, age, difficulty_field='difficulty'):
+    """
+    Filter a queryset by the difficulty levels appropriate for an age
+    Args:
+        queryset: Django queryset to filter
+        age: Age in years, or None when unknown
+        difficulty_field: Name of the difficulty field in the model
+    Returns:
+        Filtered queryset
+    """
     if age is None:
         # If no age, return all difficulties
         return queryset.filter(**{f'{difficulty_field}__isnull': False})
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.models import MathGameLevel
+from core.math_bank import deactivate_invalid_problems, fill_level_bank
+import time
+
+
+class Command(BaseCommand):
+    help = "Fill every Math Game level with a deep bank of pre-validated problems."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--per-level',
+            type=int,
+            default=None,
+            help="Problems each level should hold (default: settings.MATH_BANK_PROBLEMS_PER_LEVEL).",
+        )
+        parser.add_argument(
+            '--levels',
+            nargs='+',
+            type=int,
+            default=None,
+            help="Level numbers to fill (default: all).",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Rows per INSERT.",
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help="Random seed, for a reproducible bank.",
+        )
+
+    def handle(self, *args, **options):
+        per_level = options['per_level'] or getattr(settings, 'MATH_BANK_PROBLEMS_PER_LEVEL', 20000)
+        levels = MathGameLevel.objects.all()
+        if options['levels']:
+            levels = levels.filter(level_number__in=options['levels'])
+
+        self.stdout.write(self.style.WARNING(f"Filling math problem banks to {per_level} problems per level..."))
+        total_created = 0
+        for level in levels:
+            started = time.monotonic()
+            deactivated = deactivate_invalid_problems(level)
+            if deactivated:
+                self.stdout.write(f"  Level {level.level_number}: switched off {deactivated} problems with wrong answers")
+            existing = level.problems.filter(is_active=True).count()
+            if existing >= per_level:
+                self.stdout.write(f"  Level {level.level_number} already has {existing} problems.")
+                continue
+            created = fill_level_bank(level, per_level - existing, options['batch_size'], options['seed'])
+            total_created += created
+            self.stdout.write(
+                f"  Level {level.level_number}: +{created} ({existing + created} total) "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Created {total_created} math problems."))
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.models import WordSearchCategory, WordSearchLevel
+from core.word_search_bank import farm_puzzles
+import time
+
+
+class Command(BaseCommand):
+    help = "Pre-generate word search puzzles for every level and category across a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--per-pair',
+            type=int,
+            default=None,
+            help="Puzzles each (level, category) pair should hold (default: settings.WORD_SEARCH_PUZZLES_PER_PAIR).",
+        )
+        parser.add_argument(
+            '--levels',
+            nargs='+',
+            type=int,
+            default=None,
+            help="Level numbers to fill (default: all).",
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help="Worker processes (default: one per CPU).",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Rows per INSERT.",
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help="Random seed, for reproducible grids.",
+        )
+
+    def handle(self, *args, **options):
+        per_pair = options['per_pair'] or getattr(settings, 'WORD_SEARCH_PUZZLES_PER_PAIR', 200)
+        levels = WordSearchLevel.objects.all()
+        if options['levels']:
+            levels = levels.filter(level_number__in=options['levels'])
+        categories = WordSearchCategory.objects.filter(is_active=True)
+
+        self.stdout.write(self.style.WARNING(
+            f"Farming word search puzzles to {per_pair} per level and category "
+            f"({levels.count()} levels × {categories.count()} categories)..."
+        ))
+        started = time.monotonic()
+        created = farm_puzzles(
+            per_pair,
+            levels=levels,
+            categories=categories,
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Created {created} word search puzzles in {time.monotonic() - started:.1f}s."
+        ))
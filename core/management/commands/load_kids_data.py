@@ -57,14 +57,14 @@ class Command(BaseCommand):
             for i, word_list in enumerate(puzzles_data[category.name]):
                 # Simple fake grid generator (for demo purposes)
                 grid_size = 6
-                grid_data = [[random.choice(string.ascii_uppercase) for _ in range(grid_size)] for _ in range(grid_size)]
+                grid_data = ''.join(random.choice(string.ascii_uppercase) for _ in range(grid_size * grid_size))
                 puzzle = WordSearchPuzzle.objects.create(
                     title=f"{category.name} Puzzle {i + 1}",
                     category=category,
                     level=WordSearchLevel.objects.get(level_number=random.choice([1, 2, 3])),
                     words=word_list,
                     grid_data=grid_data,
-                    word_positions={},  # could be generated dynamically later
+                    word_positions=[],  # could be generated dynamically later
                     hints={w: f"Starts with {w[0].upper()}" for w in word_list},
                     is_active=True,
                 )
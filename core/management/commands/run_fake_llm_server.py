@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from core.ai_providers import FakeProvider, ProviderError
+import json
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve an OpenAI-compatible /chat/completions stub backed by the fake AI provider. "
+        "Point AI_PROVIDER='openai_compatible' and AI_PROVIDER_BASE_URL at it to benchmark without a network."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help="Interface to bind (default: 127.0.0.1).")
+        parser.add_argument('--port', type=int, default=8765, help="Port to listen on (default: 8765).")
+        parser.add_argument('--latency-ms', type=float, default=400, help="Base latency of every completion.")
+        parser.add_argument('--jitter-ms', type=float, default=200, help="Mean of the exponential extra latency.")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered with HTTP 500.")
+        parser.add_argument('--malformed-rate', type=float, default=0.0, help="Share of completions with truncated JSON.")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for the deterministic RNG.")
+
+    def handle(self, *args, **options):
+        provider = FakeProvider(
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'],
+            malformed_rate=options['malformed_rate'],
+            seed=options['seed']
+        )
+        server = ThreadingHTTPServer((options['host'], options['port']), make_handler(provider))
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Fake LLM server listening on http://{options['host']}:{options['port']}/v1"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+def make_handler(provider):
+    class CompletionHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self.send_json(404, {'error': {'message': 'Not found'}})
+                return
+
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            metadata = body.get('metadata') or {}
+            try:
+                content = provider.complete(
+                    metadata.get('task', 'quiz'),
+                    body.get('messages', []),
+                    count=metadata.get('count')
+                )
+            except ProviderError as exc:
+                self.send_json(500, {'error': {'message': str(exc)}})
+                return
+
+            self.send_json(200, {
+                'id': f"fake-{time.time_ns()}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'fake'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop'
+                }],
+                'usage': {
+                    'prompt_tokens': len(json.dumps(body.get('messages', []))) // 4,
+                    'completion_tokens': len(content) // 4
+                }
+            })
+
+        def send_json(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return CompletionHandler
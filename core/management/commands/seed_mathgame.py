@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
+from core.math_bank import fill_level_bank
 from core.models import (
     MathGameLevel,
     MathGameProblem,
@@ -51,22 +52,6 @@ class Command(BaseCommand):
         # 2️⃣ CREATE PROBLEMS FOR EACH LEVEL
         # ============================================================
 
-        def generate_problem(a, b, operation):
-            """Generate problem text and correct answer."""
-            if operation == "+":
-                return f"{a} + {b}", a + b
-            elif operation == "-":
-                return f"{a} - {b}", a - b
-            elif operation in ["×", "*"]:
-                return f"{a} × {b}", a * b
-            elif operation in ["÷", "/"]:
-                # Avoid division by zero and ensure clean division
-                if b == 0:
-                    b = 1
-                answer = a // b
-                return f"{a} ÷ {b}", answer
-            return f"{a} + {b}", a + b
-
         total_created = 0
 
         for level in levels.values():
@@ -77,20 +62,8 @@ class Command(BaseCommand):
                 self.stdout.write(f"Level {level.level_number} already has problems.")
                 continue
 
-            for _ in range(problems_to_create):
-                a = random.randint(level.number_range_min, level.number_range_max)
-                b = random.randint(level.number_range_min, level.number_range_max)
-                operation = random.choice(level.operations)
-
-                text, answer = generate_problem(a, b, operation)
-                MathGameProblem.objects.get_or_create(
-                    problem_text=text,
-                    correct_answer=answer,
-                    operation=operation,
-                    level=level,
-                    defaults={"hint": f"Solve the {operation} operation."},
-                )
-                total_created += 1
+            # Exact division, no duplicates, one INSERT per level
+            total_created += fill_level_bank(level, problems_to_create - existing)
 
         self.stdout.write(self.style.SUCCESS(f"✅ Created {total_created} math problems."))
 
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from core.riddle_levels import sync_riddle_levels_from_quiz
+
+
+class Command(BaseCommand):
+    help = "Mirror the quiz levels and categories into the riddle levels in one bulk pass."
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING("Syncing riddle levels from quiz levels..."))
+        written = sync_riddle_levels_from_quiz()
+        self.stdout.write(self.style.SUCCESS(f"✅ Riddle levels in sync ({written} rows written)."))
@@ -0,0 +1,118 @@
+from django.core.management.base import BaseCommand
+from core.models import QuizLevel, RiddleLevel, MathGameLevel
+from core.game_utils import get_age_band, AGE_BAND_SAMPLE_AGES
+from core.ai_inventory import get_watermark, math_topic, top_up
+from core.ai_question_generator import request_ai_question
+from core.ai_riddles_generator import request_ai_riddle
+from core.ai_math_generator import generate_ai_math_problem
+from core import quiz_game, riddles_game
+import time
+
+# Player ages to warm for: None is an anonymous player or one without a birth date
+PLAYER_AGES = [None] + list(AGE_BAND_SAMPLE_AGES.values())
+
+
+class Command(BaseCommand):
+    help = "Top up the warm inventory of pre-generated AI quiz questions, riddles and math problems."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--games',
+            nargs='+',
+            choices=['quiz', 'riddle', 'math'],
+            default=['quiz', 'riddle', 'math'],
+            help="Games to top up (default: all).",
+        )
+        parser.add_argument(
+            '--watermark',
+            type=int,
+            default=None,
+            help="Items to keep in each bucket (default: settings.AI_INVENTORY_WATERMARK).",
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help="Keep running as a background worker instead of exiting after one pass.",
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=300,
+            help="Seconds to sleep between passes when --loop is given.",
+        )
+
+    def handle(self, *args, **options):
+        watermark = options['watermark'] or get_watermark()
+
+        while True:
+            self.stdout.write(self.style.WARNING(f"Topping up AI inventory to {watermark} items per bucket..."))
+            total_added = 0
+            for bucket, generate in self.get_buckets(options['games']):
+                added = top_up(*bucket, generate, watermark=watermark)
+                if added:
+                    self.stdout.write(f"  {' / '.join(bucket)}: +{added}")
+                total_added += added
+            self.stdout.write(self.style.SUCCESS(f"✅ Added {total_added} AI inventory items."))
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def get_buckets(self, games):
+        """
+        Yield ((game, difficulty, age_band, topic), generate) pairs, resolving
+        topics exactly the way the level endpoints do.
+        """
+        seen = set()
+
+        def add(bucket, generate):
+            if bucket not in seen:
+                seen.add(bucket)
+                buckets.append((bucket, generate))
+
+        buckets = []
+
+        # The generators are called through .uncached so every stocked item is a
+        # fresh completion rather than a rotated cache variant
+        if 'quiz' in games:
+            for level in QuizLevel.objects.select_related('category'):
+                for age in PLAYER_AGES:
+                    category = quiz_game.get_topic_categories(level, age).first()
+                    topic = category.name if category else "general knowledge"
+                    band = get_age_band(age if age is not None else 10)
+                    difficulty = level.category.difficulty
+                    add(
+                        ('quiz', difficulty, band, topic),
+                        lambda slot, d=difficulty, a=AGE_BAND_SAMPLE_AGES[band], t=topic: request_ai_question.uncached(d, a, t, slot)
+                    )
+
+        if 'riddle' in games:
+            for level in RiddleLevel.objects.select_related('category'):
+                for age in PLAYER_AGES:
+                    category = riddles_game.get_topic_categories(level, age).first()
+                    topic = category.name if category else "general knowledge"
+                    band = get_age_band(age if age is not None else 10)
+                    difficulty = level.category.difficulty
+                    add(
+                        ('riddle', difficulty, band, topic),
+                        lambda slot, d=difficulty, a=AGE_BAND_SAMPLE_AGES[band], t=topic: request_ai_riddle.uncached(d, a, t, slot)
+                    )
+
+        if 'math' in games:
+            for level in MathGameLevel.objects.all():
+                topic = math_topic(level.operations, level.number_range_min, level.number_range_max)
+                for age in PLAYER_AGES:
+                    band = get_age_band(age or 10)
+                    add(
+                        ('math', level.difficulty, band, topic),
+                        lambda slot, lv=level, a=AGE_BAND_SAMPLE_AGES[band]: generate_ai_math_problem.uncached(
+                            difficulty=lv.difficulty,
+                            operations=lv.operations,
+                            min_value=lv.number_range_min,
+                            max_value=lv.number_range_max,
+                            age=a,
+                            problem_number=slot
+                        )
+                    )
+
+        return buckets
@@ -0,0 +1,158 @@
+"""
+Vectorised bank of pre-validated math problems per MathGameLevel.
+
+For each of a level's operations the whole space of valid problems in its
+number range is laid out as NumPy arrays:
+
+- subtraction keeps the answer non-negative
+- division is built from divisor × quotient, so it is always exact
+- the second factor/divisor stays within the templates' MAX_FACTOR
+
+Trivial problems (x + 0, x - x, x × 1, x ÷ 1) are dropped. Commutative
+repeats (3 + 4 / 4 + 3) and problems the level already has are
+de-duplicated. A sample is then drawn without replacement, with the
+operations balanced as evenly as their spaces allow. A level with a small
+range simply gets every distinct problem it has.
+"""
+import logging
+import numpy as np
+from .db_sampler import pk_sampler
+from .math_templates import HINTS, MAX_FACTOR
+from .models import MathGameProblem
+
+logger = logging.getLogger(__name__)
+
+COMMUTATIVE = ('+', '×')
+
+
+def operand_space(operation, min_value, max_value):
+    """Arrays (a, b, answer) of every non-trivial problem for `operation`"""
+    low = max(0, min_value)
+    high = max(low + 1, max_value)
+    values = np.arange(low, high + 1, dtype=np.int64)
+    factors = np.arange(2, max(2, min(high, MAX_FACTOR)) + 1, dtype=np.int64)
+
+    if operation == '×':
+        a, b = np.meshgrid(values[values >= 1], factors, indexing='ij')
+        a, b = a.ravel(), b.ravel()
+        return a, b, a * b
+    if operation == '÷':
+        answer, b = np.meshgrid(values[values >= 1], factors, indexing='ij')
+        answer, b = answer.ravel(), b.ravel()
+        return b * answer, b, answer
+
+    a, b = np.meshgrid(values, values, indexing='ij')
+    a, b = a.ravel(), b.ravel()
+    if operation == '-':
+        keep = (b < a) & (b > 0)
+        return a[keep], b[keep], a[keep] - b[keep]
+    keep = (a > 0) & (b > 0)
+    return a[keep], b[keep], a[keep] + b[keep]
+
+
+def problem_keys(operation, a, b):
+    """One int64 key per problem; commutative operand orders share a key"""
+    if operation in COMMUTATIVE:
+        a, b = np.minimum(a, b), np.maximum(a, b)
+    return a * (1 << 32) + b
+
+
+def existing_keys(level):
+    """Keys of the problems `level` already has, per operation"""
+    keys = {}
+    for text, operation in MathGameProblem.objects.filter(level=level).values_list('problem_text', 'operation'):
+        parts = text.split()
+        if len(parts) != 3 or not (parts[0].isdigit() and parts[2].isdigit()):
+            continue
+        a, b = np.array([int(parts[0])]), np.array([int(parts[2])])
+        keys.setdefault(operation, set()).add(int(problem_keys(operation, a, b)[0]))
+    return keys
+
+
+def balanced_shares(count, capacities):
+    """Split `count` across operations as evenly as their capacities allow"""
+    shares = {operation: 0 for operation in capacities}
+    open_operations = [operation for operation, capacity in capacities.items() if capacity > 0]
+    remaining = count
+    while remaining > 0 and open_operations:
+        each, extra = divmod(remaining, len(open_operations))
+        for index, operation in enumerate(list(open_operations)):
+            take = min(each + (index < extra), capacities[operation] - shares[operation])
+            shares[operation] += take
+            remaining -= take
+            if shares[operation] >= capacities[operation]:
+                open_operations.remove(operation)
+    return shares
+
+
+def build_level_bank(level, count, seed=None):
+    """Up to `count` new, distinct MathGameProblem rows (unsaved) for `level`"""
+    rng = np.random.default_rng(seed)
+    known = existing_keys(level)
+
+    spaces = {}
+    for operation in dict.fromkeys(level.operations or ['+']):
+        if operation not in HINTS:
+            continue
+        a, b, answer = operand_space(operation, level.number_range_min, level.number_range_max)
+        keys = problem_keys(operation, a, b)
+        keys, first = np.unique(keys, return_index=True)
+        fresh = first[~np.isin(keys, np.fromiter(known.get(operation, ()), dtype=np.int64))]
+        spaces[operation] = (a[fresh], b[fresh], answer[fresh])
+
+    shares = balanced_shares(count, {operation: len(space[0]) for operation, space in spaces.items()})
+    problems = []
+    for operation, (a, b, answer) in spaces.items():
+        picked = rng.choice(len(a), size=shares[operation], replace=False)
+        for x, y, result in zip(a[picked].tolist(), b[picked].tolist(), answer[picked].tolist()):
+            problems.append(MathGameProblem(
+                problem_text=f"{x} {operation} {y}",
+                correct_answer=result,
+                operation=operation,
+                level=level,
+                hint=HINTS[operation].format(a=x, b=y),
+            ))
+
+    rng.shuffle(problems)
+    if len(problems) < count:
+        logger.info(
+            "Level %s has only %s new distinct problems (asked for %s)",
+            level.level_number, len(problems), count
+        )
+    return problems
+
+
+def deactivate_invalid_problems(level):
+    """
+    Switch off the level's rows whose stored answer is wrong or negative
+    (e.g. truncated division from older seeding); returns rows switched off
+    """
+    rows = list(
+        MathGameProblem.objects.filter(level=level, is_active=True)
+        .values_list('id', 'problem_text', 'operation', 'correct_answer')
+    )
+    invalid = []
+    for problem_id, text, operation, answer in rows:
+        parts = text.split()
+        if len(parts) != 3 or not (parts[0].isdigit() and parts[2].isdigit()) or operation not in HINTS:
+            continue
+        a, b = int(parts[0]), int(parts[2])
+        if operation == '÷':
+            valid = b != 0 and a == b * answer
+        else:
+            valid = answer == {'+': a + b, '-': a - b, '×': a * b}[operation]
+        if not valid or answer < 0:
+            invalid.append(problem_id)
+    deactivated = MathGameProblem.objects.filter(id__in=invalid).update(is_active=False)
+    if deactivated:
+        pk_sampler.invalidate(MathGameProblem)
+    return deactivated
+
+
+def fill_level_bank(level, count, batch_size=1000, seed=None):
+    """Generate and insert up to `count` new problems for `level`; returns rows created"""
+    problems = build_level_bank(level, count, seed=seed)
+    MathGameProblem.objects.bulk_create(problems, batch_size=batch_size)
+    # bulk_create sends no signals
+    pk_sampler.invalidate(MathGameProblem)
+    return len(problems)
@@ -1,13 +1,28 @@
 import json
 import random
 import logging
+import time
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.shortcuts import render
 from .models import MathGameLevel, MathGameProblem, MathGameSession, UserMathProgress
-from .game_utils import filter_by_age_appropriate, get_age_from_birthdate, get_difficulty_by_age
-from .ai_math_generator import generate_ai_math_problem
+from .game_utils import filter_by_age_appropriate, get_age_band, get_age_from_birthdate
+from .ai_math_generator import (
+    generate_ai_math_problem, generate_ai_math_problem_async,
+    generate_ai_math_problems_batch, generate_ai_math_problems_batch_async
+)
+from .ai_inventory import math_topic, pop_items
+from .ai_executor import gather_batch_with_backfill, iter_batch_with_backfill
+from .streaming import ndjson_response
+from .ai_metrics import track_level
+from .ai_policy import plan_ai_slots
+from .math_templates import build_template_problems
+from .db_sampler import pk_sampler
+from .seen_content import load_seen
 
 logger = logging.getLogger(__name__)
 
@@ -122,75 +137,266 @@ def extract_numbers(problem_text):
         pass
     return 0, 0
 
-def get_math_level(request):
-    """Get math problems for a specific level, filtered by user age"""
+def prepare_math_level(request):
+    """
+    Resolve the level, player and database fallback pool for a level request.
+    Raises MathGameLevel.DoesNotExist for unknown levels.
+    """
     level_number = int(request.GET.get('level', 1))
     
-    try:
-        # Filter levels by age-appropriate difficulty
-        levels = MathGameLevel.objects.filter(level_number=level_number)
-        user = request.user if request.user.is_authenticated else None
-        levels_query = filter_by_age_appropriate(user, levels, 'difficulty')
-        level = levels_query.first()
-        
-        if not level:
-            # Fallback to default level if age filtering removes it
-            level = MathGameLevel.objects.get(level_number=level_number)
-        
-        user_age = None
-        if user and hasattr(user, 'profile') and user.profile.date_of_birth:
-            user_age = get_age_from_birthdate(user.profile.date_of_birth)
-        
-        db_problems = list(MathGameProblem.objects.filter(level=level, is_active=True))
-        random.shuffle(db_problems)
-        
-        problems = []
-        ai_problems_count = 0
-        db_problems_count = 0
-        
-        for idx in range(level.problems_required):
-            problem = None
-            try:
-                problem = generate_ai_math_problem(
+    # Filter levels by age-appropriate difficulty
+    levels = MathGameLevel.objects.filter(level_number=level_number)
+    user = request.user if request.user.is_authenticated else None
+    levels_query = filter_by_age_appropriate(user, levels, 'difficulty')
+    level = levels_query.first()
+    
+    if not level:
+        # Fallback to default level if age filtering removes it
+        level = MathGameLevel.objects.get(level_number=level_number)
+    
+    user_age = None
+    if user and hasattr(user, 'profile') and user.profile.date_of_birth:
+        user_age = get_age_from_birthdate(user.profile.date_of_birth)
+    
+    # Levels can hold a bank of tens of thousands; only the problems used are fetched
+    seen = load_seen(request, 'math')
+    db_problems = pk_sampler.sample(
+        MathGameProblem,
+        {'level_id': level.pk, 'is_active': True},
+        exclude=seen.id_set,
+        fields=['problem_text', 'correct_answer', 'operation', 'hint']
+    )
+    
+    return {
+        'level': level,
+        'level_number': level_number,
+        'user': user,
+        'user_age': user_age,
+        'db_problems': db_problems,
+        'seen': seen,
+    }
+
+def math_level_metadata(context):
+    level = context['level']
+    return {
+        'level_number': level.level_number,
+        'difficulty': level.difficulty,
+        'time_limit': level.time_limit,
+        'problems_required': level.problems_required,
+        'points_per_problem': level.points_per_problem,
+        'operations': level.operations,
+    }
+
+def level_math_topic(level):
+    return math_topic(level.operations, level.number_range_min, level.number_range_max)
+
+def math_flight_key(context):
+    """Players opening the same level together share one generation"""
+    level = context['level']
+    return (
+        'math',
+        context['level_number'],
+        level.difficulty,
+        get_age_band(context['user_age'] or 10),
+        level_math_topic(level)
+    )
+
+def local_template_slots(level):
+    """Slots of the level built by the local template engine; the rest go to the LLM for novelty"""
+    ratio = getattr(settings, 'MATH_LOCAL_TEMPLATE_RATIO', 0.8)
+    return min(level.problems_required, max(0, round(level.problems_required * ratio)))
+
+def pop_stocked_problems(context, count):
+    level = context['level']
+    return pop_items('math', level.difficulty, context['user_age'] or 10, level_math_topic(level), count)
+
+def iter_math_problems(context, stocked_problems=None, ai_problems=None):
+    """
+    Yield (source, problem) pairs as each problem of the level becomes ready;
+    source is 'template', 'ai', 'db' or 'generated'. Template problems are
+    spread through the level at random positions, the first slot always
+    being one so a streamed level starts at once. Database problems served
+    are recorded in the learner's seen set once the level is complete.
+    The async view passes the inventory items and AI results it already awaited.
+    """
+    level = context['level']
+    user_age = context['user_age']
+    db_problems = context['db_problems']
+    
+    def build(problem):
+        if problem is not None:
+            problem['display_text'] = problem.get('display_text') or f"{problem.get('problem_text')} = ?"
+            problem['tip'] = problem.get('tip') or build_math_tip(problem.get('operation', '+'))
+            problem['hint'] = problem.get('hint') or build_math_hint(problem.get('operation', '+'), 0, 0)
+            problem['explanation'] = problem.get('explanation') or f"{problem['problem_text']} = {problem['correct_answer']}"
+            problem['is_ai'] = True
+            return 'ai', problem
+        if db_problems:
+            # AI failed or timed out, use database problem as fallback
+            db_problem = db_problems.pop(0)
+            context['seen'].add_id(db_problem.id)
+            return 'db', serialize_db_problem(db_problem)
+        return 'generated', generate_math_problem(context['level_number'], context['user'], level_config=level)
+    
+    # Most slots are built locally, correct by construction
+    template_slots = local_template_slots(level)
+    templates = build_template_problems(level, template_slots, user_age)
+    novel_slots = level.problems_required - template_slots
+    
+    def novel_problems():
+        # Pre-generated problems from the warm inventory are served first; the
+        # rest come from one batched AI call with only its invalid slots back-filled
+        stocked = stocked_problems
+        if stocked is None:
+            stocked = pop_stocked_problems(context, novel_slots)
+        for problem in stocked:
+            yield build(problem)
+    
+        # While the provider is slow, slots the database can cover are served
+        # from it straight away instead of waiting on the AI
+        remaining = novel_slots - len(stocked)
+        if ai_problems is None:
+            ai_slots = plan_ai_slots('math', remaining, len(db_problems))
+        else:
+            ai_slots = len(ai_problems)
+        for _ in range(remaining - ai_slots):
+            yield build(None)
+    
+        if ai_problems is not None:
+            for problem in ai_problems:
+                yield build(problem)
+        else:
+            first_ai = template_slots + len(stocked) + remaining - ai_slots
+            for slot, problem in iter_batch_with_backfill(
+                partial(
+                    generate_ai_math_problems_batch,
+                    level.difficulty,
+                    level.operations,
+                    level.number_range_min,
+                    level.number_range_max,
+                    user_age or 10,
+                    start_number=first_ai + 1
+                ),
+                lambda slot: generate_ai_math_problem(
                     difficulty=level.difficulty,
                     operations=level.operations,
                     min_value=level.number_range_min,
                     max_value=level.number_range_max,
                     age=user_age or 10,
-                    problem_number=idx + 1
-                )
-                problem['display_text'] = problem.get('display_text') or f"{problem.get('problem_text')} = ?"
-                problem['tip'] = problem.get('tip') or build_math_tip(problem.get('operation', '+'))
-                problem['hint'] = problem.get('hint') or build_math_hint(problem.get('operation', '+'), 0, 0)
-                problem['explanation'] = problem.get('explanation') or f"{problem['problem_text']} = {problem['correct_answer']}"
-                problem['is_ai'] = True
-                ai_problems_count += 1
-            except Exception as exc:
-                logger.debug("AI math problem failed: %s", exc)
-                if db_problems:
-                    db_problem = db_problems.pop(0)
-                    problem = serialize_db_problem(db_problem)
-                    db_problems_count += 1
-                else:
-                    problem = generate_math_problem(level_number, user, level_config=level)
-            problems.append(problem)
-        
-        level_data = {
-            'level_number': level.level_number,
-            'difficulty': level.difficulty,
-            'time_limit': level.time_limit,
-            'problems_required': level.problems_required,
-            'points_per_problem': level.points_per_problem,
-            'operations': level.operations,
-            'problems': problems,
-            'ai_problems_count': ai_problems_count,
-            'db_problems_count': db_problems_count
-        }
-        
-        return JsonResponse(level_data)
-        
+                    problem_number=first_ai + slot + 1
+                ),
+                ai_slots,
+                flight_key=math_flight_key(context)
+            ):
+                yield build(problem)
+    
+    novel = novel_problems()
+    total = len(templates) + novel_slots
+    template_at = {0} | set(random.sample(range(1, total), len(templates) - 1)) if templates else set()
+    for position in range(total):
+        if position in template_at and templates:
+            yield 'template', templates.pop()
+        else:
+            item = next(novel, None)
+            if item is not None:
+                yield item
+    yield from novel
+    for problem in templates:
+        yield 'template', problem
+    
+    context['seen'].save()
+
+def math_level_data(context, problems):
+    level_data = math_level_metadata(context)
+    level_data.update({
+        'problems': [problem for source, problem in problems],
+        'ai_problems_count': sum(1 for source, problem in problems if source == 'ai'),
+        'db_problems_count': sum(1 for source, problem in problems if source == 'db'),
+        'template_problems_count': sum(1 for source, problem in problems if source == 'template')
+    })
+    return level_data
+
+def get_math_level(request):
+    """Get math problems for a specific level, filtered by user age"""
+    try:
+        context = prepare_math_level(request)
     except MathGameLevel.DoesNotExist:
         return JsonResponse({'error': 'Level not found'}, status=404)
+    
+    problems = list(track_level('math', iter_math_problems(context)))
+    return JsonResponse(math_level_data(context, problems))
+
+async def get_math_level_async(request):
+    """
+    Async variant of get_math_level for ASGI workers: the AI calls are
+    awaited on the event loop and only the ORM work runs in a thread
+    """
+    started = time.monotonic()
+    try:
+        context = await sync_to_async(prepare_math_level)(request)
+    except MathGameLevel.DoesNotExist:
+        return JsonResponse({'error': 'Level not found'}, status=404)
+    
+    level = context['level']
+    user_age = context['user_age'] or 10
+    template_slots = local_template_slots(level)
+    novel_slots = level.problems_required - template_slots
+    stocked_problems = await sync_to_async(pop_stocked_problems)(context, novel_slots)
+    remaining = novel_slots - len(stocked_problems)
+    ai_slots = plan_ai_slots('math', remaining, len(context['db_problems']))
+    first_ai = template_slots + len(stocked_problems) + remaining - ai_slots
+    ai_problems = await gather_batch_with_backfill(
+        partial(
+            generate_ai_math_problems_batch_async,
+            level.difficulty,
+            level.operations,
+            level.number_range_min,
+            level.number_range_max,
+            user_age,
+            start_number=first_ai + 1
+        ),
+        lambda slot: generate_ai_math_problem_async(
+            difficulty=level.difficulty,
+            operations=level.operations,
+            min_value=level.number_range_min,
+            max_value=level.number_range_max,
+            age=user_age,
+            problem_number=first_ai + slot + 1
+        ),
+        ai_slots,
+        flight_key=math_flight_key(context)
+    )
+    
+    def assemble():
+        items = iter_math_problems(context, stocked_problems=stocked_problems, ai_problems=ai_problems)
+        return math_level_data(context, list(track_level('math', items, started=started)))
+    
+    return JsonResponse(await sync_to_async(assemble)())
+
+def stream_math_level(request):
+    """
+    Streaming variant of get_math_level: sends the level metadata at once,
+    then each problem as soon as it is ready (NDJSON, see core/streaming.py)
+    """
+    try:
+        context = prepare_math_level(request)
+    except MathGameLevel.DoesNotExist:
+        return JsonResponse({'error': 'Level not found'}, status=404)
+    
+    def events():
+        yield {'type': 'level', **math_level_metadata(context)}
+        counts = {'template': 0, 'ai': 0, 'db': 0, 'generated': 0}
+        for source, problem in track_level('math', iter_math_problems(context)):
+            counts[source] += 1
+            yield {'type': 'problem', 'problem': problem}
+        yield {
+            'type': 'done',
+            'ai_problems_count': counts['ai'],
+            'db_problems_count': counts['db'],
+            'template_problems_count': counts['template']
+        }
+    
+    return ndjson_response(events())
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -0,0 +1,159 @@
+"""
+Local template engine for math problems.
+
+Builds bare expressions and short word problems set in Malawi (local names,
+market goods, Kwacha prices) within a MathGameLevel's operations and number
+range. Operands are drawn so every answer is a whole number, and the answer
+is computed here rather than parsed, so no validation is needed. The level
+endpoints fill MATH_LOCAL_TEMPLATE_RATIO of each level from here and only
+send the rest to the LLM for novelty.
+"""
+import random
+
+NAMES = [
+    'Chikondi', 'Thoko', 'Kondwani', 'Mphatso', 'Tiyamike', 'Chisomo', 'Limbani',
+    'Madalitso', 'Tawonga', 'Yamikani', 'Dalitso', 'Chimwemwe', 'Takondwa', 'Wezi',
+]
+# (plural, singular)
+THINGS = [
+    ('mangoes', 'mango'), ('bananas', 'banana'), ('eggs', 'egg'), ('maize cobs', 'maize cob'),
+    ('exercise books', 'exercise book'), ('pencils', 'pencil'), ('chambo fish', 'chambo fish'),
+    ('groundnuts', 'groundnut'), ('oranges', 'orange'), ('sweet potatoes', 'sweet potato'),
+]
+PLACES = ['the market in Lilongwe', 'Zomba market', 'the shop in Mzuzu', 'Limbe market', 'the village shop']
+CONTAINERS = ['baskets', 'bags', 'boxes', 'buckets']
+
+WORD_TEMPLATES = {
+    '+': [
+        "{name} has {a} {things}. {name2} gives {name} {b} more. How many {things} does {name} have now?",
+        "At {place}, {name} buys one {thing} for MK{a} and another for MK{b}. How many Kwacha does {name} spend?",
+        "{name} picked {a} {things} in the morning and {b} in the afternoon. How many {things} did {name} pick?",
+    ],
+    '-': [
+        "{name} has {a} {things} and gives {b} to {name2}. How many {things} are left?",
+        "{name} has MK{a} and spends MK{b} at {place}. How many Kwacha are left?",
+        "There were {a} {things} at {place}. {b} were sold. How many {things} remain?",
+    ],
+    '×': [
+        "{name} fills {a} {containers} with {b} {things} each. How many {things} is that altogether?",
+        "One {thing} costs MK{a} at {place}. How many Kwacha do {b} of them cost?",
+        "{name} reads {a} pages every day for {b} days. How many pages does {name} read?",
+    ],
+    '÷': [
+        "{name} shares {a} {things} equally among {b} friends. How many {things} does each friend get?",
+        "{a} {things} are packed into {containers} of {b}. How many {containers} are filled?",
+        "{name} pays MK{a} for {b} {things} at {place}, all at the same price. How many Kwacha is one {thing}?",
+    ],
+}
+
+EXPLANATIONS = {
+    '+': "{a} + {b} = {answer}",
+    '-': "{a} - {b} = {answer}",
+    '×': "{a} × {b} = {answer}",
+    '÷': "{a} ÷ {b} = {answer}, because {b} × {answer} = {a}",
+}
+
+HINTS = {
+    '+': "Put the two amounts together: {a} and {b}.",
+    '-': "Take {b} away from {a}.",
+    '×': "Count {b} groups of {a}, or {a} groups of {b}.",
+    '÷': "How many groups of {b} fit into {a}?",
+}
+
+TIPS = {
+    '+': "Addition combines numbers to make a larger number.",
+    '-': "Subtraction finds the difference between two numbers.",
+    '×': "Multiplication is repeated addition.",
+    '÷': "Division splits a number into equal groups.",
+}
+
+# Largest second factor / divisor, so times tables stay learnable
+MAX_FACTOR = 10
+
+
+def age_number_cap(age, max_value):
+    """Same age limits as the locally generated fallback problems"""
+    if age is not None and age <= 6:
+        return min(max_value, 10)
+    if age is not None and age <= 9:
+        return min(max_value, 20)
+    return max_value
+
+
+def word_problem_share(age):
+    """Younger players get more bare expressions and fewer sentences to read"""
+    if age is None:
+        return 0.5
+    if age <= 6:
+        return 0.25
+    if age <= 9:
+        return 0.5
+    return 0.7
+
+
+def draw_operands(operation, min_value, max_value, rng):
+    """Return (a, b, answer) for `operation`, with a whole, non-negative answer"""
+    low = max(0, min_value)
+    high = max(low + 1, max_value)
+    if operation == '-':
+        a = rng.randint(low, high)
+        b = rng.randint(min(low, a), a)
+        return a, b, a - b
+    if operation == '×':
+        a = rng.randint(max(1, low), high)
+        b = rng.randint(2, max(2, min(high, MAX_FACTOR)))
+        return a, b, a * b
+    if operation == '÷':
+        b = rng.randint(2, max(2, min(high, MAX_FACTOR)))
+        answer = rng.randint(max(1, low), high)
+        return b * answer, b, answer
+    a, b = rng.randint(low, high), rng.randint(low, high)
+    return a, b, a + b
+
+
+def build_template_problem(operations, min_value, max_value, age=None, rng=random):
+    """One problem in the level payload format, correct by construction"""
+    operation = rng.choice([op for op in operations or ['+'] if op in WORD_TEMPLATES] or ['+'])
+    a, b, answer = draw_operands(operation, min_value, age_number_cap(age, max_value), rng)
+    values = {'a': a, 'b': b, 'answer': answer}
+    expression = f"{a} {operation} {b}"
+
+    if rng.random() < word_problem_share(age):
+        name, name2 = rng.sample(NAMES, 2)
+        things, thing = rng.choice(THINGS)
+        problem_text = rng.choice(WORD_TEMPLATES[operation]).format(
+            name=name, name2=name2, things=things, thing=thing,
+            place=rng.choice(PLACES), containers=rng.choice(CONTAINERS), **values
+        )
+        display_text = problem_text
+    else:
+        problem_text = expression
+        display_text = f"{expression} = ?"
+
+    return {
+        'problem_text': problem_text,
+        'display_text': display_text,
+        'correct_answer': answer,
+        'operation': operation,
+        'tip': TIPS[operation],
+        'hint': HINTS[operation].format(**values),
+        'explanation': EXPLANATIONS[operation].format(**values),
+        'is_ai': False
+    }
+
+
+def build_template_problems(level, count, age=None, rng=random):
+    """`count` distinct template problems for a MathGameLevel"""
+    problems = []
+    seen = set()
+    attempts = 0
+    while len(problems) < count and attempts < count * 10:
+        attempts += 1
+        problem = build_template_problem(
+            level.operations, level.number_range_min, level.number_range_max, age, rng
+        )
+        if problem['problem_text'] in seen:
+            continue
+        seen.add(problem['problem_text'])
+        problems.append(problem)
+    return problems
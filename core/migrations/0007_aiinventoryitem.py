@@ -0,0 +1,31 @@
+# Generated by Django 4.2.26 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_riddlecategory_userriddleprogress_riddlequestion_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIInventoryItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('game', models.CharField(choices=[('quiz', 'Quiz'), ('riddle', 'Riddle'), ('math', 'Math')], max_length=10)),
+                ('difficulty', models.CharField(max_length=10)),
+                ('age_band', models.CharField(max_length=10)),
+                ('topic', models.CharField(max_length=100)),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'AI Inventory Item',
+                'verbose_name_plural': 'AI Inventory Items',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['game', 'difficulty', 'age_band', 'topic', 'created_at'], name='core_aiinv_bucket_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+from math import isqrt
+
+from django.db import migrations
+
+# Frozen copies of the packing helpers in core.word_search_engine, so this
+# migration keeps working however the app code changes
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (-1, 1), (0, -1), (-1, 0), (-1, -1), (1, -1)]
+
+
+def pack_grid(grid_data):
+    if isinstance(grid_data, str):
+        return grid_data
+    return ''.join(''.join(cell) for cell in grid_data or ())
+
+
+def pack_positions(words, word_positions, width):
+    if isinstance(word_positions, list):
+        return word_positions
+    packed = []
+    for word in words:
+        cells = word_positions.get(word)
+        if not cells:
+            packed += [-1, 0, 0]
+            continue
+        start = cells[0]
+        direction = 0
+        if len(cells) > 1:
+            row_step = cells[1] // width - start // width
+            direction = DIRECTIONS.index((row_step, cells[1] - start - row_step * width))
+        packed += [start, direction, len(cells)]
+    return packed
+
+
+def unpack_positions(words, word_positions, width):
+    if isinstance(word_positions, dict):
+        return word_positions
+    positions = {}
+    for word, offset in zip(words, range(0, len(word_positions), 3)):
+        start, direction, length = word_positions[offset:offset + 3]
+        if start < 0:
+            continue
+        dr, dc = DIRECTIONS[direction]
+        positions[word] = [start + (dr * width + dc) * step for step in range(length)]
+    return positions
+
+
+def pack_puzzles(apps, schema_editor):
+    WordSearchPuzzle = apps.get_model('core', 'WordSearchPuzzle')
+    puzzles = []
+    for puzzle in WordSearchPuzzle.objects.iterator():
+        grid = pack_grid(puzzle.grid_data)
+        # The stored grid's own width; it need not match the level's grid_size
+        puzzle.word_positions = pack_positions(puzzle.words, puzzle.word_positions or {}, isqrt(len(grid)))
+        puzzle.grid_data = grid
+        puzzles.append(puzzle)
+    WordSearchPuzzle.objects.bulk_update(puzzles, ['grid_data', 'word_positions'], batch_size=500)
+
+
+def unpack_puzzles(apps, schema_editor):
+    WordSearchPuzzle = apps.get_model('core', 'WordSearchPuzzle')
+    puzzles = []
+    for puzzle in WordSearchPuzzle.objects.iterator():
+        grid = pack_grid(puzzle.grid_data)
+        puzzle.word_positions = unpack_positions(puzzle.words, puzzle.word_positions, isqrt(len(grid)))
+        puzzle.grid_data = list(grid)
+        puzzles.append(puzzle)
+    WordSearchPuzzle.objects.bulk_update(puzzles, ['grid_data', 'word_positions'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_aiinventoryitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(pack_puzzles, unpack_puzzles),
+    ]
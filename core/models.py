@@ -185,8 +185,8 @@ class WordSearchPuzzle(models.Model):  # REMOVE THIS DUPLICATE
     category = models.ForeignKey(WordSearchCategory, on_delete=models.CASCADE, related_name='puzzles')
     level = models.ForeignKey(WordSearchLevel, on_delete=models.CASCADE, related_name='puzzles')
     words = models.JSONField()  # List of words for the puzzle
-    grid_data = models.JSONField()  # Pre-generated grid data
-    word_positions = models.JSONField()  # Word positions in the grid
+    grid_data = models.JSONField()  # Pre-generated grid, packed as one string of letters
+    word_positions = models.JSONField()  # Packed [start, direction, length, ...] per word (see word_search_engine)
     hints = models.JSONField(default=dict)  # Word hints
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -811,4 +811,35 @@ class UserRiddleProgress(models.Model):
     def accuracy_rate(self):
         if self.total_questions == 0:
             return 0
-        return round((self.correct_answers / self.total_questions) * 100, 1)
\ No newline at end of file
+        return round((self.correct_answers / self.total_questions) * 100, 1)
+
+
+# ============================================
+# AI CONTENT INVENTORY
+# ============================================
+
+class AIInventoryItem(models.Model):
+    """Pre-generated AI quiz questions, riddles and math problems waiting to be served"""
+    GAME_CHOICES = [
+        ('quiz', 'Quiz'),
+        ('riddle', 'Riddle'),
+        ('math', 'Math'),
+    ]
+
+    game = models.CharField(max_length=10, choices=GAME_CHOICES)
+    difficulty = models.CharField(max_length=10)
+    age_band = models.CharField(max_length=10)  # See game_utils.get_age_band
+    topic = models.CharField(max_length=100)
+    payload = models.JSONField()  # Same shape the generator returns
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "AI Inventory Item"
+        verbose_name_plural = "AI Inventory Items"
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['game', 'difficulty', 'age_band', 'topic', 'created_at'], name='core_aiinv_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.game} [{self.difficulty}, {self.age_band}] {self.topic}"
@@ -1,21 +1,61 @@
 import json
 import random
+import time
+from functools import partial
+from asgiref.sync import sync_to_async
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from .models import QuizCategory, QuizQuestion, QuizLevel, QuizGameSession, UserQuizProgress
-from .game_utils import filter_by_age_appropriate, get_age_from_birthdate, get_difficulty_by_age
+from .game_utils import filter_by_age, filter_by_age_appropriate, get_age_band, get_age_from_birthdate, get_difficulty_by_age
 from django.shortcuts import render
-from .ai_question_generator import generate_ai_question, create_unique_fallback_question
+from .ai_question_generator import (
+    generate_ai_question, generate_ai_question_async, request_ai_question, request_ai_question_async,
+    request_ai_questions_batch, request_ai_questions_batch_async, create_unique_fallback_question
+)
+from .ai_executor import gather_batch_with_backfill, iter_batch_with_backfill
+from .ai_inventory import pop_items
+from .streaming import ndjson_response
+from .ai_metrics import track_level
+from .ai_policy import plan_ai_slots
+from .db_sampler import pk_sampler
+from .seen_content import load_seen
+
+# Columns the level payload reads from a database question
+QUIZ_QUESTION_FIELDS = [
+    'question_text', 'option_a', 'option_b', 'option_c', 'option_d',
+    'correct_option', 'explanation', 'points'
+]
 
 def quizes(request):
     return render(request, 'quizes/quizes.html')    
 
-def get_quiz_level(request):
-    """Get quiz questions for a specific level, mixing AI and database questions"""
+def get_topic_categories(level, age=None):
+    """Active categories suited to the player's age, falling back to the level's own category"""
+    categories = QuizCategory.objects.filter(is_active=True)
+    categories_query = filter_by_age(categories, age, 'difficulty')
+    
+    # Use age-appropriate category if available
+    age_difficulty = get_difficulty_by_age(age)
+    if age_difficulty:
+        categories_query = categories_query.filter(difficulty=age_difficulty)
+    
+    # If no age-appropriate category, fall back to level's category
+    if not categories_query.exists():
+        categories_query = QuizCategory.objects.filter(pk=level.category.pk)
+    return categories_query
+
+def prepare_quiz_level(request):
+    """
+    Resolve everything a level request needs before any question is produced:
+    the level, its AI topic and the database fallback pool.
+    Raises QuizLevel.DoesNotExist for unknown levels.
+    """
     level_number = int(request.GET.get('level', 1))
     
-    # Get list of already answered question IDs to exclude
+    # Questions this learner has already been served are skipped; older
+    # clients may still send the ids they answered
+    seen = load_seen(request, 'quiz')
     answered_ids_param = request.GET.get('answered_ids', '')
     answered_ids = []
     if answered_ids_param:
@@ -24,141 +64,259 @@ def get_quiz_level(request):
         except ValueError:
             answered_ids = []
     
+    # Filter levels by age-appropriate difficulty
+    levels = QuizLevel.objects.filter(level_number=level_number)
+    user = request.user if request.user.is_authenticated else None
+    levels_query = filter_by_age_appropriate(user, levels, 'category__difficulty')
+    level = levels_query.first()
+    
+    if not level:
+        # Fallback to default level if age filtering removes it
+        level = QuizLevel.objects.get(level_number=level_number)
+    
+    # Get user age for category filtering and AI question generation
+    profile_age = None
+    if user and hasattr(user, 'profile') and user.profile.date_of_birth:
+        profile_age = get_age_from_birthdate(user.profile.date_of_birth)
+    
+    categories_query = get_topic_categories(level, profile_age)
+    
+    # Get available database questions (excluding answered ones), drawn at
+    # random from the cached ids instead of sorting the table
+    db_questions = pk_sampler.sample(
+        QuizQuestion,
+        {'category__in': list(categories_query.values_list('pk', flat=True)), 'is_active': True},
+        exclude=seen.id_set.union(answered_ids),
+        fields=QUIZ_QUESTION_FIELDS
+    )
+    
+    # Define points based on difficulty
+    difficulty_points_map = {
+        'easy': 10,
+        'medium': 15,
+        'hard': 20,
+        'expert': 25
+    }
+    
+    current_difficulty = level.category.difficulty
+    
+    # Get category for AI questions context
+    category = categories_query.first()
+    
+    return {
+        'level': level,
+        'level_number': level_number,
+        'difficulty': current_difficulty,
+        'points': difficulty_points_map.get(current_difficulty, 10),
+        'topic': category.name if category else "general knowledge",
+        'user_age': profile_age if profile_age is not None else 10,  # default
+        'db_questions': db_questions,  # Random order, fetched as used
+        'seen': seen,
+    }
+
+
+def quiz_level_metadata(context):
+    level = context['level']
+    return {
+        'level_number': level.level_number,
+        'category': level.category.name,
+        'difficulty': context['difficulty'],
+        'color': level.category.color,
+        'icon': level.category.icon,
+        'time_limit': level.time_limit,
+        'questions_required': level.questions_required,
+    }
+
+
+def quiz_flight_key(context):
+    """Players opening the same level together share one generation"""
+    return ('quiz', context['level_number'], context['difficulty'], get_age_band(context['user_age']), context['topic'])
+
+
+def pop_stocked_questions(context):
+    return pop_items('quiz', context['difficulty'], context['user_age'], context['topic'], context['level'].questions_required)
+
+
+def iter_quiz_questions(context, stocked=None, ai_questions=None):
+    """
+    Yield (source, question) pairs as each question of the level becomes
+    ready; source is 'ai', 'db' or 'fallback'.
+    STRATEGY: Use AI questions first, fallback to database questions when AI fails or is too slow
+    The async view passes the inventory items and AI results it already awaited.
+    Served questions are recorded in the learner's seen set once the level is complete.
+    """
+    level_number = context['level_number']
+    current_difficulty = context['difficulty']
+    topic = context['topic']
+    user_age = context['user_age']
+    available_db_questions = context['db_questions']
+    questions_needed = context['level'].questions_required
+    seen = context['seen']
+
+    def build(i, ai_question):
+        if ai_question is not None and seen.has_text(ai_question['question']):
+            # Served to this learner before; a database question takes the slot
+            ai_question = None
+        if ai_question is not None:
+            seen.add_text(ai_question['question'])
+            return 'ai', {
+                'id': f"ai_{level_number}_{i}_{random.randint(1000,9999)}",
+                'question_text': ai_question['question'],
+                'options': [
+                    {'letter': 'A', 'text': ai_question['options'][0]},
+                    {'letter': 'B', 'text': ai_question['options'][1]},
+                    {'letter': 'C', 'text': ai_question['options'][2]},
+                    {'letter': 'D', 'text': ai_question['options'][3]}
+                ],
+                'correct_option': ai_question['correct'],
+                'explanation': ai_question['explanation'],
+                'points': context['points'],
+                'is_ai': True
+            }
+        if available_db_questions:
+            # AI failed or timed out, use database question as fallback
+            db_question = available_db_questions.pop(0)
+            seen.add_id(db_question.id)
+            return 'db', {
+                'id': db_question.id,
+                'question_text': db_question.question_text,
+                'options': db_question.get_options(),
+                'correct_option': db_question.correct_option,
+                'explanation': db_question.explanation,
+                'points': db_question.points,
+                'is_ai': False
+            }
+        # Last resort: use simple fallback
+        return 'fallback', create_unique_fallback_question(level_number, i, current_difficulty, topic)
+
+    # Serve pre-generated questions from the warm inventory first
+    if stocked is None:
+        stocked = pop_stocked_questions(context)
+    for i, ai_question in enumerate(stocked):
+        yield build(i, ai_question)
+
+    # While the provider is slow, slots the database can cover are served
+    # from it straight away instead of waiting on the AI
+    remaining = questions_needed - len(stocked)
+    if ai_questions is None:
+        ai_slots = plan_ai_slots('quiz', remaining, len(available_db_questions))
+    else:
+        ai_slots = len(ai_questions)
+    first_ai = len(stocked) + remaining - ai_slots
+    for i in range(len(stocked), first_ai):
+        yield build(i, None)
+
+    if ai_questions is not None:
+        for slot, ai_question in enumerate(ai_questions):
+            yield build(first_ai + slot, ai_question)
+    else:
+        # Ask for the rest in one batched call and back-fill only its invalid
+        # slots over the shared pool; slots that fail or miss the level
+        # deadline come back as None
+        for slot, ai_question in iter_batch_with_backfill(
+            partial(request_ai_questions_batch, current_difficulty, user_age, topic, start_number=first_ai + 1),
+            lambda slot: request_ai_question(
+                difficulty=current_difficulty,
+                age=user_age,
+                topic=topic,
+                question_number=first_ai + slot + 1
+            ),
+            ai_slots,
+            flight_key=quiz_flight_key(context)
+        ):
+            yield build(first_ai + slot, ai_question)
+
+    seen.save()
+
+
+def get_quiz_level(request):
+    """Get quiz questions for a specific level, mixing AI and database questions"""
     try:
-        # Filter levels by age-appropriate difficulty
-        levels = QuizLevel.objects.filter(level_number=level_number)
-        user = request.user if request.user.is_authenticated else None
-        levels_query = filter_by_age_appropriate(user, levels, 'category__difficulty')
-        level = levels_query.first()
-        
-        if not level:
-            # Fallback to default level if age filtering removes it
-            level = QuizLevel.objects.get(level_number=level_number)
-        
-        # Filter categories by age-appropriate difficulty
-        categories = QuizCategory.objects.filter(is_active=True)
-        categories_query = filter_by_age_appropriate(user, categories, 'difficulty')
-        
-        # Use age-appropriate category if available
-        if user and hasattr(user, 'profile') and user.profile.date_of_birth:
-            user_age = get_age_from_birthdate(user.profile.date_of_birth)
-            age_difficulty = get_difficulty_by_age(user_age)
-            if age_difficulty:
-                categories_query = categories_query.filter(difficulty=age_difficulty)
-        
-        # If no age-appropriate category, fall back to level's category
-        if not categories_query.exists():
-            categories_query = QuizCategory.objects.filter(pk=level.category.pk)
-        
-        # Get available database questions (excluding answered ones)
-        questions_query = QuizQuestion.objects.filter(
-            category__in=categories_query.values_list('pk', flat=True),
-            is_active=True
-        )
-        
-        # Exclude already answered questions
-        if answered_ids:
-            questions_query = questions_query.exclude(id__in=answered_ids)
-        
-        # Get available database questions
-        available_db_questions = list(questions_query.order_by('?'))  # Random order
-        available_count = len(available_db_questions)
-        questions_needed = level.questions_required
-        
-        questions_data = []
-        
-        # Define points based on difficulty
-        difficulty_points_map = {
-            'easy': 10,
-            'medium': 15,
-            'hard': 20,
-            'expert': 25
-        }
-        
-        current_difficulty = level.category.difficulty
-        points = difficulty_points_map.get(current_difficulty, 10)
-        
-        # Get category for AI questions context
-        category = categories_query.first()
-        topic = category.name if category else "general knowledge"
-        
-        # Get user age for AI question generation
-        user_age = 10  # default
-        if user and hasattr(user, 'profile') and user.profile.date_of_birth:
-            user_age = get_age_from_birthdate(user.profile.date_of_birth)
-
-
-        # STRATEGY: Use AI questions first, fallback to database questions when AI fails
-        ai_questions_count = 0
-        db_questions_count = 0
-
-        for i in range(questions_needed):
-            # Try AI question first
-            try:
-                ai_question = generate_ai_question(
-                    difficulty=current_difficulty,
-                    age=user_age,
-                    topic=topic,
-                    question_number=i + 1
-                )
-                
-                questions_data.append({
-                    'id': f"ai_{level_number}_{i}_{random.randint(1000,9999)}",
-                    'question_text': ai_question['question'],
-                    'options': [
-                        {'letter': 'A', 'text': ai_question['options'][0]},
-                        {'letter': 'B', 'text': ai_question['options'][1]},
-                        {'letter': 'C', 'text': ai_question['options'][2]},
-                        {'letter': 'D', 'text': ai_question['options'][3]}
-                    ],
-                    'correct_option': ai_question['correct'],
-                    'explanation': ai_question['explanation'],
-                    'points': points,
-                    'is_ai': True
-                })
-                ai_questions_count += 1
-                
-            except Exception as e:
-                print(f"Error generating AI question: {e}")
-                # AI failed, use database question as fallback
-                if available_db_questions:
-                    db_question = available_db_questions.pop(0)
-                    questions_data.append({
-                        'id': db_question.id,
-                        'question_text': db_question.question_text,
-                        'options': db_question.get_options(),
-                        'correct_option': db_question.correct_option,
-                        'explanation': db_question.explanation,
-                        'points': db_question.points,
-                        'is_ai': False
-                    })
-                    db_questions_count += 1
-                else:
-                    # Last resort: use simple fallback
-                    questions_data.append(create_unique_fallback_question(level_number, i, current_difficulty, topic))
-        
-        # Shuffle the final questions to mix AI and database questions randomly
-        #random.shuffle(questions_data)
-        
-        level_data = {
-            'level_number': level.level_number,
-            'category': level.category.name,
-            'difficulty': current_difficulty,
-            'color': level.category.color,
-            'icon': level.category.icon,
-            'time_limit': level.time_limit,
-            'questions_required': level.questions_required,
-            'questions': questions_data,
-            'ai_questions_count': ai_questions_count,
-            'db_questions_count': db_questions_count
-        }
-        
-        print(f"Level {level_number}: {db_questions_count} DB questions, {ai_questions_count} AI questions")
-        
-        return JsonResponse(level_data)
-        
+        context = prepare_quiz_level(request)
     except QuizLevel.DoesNotExist:
         return JsonResponse({'error': 'Level not found'}, status=404)
+    
+    questions = list(track_level('quiz', iter_quiz_questions(context)))
+    return JsonResponse(quiz_level_data(context, questions))
+
+
+def quiz_level_data(context, questions):
+    questions_data = [question for source, question in questions]
+    ai_questions_count = sum(1 for source, question in questions if source == 'ai')
+    db_questions_count = sum(1 for source, question in questions if source == 'db')
+    
+    # Shuffle the final questions to mix AI and database questions randomly
+    #random.shuffle(questions_data)
+    
+    level_data = quiz_level_metadata(context)
+    level_data.update({
+        'questions': questions_data,
+        'ai_questions_count': ai_questions_count,
+        'db_questions_count': db_questions_count
+    })
+    
+    print(f"Level {context['level_number']}: {db_questions_count} DB questions, {ai_questions_count} AI questions")
+    
+    return level_data
+
+
+async def get_quiz_level_async(request):
+    """
+    Async variant of get_quiz_level for ASGI workers: the AI calls are
+    awaited on the event loop and only the ORM work runs in a thread
+    """
+    started = time.monotonic()
+    try:
+        context = await sync_to_async(prepare_quiz_level)(request)
+    except QuizLevel.DoesNotExist:
+        return JsonResponse({'error': 'Level not found'}, status=404)
+    
+    stocked = await sync_to_async(pop_stocked_questions)(context)
+    remaining = context['level'].questions_required - len(stocked)
+    ai_slots = plan_ai_slots('quiz', remaining, len(context['db_questions']))
+    first_ai = len(stocked) + remaining - ai_slots
+    ai_questions = await gather_batch_with_backfill(
+        partial(
+            request_ai_questions_batch_async,
+            context['difficulty'], context['user_age'], context['topic'],
+            start_number=first_ai + 1
+        ),
+        lambda slot: request_ai_question_async(
+            difficulty=context['difficulty'],
+            age=context['user_age'],
+            topic=context['topic'],
+            question_number=first_ai + slot + 1
+        ),
+        ai_slots,
+        flight_key=quiz_flight_key(context)
+    )
+    
+    def assemble():
+        items = iter_quiz_questions(context, stocked=stocked, ai_questions=ai_questions)
+        return quiz_level_data(context, list(track_level('quiz', items, started=started)))
+    
+    return JsonResponse(await sync_to_async(assemble)())
+
+
+def stream_quiz_level(request):
+    """
+    Streaming variant of get_quiz_level: sends the level metadata at once,
+    then each question as soon as it is ready (NDJSON, see core/streaming.py)
+    """
+    try:
+        context = prepare_quiz_level(request)
+    except QuizLevel.DoesNotExist:
+        return JsonResponse({'error': 'Level not found'}, status=404)
+    
+    def events():
+        yield {'type': 'level', **quiz_level_metadata(context)}
+        counts = {'ai': 0, 'db': 0, 'fallback': 0}
+        for source, question in track_level('quiz', iter_quiz_questions(context)):
+            counts[source] += 1
+            yield {'type': 'question', 'question': question}
+        yield {'type': 'done', 'ai_questions_count': counts['ai'], 'db_questions_count': counts['db']}
+    
+    return ndjson_response(events())
 
 
 @csrf_exempt
@@ -279,6 +437,10 @@ def get_quiz_categories(request):
     return JsonResponse({'categories': categories_data})
 
 
+def next_question_age(user):
+    return user.profile.age if hasattr(user, "profile") else 10
+
+
 @csrf_exempt
 def get_next_question(request):
     user = request.user
@@ -288,8 +450,25 @@ def get_next_question(request):
     
     question_data = generate_ai_question(
         difficulty=difficulty,
-        age=user.profile.age if hasattr(user, "profile") else 10,
+        age=next_question_age(user),
         topic="mathematics"  # can change dynamically
     )
 
     return JsonResponse(question_data, safe=False)
+
+
+async def get_next_question_async(request):
+    """Async variant of get_next_question"""
+    # Resolving the session user and profile touches the ORM
+    age = await sync_to_async(next_question_age)(request.user)
+    
+    question_data = await generate_ai_question_async(
+        difficulty="easy",
+        age=age,
+        topic="mathematics"
+    )
+
+    return JsonResponse(question_data, safe=False)
+
+# csrf_exempt only wraps coroutine views from Django 5.0; the middleware reads this flag
+get_next_question_async.csrf_exempt = True
@@ -0,0 +1,130 @@
+"""
+Process-level index of riddle answers used as multiple-choice distractors.
+
+Answers of active riddles are bucketed by difficulty, category and shape
+(with or without a leading article, and word count), so wrong options read
+like the right one. A level samples a few answers from the narrowest bucket
+that has enough, widening to the difficulty and then the whole bank. No
+level reads or shuffles the full pool.
+
+The index is rebuilt lazily after RiddleQuestion or RiddleCategory rows
+change. The signal handlers bump a version key in the shared cache, so other
+worker processes rebuild too when the cache backend is shared.
+"""
+import logging
+import random
+import threading
+from collections import defaultdict
+from django.core.cache import cache
+from .models import RiddleQuestion
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'riddle_distractor_index_version'
+ARTICLES = ('a', 'an', 'the')
+# Extra answers drawn per sample to cover collisions with the correct answer
+SAMPLE_SLACK = 3
+
+
+def answer_shape(answer):
+    """('article'|'bare', words) — options of one shape don't give the answer away"""
+    words = answer.lower().split()
+    if not words:
+        return ('bare', 0)
+    return ('article' if words[0] in ARTICLES else 'bare', min(len(words), 3))
+
+
+class DistractorIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = None
+        self._version = None
+
+    def invalidate(self):
+        with self._lock:
+            self._buckets = None
+
+    def buckets(self):
+        """Current buckets, rebuilt when the rows have changed"""
+        version = cache.get(VERSION_KEY, 0)
+        buckets = self._buckets
+        if buckets is not None and version == self._version:
+            return buckets
+        with self._lock:
+            if self._buckets is None or version != self._version:
+                self._buckets = self.build()
+                self._version = version
+            return self._buckets
+
+    def build(self):
+        groups = defaultdict(set)
+        rows = RiddleQuestion.objects.filter(is_active=True).values_list(
+            'answer', 'category_id', 'category__difficulty'
+        )
+        for answer, category_id, difficulty in rows:
+            answer = (answer or '').strip()
+            if not answer:
+                continue
+            shape = answer_shape(answer)
+            groups[('category', category_id, shape)].add(answer)
+            groups[('category', category_id)].add(answer)
+            groups[('difficulty', difficulty, shape)].add(answer)
+            groups[('difficulty', difficulty)].add(answer)
+            groups[('shape', shape)].add(answer)
+            groups[('all',)].add(answer)
+        logger.info("Built riddle distractor index: %s answers", len(groups[('all',)]))
+        return {key: list(answers) for key, answers in groups.items()}
+
+    def pool(self, category_ids=(), difficulty=None):
+        return DistractorPool(self.buckets(), list(category_ids), difficulty)
+
+
+class DistractorPool:
+    """The buckets one level draws its distractors from"""
+
+    def __init__(self, buckets, category_ids, difficulty):
+        self.buckets = buckets
+        self.category_ids = category_ids
+        self.difficulty = difficulty
+
+    def scopes(self, shape):
+        # Narrowest first: same category and shape, then widen
+        for category_id in self.category_ids:
+            yield ('category', category_id, shape)
+        if self.difficulty:
+            yield ('difficulty', self.difficulty, shape)
+        for category_id in self.category_ids:
+            yield ('category', category_id)
+        yield ('shape', shape)
+        if self.difficulty:
+            yield ('difficulty', self.difficulty)
+        yield ('all',)
+
+    def sample(self, correct_answer, count, exclude=()):
+        """Up to `count` distinct answers unlike `correct_answer` or `exclude` (lower-cased)"""
+        taken = set(exclude) | {(correct_answer or '').strip().lower()}
+        picked = []
+        for scope in self.scopes(answer_shape(correct_answer or '')):
+            answers = self.buckets.get(scope)
+            if not answers:
+                continue
+            for answer in random.sample(answers, min(len(answers), count - len(picked) + SAMPLE_SLACK)):
+                key = answer.lower()
+                if key not in taken:
+                    taken.add(key)
+                    picked.append(answer)
+                    if len(picked) >= count:
+                        return picked
+        return picked
+
+
+distractor_index = DistractorIndex()
+
+
+def invalidate_distractor_index():
+    """Mark the index stale in this process and, through the cache, in the others"""
+    distractor_index.invalidate()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
@@ -0,0 +1,112 @@
+"""
+Near-duplicate index over the riddles a player has already seen.
+
+Gives exactly the same answers as the original pairwise check: a
+candidate is a duplicate of a used riddle when
+
+- more than `threshold` of the candidate's words also appear in it, or
+- one text contains the other and either is longer than 20 characters
+
+but looks up only the riddles that could match instead of scanning them all.
+
+- Word overlap uses prefix filtering. To share at least k of the
+  candidate's m words, a riddle must contain one of the candidate's
+  m - k + 1 rarest words, so only those words' postings are checked.
+- Substrings use character n-grams. A riddle containing the candidate has
+  all of its n-grams, so the rarest one finds it. A riddle contained in the
+  candidate starts at one of the candidate's n-gram positions, so riddles
+  are also indexed by their first n-gram.
+"""
+import math
+from collections import defaultdict
+
+# Characters per gram for the substring index
+GRAM_SIZE = 5
+# Texts longer than this count as duplicates when one contains the other
+SUBSTRING_MIN_LENGTH = 20
+
+
+def normalize(text):
+    return text.lower().strip()
+
+
+def grams(text):
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+class RiddleIndex:
+    def __init__(self, riddles=(), threshold=0.8):
+        self.threshold = threshold
+        self._texts = []
+        self._words = []
+        self._seen = set()
+        self._word_postings = defaultdict(set)   # word -> riddle ids
+        self._gram_postings = defaultdict(set)   # any gram of the riddle -> riddle ids
+        self._first_grams = defaultdict(set)     # first gram of the riddle -> riddle ids
+        self._short = []                         # riddles shorter than a gram
+        self.update(riddles)
+
+    def __len__(self):
+        return len(self._texts)
+
+    def update(self, riddles):
+        for text in riddles:
+            self.add(text)
+
+    def add(self, text):
+        text = normalize(text)
+        if text in self._seen:
+            return
+        self._seen.add(text)
+        riddle_id = len(self._texts)
+        words = set(text.split())
+        self._texts.append(text)
+        self._words.append(words)
+        for word in words:
+            self._word_postings[word].add(riddle_id)
+        if len(text) < GRAM_SIZE:
+            self._short.append(riddle_id)
+            return
+        for gram in grams(text):
+            self._gram_postings[gram].add(riddle_id)
+        self._first_grams[text[:GRAM_SIZE]].add(riddle_id)
+
+    def is_used(self, text):
+        """Whether `text` is too similar to a riddle already in the index"""
+        text = normalize(text)
+        return self._overlaps(text) or self._contains(text)
+
+    def _overlaps(self, text):
+        words = set(text.split())
+        if not words:
+            return False
+        # Shared words a match needs, rounded down so float error only adds probes
+        needed = max(1, math.floor(self.threshold * len(words)))
+        if needed > len(words):
+            return False
+        probes = sorted(words, key=lambda word: len(self._word_postings.get(word, ())))
+        candidates = set()
+        for word in probes[:len(words) - needed + 1]:
+            candidates.update(self._word_postings.get(word, ()))
+        return any(
+            len(words & self._words[riddle_id]) / len(words) > self.threshold
+            for riddle_id in candidates
+        )
+
+    def _contains(self, text):
+        # The candidate inside a longer used riddle
+        if len(text) >= GRAM_SIZE:
+            postings = min((self._gram_postings.get(gram, set()) for gram in grams(text)), key=len)
+        else:
+            postings = range(len(self._texts))
+        if any(len(self._texts[riddle_id]) > SUBSTRING_MIN_LENGTH and text in self._texts[riddle_id]
+               for riddle_id in postings):
+            return True
+
+        # A used riddle inside a longer candidate
+        if len(text) <= SUBSTRING_MIN_LENGTH:
+            return False
+        candidates = set(self._short)
+        for gram in grams(text):
+            candidates.update(self._first_grams.get(gram, ()))
+        return any(self._texts[riddle_id] in text for riddle_id in candidates)
@@ -0,0 +1,83 @@
+"""
+Keeps the riddle levels in the same structure as the quiz levels.
+
+Runs when QuizLevel/QuizCategory rows change (see core.signals) and from
+the sync_riddle_levels command, never inside a request. Each run is a fixed
+handful of statements however many levels there are: one read of each side,
+then bulk inserts/updates of the riddle categories and one upsert of the
+riddle levels.
+"""
+import logging
+from django.db import transaction
+from .models import QuizLevel, RiddleCategory, RiddleLevel
+from .riddle_distractors import invalidate_distractor_index
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_FIELDS = ['difficulty', 'description', 'color', 'icon', 'is_active']
+LEVEL_FIELDS = ['questions_required', 'time_limit', 'unlock_score']
+
+
+def sync_riddle_levels_from_quiz():
+    """Ensure riddles share the same level structure as the quiz game; returns rows written"""
+    with transaction.atomic():
+        quiz_levels = list(QuizLevel.objects.select_related('category'))
+        # Riddle categories are matched to quiz categories by name, oldest first
+        categories = {}
+        for category in RiddleCategory.objects.order_by('-pk'):
+            categories[category.name] = category
+
+        new_categories = {}
+        changed_categories = {}
+        for quiz_level in quiz_levels:
+            quiz_cat = quiz_level.category
+            values = {field: getattr(quiz_cat, field) for field in CATEGORY_FIELDS}
+            category = categories.get(quiz_cat.name)
+            if category is None:
+                category = new_categories.setdefault(quiz_cat.name, RiddleCategory(name=quiz_cat.name))
+            elif any(getattr(category, field) != value for field, value in values.items()):
+                changed_categories[category.pk] = category
+            for field, value in values.items():
+                setattr(category, field, value)
+
+        if new_categories:
+            RiddleCategory.objects.bulk_create(new_categories.values())
+            for category in RiddleCategory.objects.filter(name__in=new_categories).order_by('-pk'):
+                categories[category.name] = category
+        if changed_categories:
+            RiddleCategory.objects.bulk_update(changed_categories.values(), CATEGORY_FIELDS)
+
+        existing = {
+            level.level_number: level
+            for level in RiddleLevel.objects.all()
+        }
+        levels = []
+        for quiz_level in quiz_levels:
+            level = RiddleLevel(
+                level_number=quiz_level.level_number,
+                category_id=categories[quiz_level.category.name].pk,
+                **{field: getattr(quiz_level, field) for field in LEVEL_FIELDS}
+            )
+            current = existing.get(level.level_number)
+            if current is None or any(
+                getattr(current, field) != getattr(level, field) for field in ['category_id'] + LEVEL_FIELDS
+            ):
+                levels.append(level)
+        if levels:
+            RiddleLevel.objects.bulk_create(
+                levels,
+                update_conflicts=True,
+                unique_fields=['level_number'],
+                update_fields=['category'] + LEVEL_FIELDS,
+            )
+
+    if new_categories or changed_categories:
+        # Bulk writes send no signals; category difficulty buckets the distractors
+        invalidate_distractor_index()
+    written = len(new_categories) + len(changed_categories) + len(levels)
+    if written:
+        logger.info(
+            "Synced riddle levels from quiz: %s new categories, %s updated categories, %s levels",
+            len(new_categories), len(changed_categories), len(levels)
+        )
+    return written
@@ -473,35 +473,43 @@
 
 import json
 import random
+import time
+from functools import partial
+from asgiref.sync import sync_to_async
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.shortcuts import render
-from django.db import transaction, models
-from django.core.cache import cache
+from django.db import models
 from .models import (
     RiddleCategory,
     RiddleQuestion,
     RiddleLevel,
     RiddleGameSession,
     UserRiddleProgress,
-    QuizLevel,
 )
 from .game_utils import (
+    filter_by_age,
     filter_by_age_appropriate,
+    get_age_band,
     get_age_from_birthdate,
     get_difficulty_by_age,
 )
-from .ai_riddles_generator import generate_ai_riddle, create_unique_fallback_riddle
-
-# Cache keys for tracking used riddles
-def get_used_riddles_cache_key(session_id, level_number):
-    return f"used_riddles_{session_id}_level_{level_number}"
-
-def get_global_used_riddles_cache_key(user_id=None):
-    if user_id:
-        return f"global_used_riddles_user_{user_id}"
-    return "global_used_riddles_anonymous"
+from .ai_riddles_generator import (
+    generate_ai_riddle, request_ai_riddle, request_ai_riddle_async,
+    request_ai_riddles_batch, request_ai_riddles_batch_async, create_unique_fallback_riddle
+)
+from .ai_inventory import pop_items
+from .ai_executor import (
+    gather_batch_with_backfill, gather_with_deadline, get_level_deadline, iter_batch_with_backfill, run_with_deadline
+)
+from .streaming import ndjson_response
+from .ai_metrics import track_level
+from .ai_policy import plan_ai_slots
+from .riddle_index import RiddleIndex
+from .riddle_distractors import distractor_index
+from .db_sampler import pk_sampler
+from .seen_content import SeenSet, load_seen, owner_key
 
 def generate_options(correct_answer, answer_pool, distractors=None, num_options=4):
     """Generate multiple-choice options using AI distractors when available."""
@@ -527,16 +535,8 @@ def generate_options(correct_answer, answer_pool, distractors=None, num_options=
             add_option(distractor)
     
     # Priority 2: Use answers from other questions in the pool
-    if len(options) < num_options:
-        distractors_from_pool = [
-            ans for ans in answer_pool 
-            if ans and ans.strip().lower() != correct_answer.strip().lower()
-        ]
-        random.shuffle(distractors_from_pool)
-        
-        for ans in distractors_from_pool:
-            if len(options) >= num_options:
-                break
+    if len(options) < num_options and answer_pool is not None:
+        for ans in answer_pool.sample(correct_answer, num_options - len(options), exclude=normalized):
             add_option(ans)
     
     # Priority 3: Simple fallback generation based on answer characteristics
@@ -605,65 +605,6 @@ def build_hint(answer):
         return f"The answer starts with '{answer[0].upper()}'."
     return f"The answer starts with '{answer[0].upper()}' and ends with '{answer[-1].upper()}'."
 
-LEVELS_SYNCED = False
-
-def sync_riddle_levels_from_quiz():
-    """Ensure riddles share the same level structure as the quiz game."""
-    global LEVELS_SYNCED
-    if LEVELS_SYNCED:
-        return
-
-    with transaction.atomic():
-        quiz_levels = QuizLevel.objects.select_related('category').all()
-
-        for quiz_level in quiz_levels:
-            quiz_cat = quiz_level.category
-            riddle_category, created = RiddleCategory.objects.get_or_create(
-                name=quiz_cat.name,
-                defaults={
-                    'difficulty': quiz_cat.difficulty,
-                    'description': quiz_cat.description,
-                    'color': quiz_cat.color,
-                    'icon': quiz_cat.icon,
-                    'is_active': quiz_cat.is_active,
-                }
-            )
-
-            if not created:
-                updated = False
-                for field in ['difficulty', 'description', 'color', 'icon', 'is_active']:
-                    quiz_value = getattr(quiz_cat, field)
-                    if getattr(riddle_category, field) != quiz_value:
-                        setattr(riddle_category, field, quiz_value)
-                        updated = True
-                if updated:
-                    riddle_category.save()
-
-            riddle_level, created = RiddleLevel.objects.get_or_create(
-                level_number=quiz_level.level_number,
-                defaults={
-                    'category': riddle_category,
-                    'questions_required': quiz_level.questions_required,
-                    'time_limit': quiz_level.time_limit,
-                    'unlock_score': quiz_level.unlock_score,
-                }
-            )
-
-            if not created:
-                needs_save = False
-                if riddle_level.category != riddle_category:
-                    riddle_level.category = riddle_category
-                    needs_save = True
-                for field in ['questions_required', 'time_limit', 'unlock_score']:
-                    quiz_val = getattr(quiz_level, field)
-                    if getattr(riddle_level, field) != quiz_val:
-                        setattr(riddle_level, field, quiz_val)
-                        needs_save = True
-                if needs_save:
-                    riddle_level.save()
-
-    LEVELS_SYNCED = True
-
 def riddles_game(request):
     """Main riddles game view."""
     return render(request, 'riddles/riddles.html')
@@ -674,35 +615,37 @@ riddles = riddles_game
 def is_riddle_used(question_text, used_riddles, threshold=0.8):
     """
     Check if a riddle is too similar to already used ones.
-    Uses simple text similarity to prevent similar riddles.
+    Uses simple text similarity to prevent similar riddles; callers checking
+    many candidates should keep a RiddleIndex instead.
     """
-    question_lower = question_text.lower().strip()
+    return RiddleIndex(used_riddles, threshold).is_used(question_text)
+
+def get_topic_categories(level, age=None):
+    """Active categories suited to the player's age, falling back to the level's own category"""
+    categories = RiddleCategory.objects.filter(is_active=True)
+    categories_query = filter_by_age(categories, age, 'difficulty')
     
-    for used_question in used_riddles:
-        used_lower = used_question.lower().strip()
-        
-        # Simple similarity check - if they share many common words
-        question_words = set(question_lower.split())
-        used_words = set(used_lower.split())
-        
-        if len(question_words & used_words) / max(len(question_words), 1) > threshold:
-            return True
-            
-        # Check if one is a substring of the other (for very similar riddles)
-        if question_lower in used_lower or used_lower in question_lower:
-            if len(question_lower) > 20 or len(used_lower) > 20:  # Only for longer texts
-                return True
-                
-    return False
+    # Use age-appropriate category if available
+    age_difficulty = get_difficulty_by_age(age)
+    if age_difficulty:
+        categories_query = categories_query.filter(difficulty=age_difficulty)
+    
+    # If no age-appropriate category, fall back to level's category
+    if not categories_query.exists():
+        categories_query = RiddleCategory.objects.filter(pk=level.category.pk)
+    return categories_query
 
-def get_riddle_level(request):
-    """Get riddle questions for a specific level, ensuring no repetitions"""
+def prepare_riddle_level(request):
+    """
+    Resolve the level, AI topic and database fallback pool for a level request.
+    Raises RiddleLevel.DoesNotExist for unknown levels.
+    """
     level_number = int(request.GET.get('level', 1))
     session_id = request.GET.get('session_id', 'anonymous')
     
-    sync_riddle_levels_from_quiz()
-    
-    # Get list of already answered question IDs to exclude
+    # Riddles this learner has already been served are skipped; older
+    # clients may still send the ids they answered
+    seen = load_seen(request, 'riddle')
     answered_ids_param = request.GET.get('answered_ids', '')
     answered_ids = []
     if answered_ids_param:
@@ -711,207 +654,388 @@ def get_riddle_level(request):
             if raw_id.isdigit():
                 answered_ids.append(int(raw_id))
     
-    try:
-        # Filter levels by age-appropriate difficulty
-        levels = RiddleLevel.objects.filter(level_number=level_number)
-        user = request.user if request.user.is_authenticated else None
-        levels_query = filter_by_age_appropriate(user, levels, 'category__difficulty')
-        level = levels_query.first()
-        
-        if not level:
-            # Fallback to default level if age filtering removes it
-            level = RiddleLevel.objects.get(level_number=level_number)
-        
-        # Filter categories by age-appropriate difficulty
-        categories = RiddleCategory.objects.filter(is_active=True)
-        categories_query = filter_by_age_appropriate(user, categories, 'difficulty')
-        
-        # Use age-appropriate category if available
-        if user and hasattr(user, 'profile') and user.profile.date_of_birth:
-            user_age = get_age_from_birthdate(user.profile.date_of_birth)
-            age_difficulty = get_difficulty_by_age(user_age)
-            if age_difficulty:
-                categories_query = categories_query.filter(difficulty=age_difficulty)
-        
-        # If no age-appropriate category, fall back to level's category
-        if not categories_query.exists():
-            categories_query = RiddleCategory.objects.filter(pk=level.category.pk)
-        
-        # Get available database questions (excluding answered ones)
-        questions_query = RiddleQuestion.objects.filter(
-            category__in=categories_query.values_list('pk', flat=True),
-            is_active=True
-        )
-        answer_pool = list(
-            RiddleQuestion.objects.filter(is_active=True).values_list('answer', flat=True)
-        )
-        
-        # Exclude already answered questions
-        if answered_ids:
-            questions_query = questions_query.exclude(id__in=answered_ids)
-        
-        # Get available database questions with randomization
-        available_db_questions = list(questions_query.order_by('?'))
-        riddles_needed = level.questions_required
-        questions_data = []
-        
-        current_difficulty = level.category.difficulty
-        
-        # Get category for AI questions context
-        category = categories_query.first()
-        topic = category.name if category else "general knowledge"
-        
-        # Get user age for AI question generation
-        user_age = 10  # default
-        if user and hasattr(user, 'profile') and user.profile.date_of_birth:
-            user_age = get_age_from_birthdate(user.profile.date_of_birth)
-
-        # TRACKING SYSTEM: Get used riddles from cache
-        used_riddles_cache_key = get_used_riddles_cache_key(session_id, level_number)
-        used_riddles = cache.get(used_riddles_cache_key, [])
-        
-        # Also track global used riddles for this user/session
-        global_used_key = get_global_used_riddles_cache_key(user.id if user else None)
-        global_used_riddles = cache.get(global_used_key, [])
-        
-        # STRATEGY: Use AI riddles first, fallback to database riddles when AI fails
-        ai_riddles_count = 0
-        db_riddles_count = 0
-        max_attempts_per_riddle = 3  # Maximum attempts to generate a unique riddle
-
-        for i in range(riddles_needed):
-            riddle_found = False
-            attempts = 0
-            
-            while not riddle_found and attempts < max_attempts_per_riddle:
-                attempts += 1
-                
-                # Try AI riddle first
-                try:
-                    ai_riddle = generate_ai_riddle(
-                        difficulty=current_difficulty,
-                        age=user_age,
-                        topic=topic,
-                        riddle_number=i + 1
-                    )
-                    
-                    # Check if this riddle is too similar to already used ones
-                    if is_riddle_used(ai_riddle['question'], used_riddles + global_used_riddles):
-                        print(f"AI riddle {i+1} too similar to used ones, attempt {attempts}")
-                        continue
-                    
-                    # Use AI-generated distractors when available
-                    ai_distractors = ai_riddle.get('distractors', [])
-                    
-                    questions_data.append({
-                        'id': f"ai_{level_number}_{i}_{random.randint(1000,9999)}",
-                        'question_text': ai_riddle['question'],
-                        'answer': ai_riddle['answer'],
-                        'explanation': ai_riddle['explanation'],
-                        'is_ai': True,
-                        'options': generate_options(ai_riddle['answer'], answer_pool, ai_distractors),
-                        'tip': build_tip(ai_riddle['question'], ai_riddle['answer']),
-                        'hint': ai_riddle.get('hint') or build_hint(ai_riddle['answer'])
-                    })
-                    
-                    # Track this riddle as used
-                    used_riddles.append(ai_riddle['question'])
-                    global_used_riddles.append(ai_riddle['question'])
-                    
-                    ai_riddles_count += 1
-                    riddle_found = True
-                    print(f"AI riddle {i+1} generated successfully")
-                    
-                except Exception as e:
-                    print(f"Error generating AI riddle: {e}")
-                    break  # Break out of attempts loop for AI
-            
-            # If AI failed or produced duplicates, try database questions
-            if not riddle_found and available_db_questions:
-                db_attempts = 0
-                while available_db_questions and db_attempts < len(available_db_questions):
-                    db_question = available_db_questions.pop(0)
-                    db_attempts += 1
-                    
-                    # Check if this database riddle is too similar to used ones
-                    if is_riddle_used(db_question.question_text, used_riddles + global_used_riddles):
-                        print(f"DB riddle too similar, trying next...")
-                        continue
-                    
-                    questions_data.append({
-                        'id': db_question.id,
-                        'question_text': db_question.question_text,
-                        'answer': db_question.answer,
-                        'explanation': db_question.explanation,
+    # Filter levels by age-appropriate difficulty
+    levels = RiddleLevel.objects.filter(level_number=level_number)
+    user = request.user if request.user.is_authenticated else None
+    levels_query = filter_by_age_appropriate(user, levels, 'category__difficulty')
+    level = levels_query.first()
+    
+    if not level:
+        # Fallback to default level if age filtering removes it
+        level = RiddleLevel.objects.get(level_number=level_number)
+    
+    # Get user age for category filtering and AI question generation
+    profile_age = None
+    if user and hasattr(user, 'profile') and user.profile.date_of_birth:
+        profile_age = get_age_from_birthdate(user.profile.date_of_birth)
+    
+    categories_query = get_topic_categories(level, profile_age)
+    
+    category_ids = list(categories_query.values_list('pk', flat=True))
+    
+    # Get available database questions (excluding answered ones), drawn at
+    # random from the cached ids instead of sorting the table
+    db_questions = pk_sampler.sample(
+        RiddleQuestion,
+        {'category__in': category_ids, 'is_active': True},
+        exclude=seen.id_set.union(answered_ids),
+        fields=['question_text', 'answer', 'explanation']
+    )
+    # Distractors come from the same categories first, without reading the whole bank
+    answer_pool = distractor_index.pool(category_ids, level.category.difficulty)
+    
+    # Get category for AI questions context
+    category = categories_query.first()
+    
+    return {
+        'level': level,
+        'level_number': level_number,
+        'session_id': session_id,
+        'user': user,
+        'difficulty': level.category.difficulty,
+        'topic': category.name if category else "general knowledge",
+        'user_age': profile_age if profile_age is not None else 10,  # default
+        # Random order, fetched as used
+        'db_questions': db_questions,
+        'answer_pool': answer_pool,
+        'seen': seen,
+    }
+
+def riddle_level_metadata(context):
+    level = context['level']
+    return {
+        'level_number': level.level_number,
+        'category': level.category.name,
+        'difficulty': context['difficulty'],
+        'color': level.category.color,
+        'icon': level.category.icon,
+        'time_limit': level.time_limit,
+        'riddles_required': level.questions_required,
+        'session_id': context['session_id']  # Return session_id for client to use
+    }
+
+def riddle_flight_key(context):
+    return ('riddle', context['level_number'], context['difficulty'], get_age_band(context['user_age']), context['topic'])
+
+def pop_stocked_riddles(context):
+    return pop_items('riddle', context['difficulty'], context['user_age'], context['topic'], context['level'].questions_required)
+
+def drop_repeats(context, riddles):
+    """`riddles` without ones the learner has seen or that repeat each other"""
+    seen = context['seen']
+    index = RiddleIndex(seen.recent)
+    fresh = []
+    for riddle in riddles:
+        if seen.has_text(riddle['question']) or index.is_used(riddle['question']):
+            continue
+        index.add(riddle['question'])
+        fresh.append(riddle)
+    return fresh
+
+def iter_riddles(context, stocked_riddles=None, ai_slots=None, started=None, retries=True):
+    """
+    Yield (source, riddle) pairs as each riddle of the level becomes ready,
+    ensuring no repetitions; source is 'ai', 'db' or 'fallback'.
+    The learner's seen set is saved once the level is complete.
+    The async view passes the AI riddles it already awaited as
+    `stocked_riddles`, how many slots may use the AI as `ai_slots`, and
+    when the level started, so its retries share the level deadline. With
+    `retries` off, repeats fall through to the database instead of re-asking
+    the AI (the async view re-asks on the event loop beforehand).
+    """
+    level_number = context['level_number']
+    current_difficulty = context['difficulty']
+    topic = context['topic']
+    user_age = context['user_age']
+    available_db_questions = context['db_questions']
+    answer_pool = context['answer_pool']
+    riddles_needed = context['level'].questions_required
+
+    # TRACKING SYSTEM: exact repeats are caught by the learner's seen hashes,
+    # rephrasings by a near-duplicate index over their recent riddles
+    seen = context['seen']
+    used_index = RiddleIndex(seen.recent)
+    level_index = RiddleIndex()
+
+    def is_used(question_text):
+        return seen.has_text(question_text) or used_index.is_used(question_text)
+
+    def mark_used(question_text):
+        seen.add_text(question_text)
+        used_index.add(question_text)
+        level_index.add(question_text)
+
+    # STRATEGY: Use AI riddles first, fallback to database riddles when AI fails
+    max_attempts_per_riddle = 3  # Maximum attempts to generate a unique riddle
+
+    deadline_at = (started or time.monotonic()) + get_level_deadline()
+
+    # Pre-generated riddles from the warm inventory are served first, then
+    # those of one batched AI call whose invalid slots are back-filled in
+    # parallel, each as soon as its slot settles, all inside the level deadline
+    ai_stream = (riddle for riddle in ())
+    if stocked_riddles is None:
+        stocked_riddles = pop_stocked_riddles(context)
+        # While the provider is slow, slots the database can cover skip the AI
+        missing = plan_ai_slots('riddle', riddles_needed - len(stocked_riddles), len(available_db_questions))
+        ai_slots = len(stocked_riddles) + missing
+        first_ai = len(stocked_riddles)
+        # Players opening the same level together share one generation
+        ai_stream = (riddle for slot, riddle in iter_batch_with_backfill(
+            partial(request_ai_riddles_batch, current_difficulty, user_age, topic, start_number=first_ai + 1),
+            lambda slot: request_ai_riddle(
+                difficulty=current_difficulty,
+                age=user_age,
+                topic=topic,
+                riddle_number=first_ai + slot + 1
+            ),
+            missing,
+            deadline=max(0, deadline_at - time.monotonic()),
+            flight_key=riddle_flight_key(context)
+        ) if riddle is not None)
+
+    if ai_slots is None:
+        ai_slots = riddles_needed
+
+    def next_ai_riddle():
+        if stocked_riddles:
+            return stocked_riddles.pop()
+        return next(ai_stream, None)
+
+    def retry_ai_riddle(riddle_number):
+        # Only repeats are re-asked, one at a time, within what is left of the
+        # deadline; uncached, as a cached variant may be the very repeat
+        remaining = deadline_at - time.monotonic()
+        if not retries or remaining <= 0:
+            return None
+        return run_with_deadline([partial(
+            request_ai_riddle.uncached,
+            difficulty=current_difficulty,
+            age=user_age,
+            topic=topic,
+            riddle_number=riddle_number
+        )], remaining)[0]
+
+    for i in range(riddles_needed):
+        riddle_found = False
+        attempts = 0
+
+        while not riddle_found and attempts < max_attempts_per_riddle and (stocked_riddles or i < ai_slots):
+            attempts += 1
+
+            # Try AI riddle first
+            try:
+                ai_riddle = next_ai_riddle()
+                if ai_riddle is None and attempts > 1:
+                    ai_riddle = retry_ai_riddle(i + 1)
+                if ai_riddle is None:
+                    # The batch and its back-fills came up short; the database covers this slot
+                    break
+
+                # Check if this riddle is too similar to already used ones
+                if is_used(ai_riddle['question']):
+                    print(f"AI riddle {i+1} too similar to used ones, attempt {attempts}")
+                    continue
+
+                # Use AI-generated distractors when available
+                ai_distractors = ai_riddle.get('distractors', [])
+
+                yield 'ai', {
+                    'id': f"ai_{level_number}_{i}_{random.randint(1000,9999)}",
+                    'question_text': ai_riddle['question'],
+                    'answer': ai_riddle['answer'],
+                    'explanation': ai_riddle['explanation'],
+                    'is_ai': True,
+                    'options': generate_options(ai_riddle['answer'], answer_pool, ai_distractors),
+                    'tip': build_tip(ai_riddle['question'], ai_riddle['answer']),
+                    'hint': ai_riddle.get('hint') or build_hint(ai_riddle['answer'])
+                }
+
+                # Track this riddle as used
+                mark_used(ai_riddle['question'])
+
+                riddle_found = True
+                print(f"AI riddle {i+1} generated successfully")
+
+            except Exception as e:
+                print(f"Error generating AI riddle: {e}")
+                break  # Break out of attempts loop for AI
+
+        # If AI failed or produced duplicates, try database questions
+        if not riddle_found and available_db_questions:
+            db_attempts = 0
+            while available_db_questions and db_attempts < len(available_db_questions):
+                db_question = available_db_questions.pop(0)
+                db_attempts += 1
+
+                # Check if this database riddle is too similar to used ones
+                if is_used(db_question.question_text):
+                    print(f"DB riddle too similar, trying next...")
+                    continue
+
+                yield 'db', {
+                    'id': db_question.id,
+                    'question_text': db_question.question_text,
+                    'answer': db_question.answer,
+                    'explanation': db_question.explanation,
+                    'is_ai': False,
+                    'options': generate_options(db_question.answer, answer_pool),
+                    'tip': build_tip(db_question.question_text, db_question.answer),
+                    'hint': build_hint(db_question.answer)
+                }
+
+                # Track this riddle as used
+                mark_used(db_question.question_text)
+                seen.add_id(db_question.id)
+
+                riddle_found = True
+                print(f"DB riddle {i+1} used successfully")
+                break
+
+        # Last resort: use simple fallback (ensure it's unique)
+        if not riddle_found:
+            fallback_attempts = 0
+            # Try up to 3 different fallbacks, then the same 3 again allowing
+            # ones seen in earlier levels so a long history never empties a level
+            while fallback_attempts < 6:
+                fallback_riddle = create_unique_fallback_riddle(level_number, i + fallback_attempts % 3, current_difficulty, topic)
+                fallback_attempts += 1
+                if fallback_attempts > 3:
+                    usable = not level_index.is_used(fallback_riddle['question'])
+                else:
+                    usable = not is_used(fallback_riddle['question'])
+
+                if usable:
+                    yield 'fallback', {
+                        'id': f"fallback_{level_number}_{i}_{fallback_attempts}",
+                        'question_text': fallback_riddle['question'],
+                        'answer': fallback_riddle['answer'],
+                        'explanation': fallback_riddle['explanation'],
                         'is_ai': False,
-                        'options': generate_options(db_question.answer, answer_pool),
-                        'tip': build_tip(db_question.question_text, db_question.answer),
-                        'hint': build_hint(db_question.answer)
-                    })
-                    
+                        'options': generate_options(fallback_riddle['answer'], answer_pool),
+                        'tip': build_tip(fallback_riddle['question'], fallback_riddle['answer']),
+                        'hint': fallback_riddle.get('hint') or build_hint(fallback_riddle['answer'])
+                    }
+
                     # Track this riddle as used
-                    used_riddles.append(db_question.question_text)
-                    global_used_riddles.append(db_question.question_text)
-                    
-                    db_riddles_count += 1
+                    mark_used(fallback_riddle['question'])
+
                     riddle_found = True
-                    print(f"DB riddle {i+1} used successfully")
+                    print(f"Fallback riddle {i+1} used successfully")
                     break
-            
-            # Last resort: use simple fallback (ensure it's unique)
-            if not riddle_found:
-                fallback_attempts = 0
-                while fallback_attempts < 3:  # Try up to 3 different fallbacks
-                    fallback_riddle = create_unique_fallback_riddle(level_number, i + fallback_attempts, current_difficulty, topic)
-                    fallback_attempts += 1
-                    
-                    if not is_riddle_used(fallback_riddle['question'], used_riddles + global_used_riddles):
-                        questions_data.append({
-                            'id': f"fallback_{level_number}_{i}_{fallback_attempts}",
-                            'question_text': fallback_riddle['question'],
-                            'answer': fallback_riddle['answer'],
-                            'explanation': fallback_riddle['explanation'],
-                            'is_ai': False,
-                            'options': generate_options(fallback_riddle['answer'], answer_pool),
-                            'tip': build_tip(fallback_riddle['question'], fallback_riddle['answer']),
-                            'hint': fallback_riddle.get('hint') or build_hint(fallback_riddle['answer'])
-                        })
-                        
-                        # Track this riddle as used
-                        used_riddles.append(fallback_riddle['question'])
-                        global_used_riddles.append(fallback_riddle['question'])
-                        
-                        riddle_found = True
-                        print(f"Fallback riddle {i+1} used successfully")
-                        break
-        
-        # Update cache with used riddles (store for 1 hour)
-        cache.set(used_riddles_cache_key, used_riddles, 3600)
-        cache.set(global_used_key, global_used_riddles, 3600)
-        
-        # Shuffle the final riddles
-        random.shuffle(questions_data)
-        
-        level_data = {
-            'level_number': level.level_number,
-            'category': level.category.name,
-            'difficulty': current_difficulty,
-            'color': level.category.color,
-            'icon': level.category.icon,
-            'time_limit': level.time_limit,
-            'riddles_required': level.questions_required,
-            'questions': questions_data,
-            'ai_riddles_count': ai_riddles_count,
-            'db_riddles_count': db_riddles_count,
-            'session_id': session_id  # Return session_id for client to use
-        }
-        
-        print(f"Level {level_number}: {db_riddles_count} DB riddles, {ai_riddles_count} AI riddles, {len(questions_data)} total unique riddles")
-        
-        return JsonResponse(level_data)
-        
+
+    # Settles the shared flight if the level filled up before the AI stream ran dry
+    ai_stream.close()
+    seen.save()
+
+
+def get_riddle_level(request):
+    """Get riddle questions for a specific level, ensuring no repetitions"""
+    try:
+        context = prepare_riddle_level(request)
     except RiddleLevel.DoesNotExist:
         return JsonResponse({'error': 'Level not found'}, status=404)
+    
+    riddles = list(track_level('riddle', iter_riddles(context)))
+    return JsonResponse(riddle_level_data(context, riddles))
+
+def riddle_level_data(context, riddles):
+    questions_data = [riddle for source, riddle in riddles]
+    ai_riddles_count = sum(1 for source, riddle in riddles if source == 'ai')
+    db_riddles_count = sum(1 for source, riddle in riddles if source == 'db')
+    
+    # Shuffle the final riddles
+    random.shuffle(questions_data)
+    
+    level_data = riddle_level_metadata(context)
+    level_data.update({
+        'questions': questions_data,
+        'ai_riddles_count': ai_riddles_count,
+        'db_riddles_count': db_riddles_count
+    })
+    
+    print(f"Level {context['level_number']}: {db_riddles_count} DB riddles, {ai_riddles_count} AI riddles, {len(questions_data)} total unique riddles")
+    
+    return level_data
+
+async def get_riddle_level_async(request):
+    """
+    Async variant of get_riddle_level for ASGI workers. The batch, its
+    back-fills and the re-asks for riddles that turned out to be repeats are
+    awaited on the event loop; only the ORM work runs in a thread.
+    """
+    started = time.monotonic()
+    try:
+        context = await sync_to_async(prepare_riddle_level)(request)
+    except RiddleLevel.DoesNotExist:
+        return JsonResponse({'error': 'Level not found'}, status=404)
+    
+    stocked_riddles = await sync_to_async(pop_stocked_riddles)(context)
+    missing = plan_ai_slots(
+        'riddle', context['level'].questions_required - len(stocked_riddles), len(context['db_questions'])
+    )
+    ai_slots = len(stocked_riddles) + missing
+    batch = await gather_batch_with_backfill(
+        partial(
+            request_ai_riddles_batch_async, context['difficulty'], context['user_age'], context['topic'],
+            start_number=len(stocked_riddles) + 1
+        ),
+        lambda slot: request_ai_riddle_async(
+            difficulty=context['difficulty'],
+            age=context['user_age'],
+            topic=context['topic'],
+            riddle_number=len(stocked_riddles) + slot + 1
+        ),
+        missing,
+        # Same key as the sync view's batch, so both coalesce together
+        flight_key=riddle_flight_key(context)
+    )
+    stocked_riddles = drop_repeats(context, stocked_riddles + [riddle for riddle in batch if riddle is not None])
+    
+    # Repeats are re-asked here, all at once, within what is left of the deadline
+    for _ in range(2):
+        short = min(missing, ai_slots - len(stocked_riddles))
+        remaining = get_level_deadline() - (time.monotonic() - started)
+        if short <= 0 or remaining <= 0:
+            break
+        retried = await gather_with_deadline([
+            request_ai_riddle_async.uncached(
+                difficulty=context['difficulty'],
+                age=context['user_age'],
+                topic=context['topic'],
+                riddle_number=len(stocked_riddles) + slot + 1
+            )
+            for slot in range(short)
+        ], remaining)
+        stocked_riddles = drop_repeats(context, stocked_riddles + [riddle for riddle in retried if riddle is not None])
+    
+    def assemble():
+        items = iter_riddles(context, stocked_riddles=stocked_riddles, ai_slots=ai_slots, retries=False)
+        return riddle_level_data(context, list(track_level('riddle', items, started=started)))
+    
+    # Thread-sensitive, so the ORM work runs on the request's thread and its
+    # connections are closed with the request; no AI call is made in there
+    return JsonResponse(await sync_to_async(assemble)())
+
+def stream_riddle_level(request):
+    """
+    Streaming variant of get_riddle_level: sends the level metadata at once,
+    then each riddle as soon as it is ready (NDJSON, see core/streaming.py)
+    """
+    try:
+        context = prepare_riddle_level(request)
+    except RiddleLevel.DoesNotExist:
+        return JsonResponse({'error': 'Level not found'}, status=404)
+    
+    def events():
+        yield {'type': 'level', **riddle_level_metadata(context)}
+        counts = {'ai': 0, 'db': 0, 'fallback': 0}
+        for source, riddle in track_level('riddle', iter_riddles(context)):
+            counts[source] += 1
+            yield {'type': 'question', 'question': riddle}
+        yield {'type': 'done', 'ai_riddles_count': counts['ai'], 'db_riddles_count': counts['db']}
+    
+    return ndjson_response(events())
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -932,10 +1056,6 @@ def start_riddle_session(request):
             is_active=True
         )
         
-        # Initialize global used riddles cache for this session
-        global_used_key = get_global_used_riddles_cache_key(user.id if user else None)
-        cache.set(global_used_key, [], 3600)  # 1 hour expiration
-        
         return JsonResponse({
             'status': 'success',
             'session_id': session.session_id,
@@ -948,20 +1068,13 @@ def start_riddle_session(request):
 @csrf_exempt
 @require_http_methods(["POST"])
 def clear_used_riddles(request):
-    """Clear used riddles cache for a session (for testing or session reset)"""
+    """Clear the riddles a user or session has seen (for testing or session reset)"""
     try:
         data = json.loads(request.body)
         session_id = data.get('session_id')
-        level_number = data.get('level_number')
         user = request.user if request.user.is_authenticated else None
         
-        if session_id and level_number:
-            cache_key = get_used_riddles_cache_key(session_id, level_number)
-            cache.delete(cache_key)
-        
-        # Also clear global used riddles
-        global_key = get_global_used_riddles_cache_key(user.id if user else None)
-        cache.delete(global_key)
+        SeenSet('riddle', owner_key(user, session_id)).clear()
         
         return JsonResponse({'status': 'success', 'message': 'Used riddles cleared'})
         
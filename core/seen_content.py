@@ -0,0 +1,103 @@
+"""
+Per-learner record of the content each game has already served.
+
+One compact cache entry per (game, learner) replaces the client's growing
+`answered_ids` list and the riddle game's lists of full question strings.
+The learner is the user, or the client's `session_id` for anonymous play.
+An entry holds:
+
+- ids: database row ids, packed as fixed-width 8-byte integers
+- hashes: 8-byte digests of generated content (AI questions and riddles)
+- recent: the last few generated texts, for near-duplicate checks
+
+Each part keeps only its newest SEEN_CONTENT_MAX_ITEMS (or
+SEEN_CONTENT_RECENT_TEXTS) entries, and the entry expires after
+SEEN_CONTENT_TTL_SECONDS without play. Memory and exclusion cost stay
+bounded however long a learner plays.
+"""
+import hashlib
+from array import array
+from django.conf import settings
+from django.core.cache import cache
+
+
+def content_hash(text):
+    """Fixed-width digest of normalised text"""
+    normalized = ' '.join((text or '').lower().split())
+    return int.from_bytes(hashlib.blake2b(normalized.encode(), digest_size=8).digest(), 'big')
+
+
+def owner_key(user=None, session_id=None):
+    """Whose history to use: the user, else the client's session id, else nobody"""
+    if user:
+        return f"user_{user.id}"
+    session_id = (session_id or '').strip()
+    if session_id and session_id != 'anonymous':
+        return f"session_{session_id[:64]}"
+    return None
+
+
+def seen_owner(request):
+    user = request.user if request.user.is_authenticated else None
+    return owner_key(user, request.GET.get('session_id'))
+
+
+class SeenSet:
+    def __init__(self, game, owner, ids=b'', hashes=b'', recent=()):
+        self.game = game
+        self.owner = owner
+        self._ids = array('q', ids)
+        self._hashes = array('Q', hashes)
+        self.recent = list(recent)
+        self.id_set = set(self._ids)
+        self._hash_set = set(self._hashes)
+        self._dirty = False
+
+    @property
+    def cache_key(self):
+        return f"seen_content_{self.game}_{self.owner}"
+
+    @classmethod
+    def load(cls, game, owner):
+        if owner is None:
+            return cls(game, None)
+        return cls(game, owner, **cache.get(f"seen_content_{game}_{owner}", {}))
+
+    def has_id(self, pk):
+        return pk in self.id_set
+
+    def has_text(self, text):
+        return content_hash(text) in self._hash_set
+
+    def add_id(self, pk):
+        if pk not in self.id_set:
+            self.id_set.add(pk)
+            self._ids.append(pk)
+            self._dirty = True
+
+    def add_text(self, text):
+        digest = content_hash(text)
+        if digest not in self._hash_set:
+            self._hash_set.add(digest)
+            self._hashes.append(digest)
+            self.recent.append(text)
+            self._dirty = True
+
+    def save(self):
+        if self.owner is None or not self._dirty:
+            return
+        max_items = getattr(settings, 'SEEN_CONTENT_MAX_ITEMS', 2000)
+        cache.set(self.cache_key, {
+            'ids': self._ids[-max_items:].tobytes(),
+            'hashes': self._hashes[-max_items:].tobytes(),
+            'recent': self.recent[-getattr(settings, 'SEEN_CONTENT_RECENT_TEXTS', 100):],
+        }, getattr(settings, 'SEEN_CONTENT_TTL_SECONDS', 7 * 24 * 3600))
+        self._dirty = False
+
+    def clear(self):
+        if self.owner is not None:
+            cache.delete(self.cache_key)
+
+
+def load_seen(request, game):
+    return SeenSet.load(game, seen_owner(request))
@@ -5,6 +5,8 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from .models import SentenceBuilderLevel, SentenceBuilderSentence, SentenceBuilderGameSession, UserSentenceProgress
 from .game_utils import filter_by_age_appropriate, get_age_from_birthdate, get_difficulty_by_age
+from .db_sampler import pk_sampler
+from .seen_content import load_seen
 from django.shortcuts import render
 
 def sentence_builder(request):
@@ -26,13 +28,22 @@ def get_level_sentences(request):
             level = SentenceBuilderLevel.objects.get(level_number=level_number)
         
         # Filter sentences by age-appropriate level
-        sentences = SentenceBuilderSentence.objects.filter(
-            level=level,
-            is_active=True
-        ).order_by('?')[:level.sentences_required]  # Random selection
+        # Sentences this learner hasn't been served come first; a small
+        # level that has been played through repeats some
+        seen = load_seen(request, 'sentence')
+        filters = {'level_id': level.pk, 'is_active': True}
+        fields = ['sentence', 'hint', 'word_count']
+        sentences = pk_sampler.sample(
+            SentenceBuilderSentence, filters, exclude=seen.id_set, fields=fields
+        ).take(level.sentences_required)  # Random selection
+        if len(sentences) < level.sentences_required:
+            sentences += pk_sampler.sample(
+                SentenceBuilderSentence, filters, exclude=[s.id for s in sentences], fields=fields
+            ).take(level.sentences_required - len(sentences))
         
         sentences_data = []
         for sentence_obj in sentences:
+            seen.add_id(sentence_obj.id)
             sentences_data.append({
                 'id': sentence_obj.id,
                 'correct': sentence_obj.sentence,
@@ -49,6 +60,7 @@ def get_level_sentences(request):
             'points_per_sentence': level.points_per_sentence,
             'sentences': sentences_data
         }
+        seen.save()
         
         return JsonResponse(level_data)
         
@@ -0,0 +1,70 @@
+"""
+Signal handlers keeping the in-process game indexes in step with the database.
+Connected from CoreConfig.ready().
+"""
+import threading
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import (
+    MathGameProblem, QuizCategory, QuizLevel, QuizQuestion, RiddleCategory, RiddleQuestion,
+    SentenceBuilderSentence, WordSearchCategory, WordSearchLevel, WordSearchPuzzle,
+)
+from .db_sampler import pk_sampler
+from .riddle_distractors import invalidate_distractor_index
+from .riddle_levels import sync_riddle_levels_from_quiz
+from .word_search_catalogue import word_search_catalogue
+
+# Per connection alias: the on-commit list a riddle level sync is queued on
+_pending_level_sync = threading.local()
+
+
+@receiver(post_save, sender=RiddleQuestion)
+@receiver(post_delete, sender=RiddleQuestion)
+@receiver(post_save, sender=RiddleCategory)
+@receiver(post_delete, sender=RiddleCategory)
+def riddle_answers_changed(sender, **kwargs):
+    invalidate_distractor_index()
+
+
+@receiver(post_save, sender=QuizLevel)
+@receiver(post_delete, sender=QuizLevel)
+@receiver(post_save, sender=QuizCategory)
+@receiver(post_delete, sender=QuizCategory)
+def quiz_levels_changed(sender, using=None, **kwargs):
+    # After commit, so the sync reads the saved rows and a rolled-back write syncs nothing.
+    # Once per transaction: the pending mark is the connection's on-commit list, which
+    # Django swaps out when it runs or discards the callbacks (commit or rollback)
+    connection = transaction.get_connection(using)
+    queued_on = getattr(_pending_level_sync, connection.alias, None)
+    if connection.in_atomic_block and queued_on is connection.run_on_commit:
+        return
+
+    def sync():
+        setattr(_pending_level_sync, connection.alias, None)
+        sync_riddle_levels_from_quiz()
+
+    setattr(_pending_level_sync, connection.alias, connection.run_on_commit)
+    transaction.on_commit(sync, using=connection.alias)
+
+
+@receiver(post_save, sender=QuizQuestion)
+@receiver(post_delete, sender=QuizQuestion)
+@receiver(post_save, sender=RiddleQuestion)
+@receiver(post_delete, sender=RiddleQuestion)
+@receiver(post_save, sender=MathGameProblem)
+@receiver(post_delete, sender=MathGameProblem)
+@receiver(post_save, sender=SentenceBuilderSentence)
+@receiver(post_delete, sender=SentenceBuilderSentence)
+def sampled_rows_changed(sender, **kwargs):
+    pk_sampler.invalidate(sender)
+
+
+@receiver(post_save, sender=WordSearchLevel)
+@receiver(post_delete, sender=WordSearchLevel)
+@receiver(post_save, sender=WordSearchCategory)
+@receiver(post_delete, sender=WordSearchCategory)
+@receiver(post_save, sender=WordSearchPuzzle)
+@receiver(post_delete, sender=WordSearchPuzzle)
+def word_search_catalogue_changed(sender, **kwargs):
+    word_search_catalogue.invalidate()
@@ -0,0 +1,26 @@
+"""
+NDJSON helpers for the streaming level endpoints.
+
+Each line of the response body is one JSON object with a "type" key:
+"level" (metadata, sent first), one "question" (quiz, riddles) or "problem"
+(math) per item as soon as it is ready, then "done" with the final counts.
+"""
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+
+def ndjson_line(payload):
+    return json.dumps(payload, cls=DjangoJSONEncoder) + '\n'
+
+
+def ndjson_response(events):
+    """Stream an iterable of dicts as newline-delimited JSON"""
+    response = StreamingHttpResponse(
+        (ndjson_line(event) for event in events),
+        content_type='application/x-ndjson'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Ask nginx-style proxies not to buffer the body
+    response['X-Accel-Buffering'] = 'no'
+    return response
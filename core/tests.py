@@ -1,3 +1,1258 @@
-from django.test import TestCase
+import asyncio
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from . import word_search_bank
+from .ai_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, model_breakers
+from .ai_cache import VariantCache, cached_generation, generation_cache
+from .ai_client import get_async_http_client
+from .ai_executor import run_batch_with_backfill, run_with_deadline
+from .ai_hedging import acall_hedged, call_hedged, hedge_policy
+from .ai_inventory import get_bucket, pop_item, pop_items, top_up
+from .ai_metrics import ai_metrics, instrumented, note_usage, track_level
+from .ai_policy import plan_ai_slots
+from .ai_providers import FakeProvider
+from .ai_question_generator import parse_questions_batch, validate_ai_question
+from .ai_router import ModelRouter, model_router
+from .ai_singleflight import SingleFlight, shuffled_copy
+from .db_sampler import pk_sampler
+from .math_bank import build_level_bank, fill_level_bank
+from .math_templates import build_template_problem, build_template_problems, draw_operands
+from .models import (
+    MathGameLevel, MathGameProblem, QuizCategory, QuizLevel, QuizQuestion, RiddleCategory, RiddleLevel, RiddleQuestion,
+    WordSearchCategory, WordSearchLevel, WordSearchPuzzle,
+)
+from .riddle_distractors import answer_shape, distractor_index, invalidate_distractor_index
+from .riddle_index import RiddleIndex
+from .riddle_levels import sync_riddle_levels_from_quiz
+from .seen_content import SeenSet, content_hash, owner_key
+from .word_search_bank import farm_puzzles
+from .word_search_catalogue import word_search_catalogue
+from .word_search_engine import (
+    DIRECTIONS, build_word_search, grid_width, pack_grid, pack_positions, unpack_grid, unpack_positions,
+)
 
-# Create your tests here.
+
+class RunWithDeadlineTests(TestCase):
+    def test_results_stay_aligned_with_the_calls(self):
+        def late(value):
+            time.sleep(0.05)
+            return value
+
+        results = run_with_deadline([lambda: late('first'), lambda: 'second'], deadline=1)
+
+        self.assertEqual(results, ['first', 'second'])
+
+    def test_failed_slots_become_none(self):
+        def broken():
+            raise RuntimeError('provider down')
+
+        self.assertEqual(run_with_deadline([lambda: 'ok', broken], deadline=1), ['ok', None])
+
+    def test_slots_missing_the_deadline_become_none(self):
+        def slow():
+            time.sleep(0.5)
+            return 'late'
+
+        started = time.monotonic()
+        results = run_with_deadline([lambda: 'ok', slow], deadline=0.1)
+
+        self.assertEqual(results, ['ok', None])
+        self.assertLess(time.monotonic() - started, 0.4)
+
+
+class InventoryTests(TestCase):
+    def stock(self, count, age_band='7-9'):
+        return top_up('quiz', 'easy', age_band, 'Animals', lambda slot: {'question': f"Q{slot}"}, watermark=count)
+
+    def test_top_up_fills_the_bucket_to_the_watermark(self):
+        self.assertEqual(self.stock(3), 3)
+        self.assertEqual(self.stock(3), 0)
+        self.assertEqual(self.stock(5), 2)
+
+    def test_failed_generations_are_not_stocked(self):
+        def generate(slot):
+            if slot == 2:
+                raise ValueError('invalid item')
+            return {'question': f"Q{slot}"}
+
+        added = top_up('quiz', 'easy', '7-9', 'Animals', generate, watermark=3)
+
+        self.assertEqual(added, 2)
+        self.assertEqual(get_bucket('quiz', 'easy', '7-9', 'Animals').count(), 2)
+
+    def test_claimed_items_are_served_once(self):
+        self.stock(3)
+
+        first = pop_items('quiz', 'easy', 8, 'Animals', 2)
+        rest = pop_items('quiz', 'easy', 8, 'Animals', 2)
+
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(rest), 1)
+        self.assertEqual(sorted(item['question'] for item in first + rest), ['Q1', 'Q2', 'Q3'])
+        self.assertIsNone(pop_item('quiz', 'easy', 8, 'Animals'))
+
+    def test_items_are_served_to_their_age_band_only(self):
+        self.stock(2, age_band='10-12')
+
+        self.assertEqual(pop_items('quiz', 'easy', 8, 'Animals', 2), [])
+        self.assertEqual(len(pop_items('quiz', 'easy', 11, 'Animals', 2)), 2)
+
+
+def make_question(number):
+    return {
+        'question': f"Question {number}?",
+        'options': ['a', 'b', 'c', 'd'],
+        'correct': 'B',
+        'explanation': f"Because {number}.",
+    }
+
+
+class BatchGenerationTests(TestCase):
+    def test_invalid_and_missing_items_become_none(self):
+        invalid = {'question': 'No options?', 'options': ['a'], 'correct': 'A', 'explanation': ''}
+        content = json.dumps({'items': [make_question(1), invalid, make_question(3)]})
+
+        results = parse_questions_batch(content, 4)
+
+        self.assertEqual(results[0]['question'], 'Question 1?')
+        self.assertIsNone(results[1])
+        self.assertEqual(results[2]['question'], 'Question 3?')
+        self.assertIsNone(results[3])
+
+    def test_batch_without_items_array_is_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_questions_batch(json.dumps({'question': 'one'}), 2)
+
+    def test_questions_need_four_options_and_a_correct_letter(self):
+        self.assertEqual(validate_ai_question(make_question(1))['question'], 'Question 1?')
+        for broken in [{'question': 'Q?'}, dict(make_question(2), options=['a']), dict(make_question(3), correct='E')]:
+            with self.assertRaises(ValueError):
+                validate_ai_question(broken)
+
+    def test_only_empty_slots_are_backfilled(self):
+        single_calls = []
+
+        def single(slot):
+            single_calls.append(slot)
+            return f"filled {slot}"
+
+        results = run_batch_with_backfill(lambda count: ['a', None, 'c', None], single, 4, deadline=2)
+
+        self.assertEqual(results, ['a', 'filled 1', 'c', 'filled 3'])
+        self.assertEqual(sorted(single_calls), [1, 3])
+
+    def test_backfill_missing_the_deadline_leaves_none(self):
+        def slow(slot):
+            time.sleep(0.5)
+            return 'late'
+
+        started = time.monotonic()
+        results = run_batch_with_backfill(lambda count: ['a', None], slow, 2, deadline=0.1)
+
+        self.assertEqual(results, ['a', None])
+        self.assertLess(time.monotonic() - started, 0.4)
+
+
+class CircuitBreakerTests(TestCase):
+    def fail(self):
+        raise RuntimeError('provider down')
+
+    def test_opens_after_threshold_and_fails_fast(self):
+        breaker = CircuitBreaker('test', failure_threshold=2, cooldown=60)
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                breaker.call(self.fail)
+
+        self.assertEqual(breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.call(lambda: 'never called')
+
+    def test_success_resets_the_failure_count(self):
+        breaker = CircuitBreaker('test', failure_threshold=2, cooldown=60)
+        with self.assertRaises(RuntimeError):
+            breaker.call(self.fail)
+        breaker.call(lambda: 'ok')
+        with self.assertRaises(RuntimeError):
+            breaker.call(self.fail)
+
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_half_open_lets_one_probe_through(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, cooldown=0.05)
+        with self.assertRaises(RuntimeError):
+            breaker.call(self.fail)
+        time.sleep(0.06)
+
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, cooldown=0.05)
+        with self.assertRaises(RuntimeError):
+            breaker.call(self.fail)
+        time.sleep(0.06)
+        with self.assertRaises(RuntimeError):
+            breaker.call(self.fail)
+
+        self.assertEqual(breaker.state, OPEN)
+
+
+class VariantCacheTests(TestCase):
+    def test_fills_variants_then_rotates(self):
+        variants = VariantCache(variants=2, ttl=60, max_keys=10)
+        self.assertIsNone(variants.lookup('key'))
+        variants.store('key', {'n': 1})
+        self.assertIsNone(variants.lookup('key'))
+        variants.store('key', {'n': 2})
+
+        served = [variants.lookup('key')['n'] for _ in range(4)]
+
+        self.assertEqual(served, [1, 2, 1, 2])
+
+    def test_served_values_are_copies(self):
+        variants = VariantCache(variants=1, ttl=60, max_keys=10)
+        variants.store('key', {'items': [1]})
+        variants.lookup('key')['items'].append(2)
+
+        self.assertEqual(variants.lookup('key'), {'items': [1]})
+
+    def test_entries_expire_after_ttl(self):
+        variants = VariantCache(variants=1, ttl=0.05, max_keys=10)
+        variants.store('key', 'value')
+        self.assertEqual(variants.lookup('key'), 'value')
+        time.sleep(0.06)
+
+        self.assertIsNone(variants.lookup('key'))
+
+    def test_least_recently_used_key_is_evicted(self):
+        variants = VariantCache(variants=1, ttl=60, max_keys=2)
+        variants.store('first', 1)
+        variants.store('second', 2)
+        variants.lookup('first')
+        variants.store('third', 3)
+
+        self.assertEqual(variants.lookup('first'), 1)
+        self.assertIsNone(variants.lookup('second'))
+        self.assertEqual(variants.lookup('third'), 3)
+
+
+class CachedGenerationTests(TestCase):
+    def setUp(self):
+        generation_cache.clear()
+        self.calls = []
+
+    def generator(self, result):
+        @cached_generation
+        def generate(topic, number=1):
+            self.calls.append(topic)
+            return result
+        return generate
+
+    def test_variants_are_filled_then_rotated(self):
+        generate = self.generator({'question': 'Q'})
+        for _ in range(generation_cache.variants):
+            generate('Animals')
+        generate('  animals ')
+
+        self.assertEqual(len(self.calls), generation_cache.variants)
+
+    def test_failed_results_are_not_stored(self):
+        generate = self.generator(None)
+        for _ in range(generation_cache.variants + 1):
+            generate('Animals')
+
+        self.assertEqual(len(self.calls), generation_cache.variants + 1)
+
+    def test_uncached_skips_the_cache(self):
+        generate = self.generator({'question': 'Q'})
+        for _ in range(generation_cache.variants):
+            generate('Animals')
+        generate.uncached('Animals')
+
+        self.assertEqual(len(self.calls), generation_cache.variants + 1)
+
+    def test_partial_batches_are_not_stored(self):
+        generate = self.generator([{'question': 'Q'}, None])
+        for _ in range(generation_cache.variants + 1):
+            generate('Animals')
+
+        self.assertEqual(len(self.calls), generation_cache.variants + 1)
+
+
+@override_settings(AI_LEVEL_DEADLINE_SECONDS=0.3, AI_INVENTORY_WATERMARK=0)
+class QuizLevelDeadlineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        generation_cache.clear()
+        category = QuizCategory.objects.create(name='Animals', difficulty='easy')
+        QuizLevel.objects.create(level_number=1, category=category, questions_required=5)
+        for number in range(8):
+            QuizQuestion.objects.create(
+                category=category,
+                question_text=f"Database question {number}?",
+                option_a='a', option_b='b', option_c='c', option_d='d',
+                correct_option='A',
+            )
+
+    def test_slow_provider_falls_back_to_database_within_deadline(self):
+        slow_provider = FakeProvider(latency_ms=2000, jitter_ms=0)
+        started = time.monotonic()
+        with mock.patch('core.ai_providers._provider', slow_provider):
+            response = self.client.get('/api/quizes/level/', {'level': 1})
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertLess(elapsed, 1.5)
+        self.assertEqual(len(data['questions']), 5)
+        self.assertEqual(data['ai_questions_count'], 0)
+        self.assertEqual(data['db_questions_count'], 5)
+
+    def test_fast_provider_fills_level_with_ai_questions(self):
+        with mock.patch('core.ai_providers._provider', FakeProvider(latency_ms=10, jitter_ms=0)):
+            response = self.client.get('/api/quizes/level/', {'level': 1})
+
+        data = response.json()
+        self.assertEqual(len(data['questions']), 5)
+        self.assertEqual(data['ai_questions_count'], 5)
+
+
+@override_settings(AI_INVENTORY_WATERMARK=0)
+class StreamingLevelTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        generation_cache.clear()
+        quiz_category = QuizCategory.objects.create(name='Animals', difficulty='easy')
+        QuizLevel.objects.create(level_number=1, category=quiz_category, questions_required=5)
+        riddle_category = RiddleCategory.objects.create(name='Nature', difficulty='easy')
+        RiddleLevel.objects.create(level_number=1, category=riddle_category, questions_required=5)
+        for answer in ['A cloud', 'A river', 'A tree', 'The moon']:
+            RiddleQuestion.objects.create(category=riddle_category, question_text=f"What is {answer}?", answer=answer)
+        MathGameLevel.objects.create(level_number=1, difficulty='easy', operations=['+'], problems_required=5)
+        patcher = mock.patch('core.ai_providers._provider', FakeProvider(latency_ms=10, jitter_ms=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stream(self, path):
+        response = self.client.get(path, {'level': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def assert_level_stream(self, events, item_type, count):
+        self.assertEqual(events[0]['type'], 'level')
+        self.assertEqual(events[0]['level_number'], 1)
+        self.assertEqual([event['type'] for event in events[1:-1]], [item_type] * count)
+        self.assertEqual(events[-1]['type'], 'done')
+
+    def test_quiz_level_streams_metadata_questions_then_counts(self):
+        events = self.stream('/api/quizes/level/stream/')
+
+        self.assert_level_stream(events, 'question', 5)
+        self.assertEqual(events[-1]['ai_questions_count'] + events[-1]['db_questions_count'], 5)
+
+    def test_riddle_level_streams_every_question(self):
+        events = self.stream('/api/riddles/level/stream/')
+
+        self.assert_level_stream(events, 'question', 5)
+
+    def test_math_level_streams_every_problem(self):
+        events = self.stream('/api/math-game/level/stream/')
+
+        self.assert_level_stream(events, 'problem', 5)
+
+    def test_unknown_level_is_not_streamed(self):
+        response = self.client.get('/api/quizes/level/stream/', {'level': 99})
+
+        self.assertEqual(response.status_code, 404)
+
+
+class SingleFlightTests(TestCase):
+    def run_together(self, calls):
+        results = [None] * len(calls)
+
+        def run(index):
+            results[index] = calls[index]()
+
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(len(calls))]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.02)
+        for thread in threads:
+            thread.join(2)
+        return results
+
+    def test_concurrent_callers_share_one_generation(self):
+        flights = SingleFlight()
+        generations = []
+
+        def generate():
+            generations.append(1)
+            time.sleep(0.2)
+            return list(range(8))
+
+        results = self.run_together([lambda: flights.do('level-1', generate, timeout=1)] * 4)
+
+        self.assertEqual(len(generations), 1)
+        self.assertEqual([sorted(result) for result in results], [list(range(8))] * 4)
+
+    def test_followers_of_a_failed_leader_get_none(self):
+        flights = SingleFlight()
+
+        def generate():
+            time.sleep(0.2)
+            raise RuntimeError('provider down')
+
+        def lead():
+            try:
+                return flights.do('level-1', generate, timeout=1)
+            except RuntimeError:
+                return 'raised'
+
+        results = self.run_together([lead, lambda: flights.do('level-1', generate, timeout=1)])
+
+        self.assertEqual(results, ['raised', None])
+
+    def test_finished_flights_are_not_reused(self):
+        flights = SingleFlight()
+
+        self.assertEqual(flights.do('level-1', lambda: 'first'), 'first')
+        self.assertEqual(flights.do('level-1', lambda: 'second'), 'second')
+
+    def test_followers_get_private_shuffled_copies(self):
+        random.seed(3)
+        result = [{'n': n} for n in range(10)]
+
+        copy = shuffled_copy(result)
+        copy[0]['n'] = -1
+
+        self.assertEqual([item['n'] for item in result], list(range(10)))
+        self.assertNotEqual([item['n'] for item in shuffled_copy(result)], list(range(10)))
+
+    def test_identical_level_requests_make_one_batch_call(self):
+        batch_calls = []
+
+        def batch(count):
+            batch_calls.append(count)
+            time.sleep(0.2)
+            return [f"item {slot}" for slot in range(count)]
+
+        def request():
+            return run_batch_with_backfill(batch, lambda slot: None, 3, deadline=1, flight_key=('quiz', 1))
+
+        results = self.run_together([request] * 3)
+
+        self.assertEqual(batch_calls, [3])
+        self.assertEqual([sorted(result) for result in results], [['item 0', 'item 1', 'item 2']] * 3)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        ai_metrics.reset()
+        self.addCleanup(ai_metrics.reset)
+
+    def test_track_level_records_tiers_and_level_latency(self):
+        served = list(track_level('quiz', iter([('ai', 'q1'), ('db', 'q2'), ('fallback', 'q3')])))
+        snapshot = ai_metrics.snapshot()
+
+        self.assertEqual(served, [('ai', 'q1'), ('db', 'q2'), ('fallback', 'q3')])
+        self.assertEqual(snapshot['tiers']['quiz'], {'ai': 1, 'db': 1, 'fallback': 1, 'fallback_ratio': 0.667})
+        self.assertEqual(snapshot['levels']['quiz']['count'], 1)
+
+    def test_level_is_recorded_when_the_client_stops_early(self):
+        items = track_level('riddle', iter([('ai', 'r1'), ('ai', 'r2')]))
+        next(items)
+        items.close()
+
+        self.assertEqual(ai_metrics.snapshot()['levels']['riddle']['count'], 1)
+
+    def test_generator_calls_record_model_tokens_and_outcome(self):
+        @instrumented('quiz')
+        def answered():
+            note_usage('model-a', 120, 80)
+            return 'question'
+
+        @instrumented('quiz')
+        def invalid():
+            raise ValueError('no options')
+
+        answered()
+        with self.assertRaises(ValueError):
+            invalid()
+        calls = ai_metrics.snapshot()['calls']
+
+        self.assertEqual(calls['quiz/model-a']['outcomes'], {'ok': 1})
+        self.assertEqual(calls['quiz/model-a']['prompt_tokens'], 120)
+        self.assertEqual(calls['quiz/model-a']['completion_tokens'], 80)
+        self.assertEqual(calls['quiz/none']['outcomes'], {'validation_failure': 1})
+
+    @override_settings(DEBUG=False)
+    def test_metrics_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get('/api/ai/metrics/').status_code, 403)
+
+    @override_settings(DEBUG=True)
+    def test_metrics_endpoint(self):
+        list(track_level('math', iter([('ai', 'p1')])))
+
+        data = self.client.get('/api/ai/metrics/').json()
+
+        self.assertEqual(data['tiers']['math']['ai'], 1)
+        self.assertIn('cache', data)
+
+
+@override_settings(AI_INVENTORY_WATERMARK=0)
+class AsyncLevelTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        generation_cache.clear()
+        quiz_category = QuizCategory.objects.create(name='Animals', difficulty='easy')
+        QuizLevel.objects.create(level_number=1, category=quiz_category, questions_required=5)
+        riddle_category = RiddleCategory.objects.create(name='Nature', difficulty='easy')
+        RiddleLevel.objects.create(level_number=1, category=riddle_category, questions_required=5)
+        for answer in ['A cloud', 'A river', 'A tree', 'The moon']:
+            RiddleQuestion.objects.create(category=riddle_category, question_text=f"What is {answer}?", answer=answer)
+        MathGameLevel.objects.create(level_number=1, difficulty='easy', operations=['+'], problems_required=5)
+        patcher = mock.patch('core.ai_providers._provider', FakeProvider(latency_ms=10, jitter_ms=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_level(self, path):
+        response = self.client.get(path, {'level': 1})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_async_quiz_level_is_filled_by_the_ai(self):
+        data = self.get_level('/api/quizes/level/async/')
+
+        self.assertEqual(len(data['questions']), 5)
+        self.assertEqual(data['ai_questions_count'], 5)
+
+    def test_async_riddle_level(self):
+        data = self.get_level('/api/riddles/level/async/')
+
+        self.assertEqual(len(data['questions']), 5)
+        self.assertEqual(data['level_number'], 1)
+
+    def test_async_math_level(self):
+        data = self.get_level('/api/math-game/level/async/')
+
+        self.assertEqual(len(data['problems']), 5)
+
+    def test_async_level_falls_back_when_the_provider_is_slow(self):
+        with override_settings(AI_LEVEL_DEADLINE_SECONDS=0.2), \
+                mock.patch('core.ai_providers._provider', FakeProvider(latency_ms=2000, jitter_ms=0)):
+            data = self.get_level('/api/quizes/level/async/')
+
+        self.assertEqual(len(data['questions']), 5)
+        self.assertEqual(data['ai_questions_count'], 0)
+
+    def test_unknown_level(self):
+        self.assertEqual(self.client.get('/api/quizes/level/async/', {'level': 99}).status_code, 404)
+
+
+class AsyncClientTests(TestCase):
+    def test_one_client_per_loop_closed_with_the_loop(self):
+        clients = []
+
+        async def use_client():
+            clients.append(get_async_http_client())
+            self.assertIs(get_async_http_client(), clients[-1])
+
+        async_to_sync(use_client)()
+        async_to_sync(use_client)()
+
+        self.assertIsNot(clients[0], clients[1])
+        self.assertTrue(all(client.is_closed for client in clients))
+
+
+@override_settings(AI_LEVEL_LOAD_BUDGET_SECONDS=1, AI_POLICY_MIN_SAMPLES=5)
+class PlanAISlotsTests(TestCase):
+    def setUp(self):
+        ai_metrics.reset()
+        self.addCleanup(ai_metrics.reset)
+
+    def observe(self, *latencies_ms):
+        for latency_ms in latencies_ms:
+            ai_metrics.record_call('quiz', 'model-a', 'ok', latency_ms)
+
+    def test_every_slot_goes_to_the_ai_until_there_are_samples(self):
+        self.observe(5000, 5000)
+
+        self.assertEqual(plan_ai_slots('quiz', 5, 5), 5)
+
+    def test_fast_provider_gets_every_slot(self):
+        self.observe(*[200] * 10)
+
+        self.assertEqual(plan_ai_slots('quiz', 5, 5), 5)
+
+    def test_slow_provider_only_gets_what_the_database_cannot_cover(self):
+        self.observe(*[5000] * 10)
+
+        self.assertEqual(plan_ai_slots('quiz', 5, 10), 0)
+        self.assertEqual(plan_ai_slots('quiz', 5, 3), 2)
+
+    def test_tail_over_budget_shares_the_slots(self):
+        self.observe(*[200] * 6 + [3000] * 4)
+
+        self.assertEqual(plan_ai_slots('quiz', 5, 5), 3)
+
+    def test_games_are_planned_separately(self):
+        self.observe(*[5000] * 10)
+
+        self.assertEqual(plan_ai_slots('math', 5, 5), 5)
+
+    @override_settings(AI_MODELS=['model-a', 'model-b'], AI_BREAKER_FAILURE_THRESHOLD=1)
+    def test_ai_is_skipped_once_every_model_circuit_is_open(self):
+        self.addCleanup(model_breakers.reset)
+        model_breakers.get('model-a').record_failure()
+        self.assertEqual(plan_ai_slots('quiz', 5, 3), 5)
+
+        model_breakers.get('model-b').record_failure()
+        self.assertEqual(plan_ai_slots('quiz', 5, 3), 2)
+
+
+@override_settings(AI_MODELS=['fast', 'slow'], AI_ROUTER_EXPLORE_RATE=0, AI_ROUTER_PRIOR_LATENCY_MS=1500)
+class ModelRouterTests(TestCase):
+    ROUTE = ('quiz', 'easy', 'single')
+
+    def setUp(self):
+        self.router = ModelRouter()
+
+    def record(self, model, outcome, latency_ms, times=5, route=ROUTE):
+        for _ in range(times):
+            self.router.record(route, model, outcome, latency_ms)
+
+    def test_configured_order_decides_without_samples(self):
+        self.assertEqual(self.router.choose(self.ROUTE), 'fast')
+
+    def test_lower_latency_wins(self):
+        self.record('fast', 'ok', 3000)
+        self.record('slow', 'ok', 500)
+
+        self.assertEqual(self.router.choose(self.ROUTE), 'slow')
+
+    def test_invalid_output_demotes_a_fast_model(self):
+        self.record('fast', 'validation_failure', 300)
+        self.record('slow', 'ok', 800)
+
+        self.assertEqual(self.router.ranked(self.ROUTE), ['slow', 'fast'])
+
+    def test_routes_are_scored_separately(self):
+        self.record('fast', 'error', 3000, route=('quiz', 'easy', 'batch'))
+
+        self.assertEqual(self.router.choose(('quiz', 'easy', 'batch')), 'slow')
+        self.assertEqual(self.router.choose(self.ROUTE), 'fast')
+
+    @override_settings(AI_ROUTER_EXPLORE_RATE=1)
+    def test_exploration_tries_another_model(self):
+        self.assertEqual(self.router.choose(self.ROUTE), 'slow')
+
+
+@override_settings(AI_MODELS=['fast', 'slow'], AI_ROUTER_EXPLORE_RATE=0, AI_BREAKER_FAILURE_THRESHOLD=1)
+class ModelBreakersTests(TestCase):
+    ROUTE = ('quiz', 'easy', 'single')
+
+    def setUp(self):
+        model_breakers.reset()
+        self.addCleanup(model_breakers.reset)
+
+    def test_each_provider_model_has_its_own_breaker(self):
+        model_breakers.get('fast', 'groq').record_failure()
+
+        self.assertTrue(model_breakers.is_open('fast', 'groq'))
+        self.assertFalse(model_breakers.is_open('slow', 'groq'))
+        self.assertFalse(model_breakers.is_open('fast', 'fake'))
+
+    def test_models_with_an_open_circuit_are_ranked_last(self):
+        model_breakers.get('fast').record_failure()
+
+        self.assertEqual(ModelRouter().ranked(self.ROUTE), ['slow', 'fast'])
+
+    @override_settings(AI_ROUTER_EXPLORE_RATE=1)
+    def test_open_circuits_are_not_explored(self):
+        model_breakers.get('slow').record_failure()
+
+        self.assertEqual(ModelRouter().choose(self.ROUTE), 'fast')
+
+
+@override_settings(
+    AI_MODELS=['primary', 'backup'], AI_ROUTER_EXPLORE_RATE=0,
+    AI_HEDGE_MIN_SAMPLES=5, AI_HEDGE_PERCENTILE=0.9, AI_HEDGE_MAX_RATIO=0.5,
+)
+class HedgingTests(TestCase):
+    ROUTE = ('quiz', 'easy', 'single')
+
+    def setUp(self):
+        hedge_policy.reset()
+        model_router.reset()
+        self.addCleanup(hedge_policy.reset)
+        self.addCleanup(model_router.reset)
+
+    def observe(self, *latencies_ms):
+        for latency_ms in latencies_ms:
+            hedge_policy.observe(self.ROUTE, latency_ms)
+
+    def test_routes_without_enough_samples_are_not_hedged(self):
+        self.observe(10, 20)
+
+        self.assertIsNone(hedge_policy.delay(self.ROUTE))
+
+    def test_delay_is_the_route_latency_percentile(self):
+        self.observe(*range(10, 101, 10))
+
+        self.assertAlmostEqual(hedge_policy.delay(self.ROUTE), 0.09)
+
+    def test_token_bucket_caps_the_hedge_ratio(self):
+        hedge_policy.note_call()
+        self.assertFalse(hedge_policy.take_hedge())
+        hedge_policy.note_call()
+        self.assertTrue(hedge_policy.take_hedge())
+        self.assertFalse(hedge_policy.take_hedge())
+
+    def test_saved_tokens_are_capped(self):
+        for _ in range(100):
+            hedge_policy.note_call()
+        taken = 0
+        while hedge_policy.take_hedge():
+            taken += 1
+
+        self.assertEqual(taken, 5)
+
+    def test_slow_call_is_hedged_with_the_next_model(self):
+        self.observe(*[20] * 5)
+        hedge_policy.note_call()
+
+        def attempt(model):
+            if model == 'primary':
+                time.sleep(0.5)
+            return model
+
+        started = time.monotonic()
+        self.assertEqual(call_hedged(self.ROUTE, attempt), 'backup')
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual((hedge_policy.hedges, hedge_policy.hedge_wins), (1, 1))
+
+    def test_fast_call_is_not_hedged(self):
+        self.observe(*[500] * 5)
+        hedge_policy.note_call()
+
+        self.assertEqual(call_hedged(self.ROUTE, lambda model: model), 'primary')
+        self.assertEqual(hedge_policy.hedges, 0)
+
+    def test_async_hedge_cancels_the_loser(self):
+        self.observe(*[20] * 5)
+        hedge_policy.note_call()
+        cancelled = []
+
+        async def attempt(model):
+            if model == 'primary':
+                try:
+                    await asyncio.sleep(0.5)
+                except asyncio.CancelledError:
+                    cancelled.append(model)
+                    raise
+            return model
+
+        self.assertEqual(asyncio.run(acall_hedged(self.ROUTE, attempt)), 'backup')
+        self.assertEqual(cancelled, ['primary'])
+
+
+class MathTemplateTests(TestCase):
+    def setUp(self):
+        self.level = MathGameLevel.objects.create(
+            level_number=1, difficulty='easy', operations=['+', '-', '×', '÷'],
+            number_range_min=1, number_range_max=20, problems_required=10,
+        )
+
+    def test_operands_give_whole_non_negative_answers(self):
+        rng = random.Random(1)
+        for operation in ['+', '-', '×', '÷']:
+            for _ in range(200):
+                a, b, answer = draw_operands(operation, 1, 20, rng)
+                expected = {'+': a + b, '-': a - b, '×': a * b, '÷': a // b}[operation]
+                self.assertEqual(answer, expected)
+                self.assertGreaterEqual(answer, 0)
+                if operation == '÷':
+                    self.assertEqual(a % b, 0)
+
+    def test_young_players_get_small_numbers(self):
+        rng = random.Random(2)
+        for _ in range(100):
+            problem = build_template_problem(['+'], 1, 100, age=5, rng=rng)
+            self.assertLessEqual(problem['correct_answer'], 20)
+
+    def test_word_problems_carry_their_answer_in_the_explanation(self):
+        rng = random.Random(3)
+        for _ in range(50):
+            problem = build_template_problem(['×'], 1, 12, age=12, rng=rng)
+            self.assertTrue(problem['explanation'].endswith(f"= {problem['correct_answer']}"))
+            self.assertFalse(problem['is_ai'])
+
+    def test_level_problems_are_distinct(self):
+        problems = build_template_problems(self.level, 8, rng=random.Random(4))
+
+        self.assertEqual(len(problems), 8)
+        self.assertEqual(len({problem['problem_text'] for problem in problems}), 8)
+
+    @override_settings(MATH_LOCAL_TEMPLATE_RATIO=0.8, AI_INVENTORY_WATERMARK=0)
+    def test_level_sends_only_the_remaining_slots_to_the_ai(self):
+        generation_cache.clear()
+        with mock.patch('core.ai_providers._provider', FakeProvider(latency_ms=10, jitter_ms=0)):
+            data = self.client.get('/api/math-game/level/', {'level': 1}).json()
+
+        self.assertEqual(len(data['problems']), 10)
+        self.assertEqual(data['template_problems_count'], 8)
+        self.assertEqual(data['ai_problems_count'] + data['db_problems_count'], 2)
+
+    @override_settings(MATH_LOCAL_TEMPLATE_RATIO=0.8, AI_INVENTORY_WATERMARK=0)
+    def test_template_problems_are_spread_through_the_level(self):
+        generation_cache.clear()
+        random.seed(5)
+        ai_positions = set()
+        with mock.patch('core.ai_providers._provider', FakeProvider(latency_ms=10, jitter_ms=0)):
+            for _ in range(5):
+                problems = self.client.get('/api/math-game/level/', {'level': 1}).json()['problems']
+                self.assertFalse(problems[0]['is_ai'])
+                ai_positions.update(index for index, problem in enumerate(problems) if problem['is_ai'])
+
+        self.assertTrue(ai_positions - {8, 9})
+
+
+class MathBankTests(TestCase):
+    def setUp(self):
+        self.level = MathGameLevel.objects.create(
+            level_number=1, difficulty='easy', operations=['+', '-', '×', '÷'],
+            number_range_min=1, number_range_max=12,
+        )
+
+    def test_answers_are_exact(self):
+        for problem in build_level_bank(self.level, 300, seed=1):
+            a, operation, b = problem.problem_text.split()
+            a, b = int(a), int(b)
+            if operation == '÷':
+                self.assertEqual(a, b * problem.correct_answer)
+            else:
+                self.assertEqual(problem.correct_answer, {'+': a + b, '-': a - b, '×': a * b}[operation])
+            self.assertGreaterEqual(problem.correct_answer, 0)
+
+    def test_no_duplicates_including_commutative_repeats(self):
+        problems = build_level_bank(self.level, 300, seed=2)
+
+        keys = set()
+        for problem in problems:
+            a, operation, b = problem.problem_text.split()
+            if operation in ('+', '×'):
+                a, b = sorted((int(a), int(b)))
+            keys.add((operation, int(a), int(b)))
+        self.assertEqual(len(keys), len(problems))
+
+    def test_refill_skips_problems_the_level_has(self):
+        created = fill_level_bank(self.level, 50, seed=3)
+        again = build_level_bank(self.level, 50, seed=3)
+
+        existing = set(MathGameProblem.objects.filter(level=self.level).values_list('problem_text', flat=True))
+        self.assertEqual(created, 50)
+        self.assertFalse(existing & {problem.problem_text for problem in again})
+
+    def test_small_range_gives_every_distinct_problem(self):
+        level = MathGameLevel.objects.create(level_number=2, difficulty='easy', operations=['+'],
+                                             number_range_min=1, number_range_max=3)
+
+        problems = build_level_bank(level, 100, seed=4)
+
+        # 1+1, 1+2, 1+3, 2+2, 2+3, 3+3
+        self.assertEqual(len(problems), 6)
+
+
+def pairwise_is_used(question_text, used_riddles, threshold=0.8):
+    """The original O(n) check RiddleIndex replaces"""
+    question_lower = question_text.lower().strip()
+    for used_question in used_riddles:
+        used_lower = used_question.lower().strip()
+        question_words = set(question_lower.split())
+        used_words = set(used_lower.split())
+        if len(question_words & used_words) / max(len(question_words), 1) > threshold:
+            return True
+        if question_lower in used_lower or used_lower in question_lower:
+            if len(question_lower) > 20 or len(used_lower) > 20:
+                return True
+    return False
+
+
+class RiddleIndexTests(TestCase):
+    WORDS = ['I', 'am', 'tall', 'when', 'young', 'short', 'old', 'what', 'the', 'moon', 'river', 'has', 'no', 'legs']
+
+    def random_riddle(self, rng):
+        return ' '.join(rng.choice(self.WORDS) for _ in range(rng.randint(1, 9)))
+
+    def test_matches_pairwise_check(self):
+        rng = random.Random(7)
+        for _ in range(30):
+            used = [self.random_riddle(rng) for _ in range(rng.randint(0, 25))]
+            index = RiddleIndex(used)
+            for _ in range(40):
+                candidate = self.random_riddle(rng)
+                self.assertEqual(index.is_used(candidate), pairwise_is_used(candidate, used), (candidate, used))
+
+    def test_containment_only_counts_for_long_texts(self):
+        self.assertTrue(RiddleIndex(['I have keys but open no locks, what am I?']).is_used('keys but open no loc'))
+        self.assertFalse(RiddleIndex(['the moon']).is_used('moo'))
+
+    def test_added_riddles_are_found(self):
+        index = RiddleIndex()
+        self.assertFalse(index.is_used('What has hands but cannot clap?'))
+        index.add('What has hands but cannot clap?')
+
+        self.assertTrue(index.is_used('what has hands but cannot clap?'))
+
+
+class DistractorIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_distractor_index()
+        self.nature = RiddleCategory.objects.create(name='Nature', difficulty='easy')
+        self.home = RiddleCategory.objects.create(name='Home', difficulty='medium')
+        for category, answers in [
+            (self.nature, ['A cloud', 'A river', 'A tree', 'The moon', 'Fire']),
+            (self.home, ['A key', 'A candle', 'A clock']),
+        ]:
+            for answer in answers:
+                RiddleQuestion.objects.create(category=category, question_text=f"What is {answer}?", answer=answer)
+
+    def test_distractors_share_the_answer_shape(self):
+        picked = distractor_index.pool([self.nature.pk], 'easy').sample('A shadow', 3)
+
+        self.assertEqual(len(set(picked)), 3)
+        self.assertTrue(all(answer_shape(answer) == ('article', 2) for answer in picked))
+
+    def test_correct_answer_and_exclusions_are_never_offered(self):
+        for _ in range(20):
+            picked = distractor_index.pool([self.nature.pk], 'easy').sample('a cloud', 3, exclude={'a river'})
+            self.assertEqual(len(picked), 3)
+            self.assertFalse({'a cloud', 'a river'} & {answer.lower() for answer in picked})
+
+    def test_small_buckets_widen_to_the_rest_of_the_bank(self):
+        picked = distractor_index.pool([self.home.pk], 'medium').sample('A key', 3)
+
+        self.assertEqual(len(picked), 3)
+        self.assertLessEqual({'A candle', 'A clock'}, set(picked))
+        self.assertIn((set(picked) - {'A candle', 'A clock'}).pop(), {'A cloud', 'A river', 'A tree', 'The moon'})
+
+    def test_changed_riddles_rebuild_the_index(self):
+        self.assertNotIn('A lamp', distractor_index.buckets()[('category', self.home.pk)])
+        RiddleQuestion.objects.create(category=self.home, question_text="What lights the room?", answer='A lamp')
+        self.assertIn('A lamp', distractor_index.buckets()[('category', self.home.pk)])
+
+        # Queryset updates send no signals; bulk writers invalidate themselves
+        RiddleQuestion.objects.filter(answer='A key').update(is_active=False)
+        invalidate_distractor_index()
+
+        home_answers = distractor_index.buckets()[('category', self.home.pk)]
+        self.assertEqual(sorted(home_answers), ['A candle', 'A clock', 'A lamp'])
+
+
+class RiddleLevelSyncTests(TestCase):
+    def add_levels(self, count, start=1):
+        for number in range(start, start + count):
+            category = QuizCategory.objects.create(name=f"Topic {number}", difficulty='easy', color='#111111')
+            QuizLevel.objects.create(level_number=number, category=category, questions_required=5)
+
+    def test_riddle_levels_mirror_the_quiz_levels(self):
+        self.add_levels(3)
+
+        self.assertEqual(sync_riddle_levels_from_quiz(), 6)
+
+        levels = list(RiddleLevel.objects.select_related('category'))
+        self.assertEqual([level.level_number for level in levels], [1, 2, 3])
+        self.assertEqual([level.category.name for level in levels], ['Topic 1', 'Topic 2', 'Topic 3'])
+        self.assertTrue(all(level.category.color == '#111111' for level in levels))
+
+    def test_changes_are_upserted_in_place(self):
+        self.add_levels(2)
+        sync_riddle_levels_from_quiz()
+        QuizLevel.objects.filter(level_number=2).update(questions_required=8)
+        QuizCategory.objects.filter(name='Topic 1').update(color='#222222')
+
+        self.assertEqual(sync_riddle_levels_from_quiz(), 2)
+
+        self.assertEqual(RiddleLevel.objects.count(), 2)
+        self.assertEqual(RiddleCategory.objects.count(), 2)
+        self.assertEqual(RiddleLevel.objects.get(level_number=2).questions_required, 8)
+        self.assertEqual(RiddleCategory.objects.get(name='Topic 1').color, '#222222')
+
+    def test_statement_count_does_not_grow_with_the_levels(self):
+        self.add_levels(2)
+        sync_riddle_levels_from_quiz()
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(sync_riddle_levels_from_quiz(), 0)
+
+        self.add_levels(10, start=3)
+        sync_riddle_levels_from_quiz()
+        with CaptureQueriesContext(connection) as many:
+            sync_riddle_levels_from_quiz()
+
+        self.assertEqual(len(many), len(few))
+
+    def test_saving_a_quiz_level_syncs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_levels(1)
+
+        self.assertTrue(RiddleLevel.objects.filter(level_number=1).exists())
+
+    def test_one_sync_per_transaction(self):
+        with mock.patch('core.signals.sync_riddle_levels_from_quiz') as sync:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.add_levels(3)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(sync.call_count, 1)
+
+
+class PkSamplerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.level = MathGameLevel.objects.create(level_number=1, difficulty='easy', operations=['+'])
+        self.problems = [
+            MathGameProblem.objects.create(problem_text=f"{n} + 1", correct_answer=n + 1, operation='+', level=self.level)
+            for n in range(1, 21)
+        ]
+
+    def sample(self, **kwargs):
+        return pk_sampler.sample(MathGameProblem, {'level_id': self.level.pk, 'is_active': True}, **kwargs)
+
+    def test_excluded_rows_are_never_drawn(self):
+        excluded = {problem.pk for problem in self.problems[:15]}
+        rows = self.sample(exclude=excluded, batch_size=3)
+
+        self.assertEqual(len(rows), 5)
+        drawn = [rows.pop(0).pk for _ in range(5)]
+        self.assertEqual(set(drawn), {problem.pk for problem in self.problems[15:]})
+        self.assertFalse(rows)
+
+    def test_take_returns_distinct_rows(self):
+        taken = self.sample().take(12)
+
+        self.assertEqual(len({row.pk for row in taken}), 12)
+
+    def test_deactivated_rows_are_skipped(self):
+        rows = self.sample(exclude={problem.pk for problem in self.problems[:18]})
+        MathGameProblem.objects.filter(pk=self.problems[18].pk).update(is_active=False)
+
+        self.assertEqual([row.pk for row in rows.take(5)], [self.problems[19].pk])
+
+    def test_saving_a_row_refreshes_the_id_list(self):
+        self.assertEqual(len(self.sample()), 20)
+        MathGameProblem.objects.create(problem_text="30 + 1", correct_answer=31, operation='+', level=self.level)
+
+        self.assertEqual(len(self.sample()), 21)
+
+
+class SeenSetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_round_trip(self):
+        seen = SeenSet.load('quiz', owner_key(session_id='abc'))
+        seen.add_id(5)
+        seen.add_id(7)
+        seen.add_text('What is  the Capital of Malawi?')
+        seen.save()
+
+        loaded = SeenSet.load('quiz', owner_key(session_id='abc'))
+        self.assertTrue(loaded.has_id(5))
+        self.assertTrue(loaded.has_id(7))
+        self.assertFalse(loaded.has_id(6))
+        self.assertTrue(loaded.has_text('what is the capital of malawi?'))
+        self.assertEqual(loaded.recent, ['What is  the Capital of Malawi?'])
+
+    def test_games_and_owners_are_separate(self):
+        seen = SeenSet.load('quiz', owner_key(session_id='abc'))
+        seen.add_id(5)
+        seen.save()
+
+        self.assertFalse(SeenSet.load('math', owner_key(session_id='abc')).has_id(5))
+        self.assertFalse(SeenSet.load('quiz', owner_key(session_id='xyz')).has_id(5))
+
+    @override_settings(SEEN_CONTENT_MAX_ITEMS=3)
+    def test_only_newest_items_are_kept(self):
+        seen = SeenSet.load('quiz', 'session_abc')
+        for pk in range(1, 6):
+            seen.add_id(pk)
+        seen.save()
+
+        self.assertEqual(SeenSet.load('quiz', 'session_abc').id_set, {3, 4, 5})
+
+    def test_anonymous_history_is_not_stored(self):
+        self.assertIsNone(owner_key(session_id='anonymous'))
+        seen = SeenSet.load('quiz', None)
+        seen.add_id(1)
+        seen.save()
+
+        self.assertFalse(SeenSet.load('quiz', None).has_id(1))
+
+    def test_clear(self):
+        seen = SeenSet.load('riddle', 'session_abc')
+        seen.add_text('riddle')
+        seen.save()
+        seen.clear()
+
+        self.assertFalse(SeenSet.load('riddle', 'session_abc').has_text('riddle'))
+        self.assertEqual(content_hash('A  b'), content_hash('a b'))
+
+
+class WordSearchEngineTests(TestCase):
+    WORDS = ['ADVENTURE', 'DISCOVERY', 'TREASURE', 'CHALLENGE', 'VICTORY', 'CAT', 'DOG', 'SUN', 'MOON', 'TREE']
+
+    def assert_straight_line(self, cells, grid_size):
+        rows = [cell // grid_size for cell in cells]
+        cols = [cell % grid_size for cell in cells]
+        step = (rows[1] - rows[0], cols[1] - cols[0])
+        self.assertIn(step, DIRECTIONS)
+        for index in range(1, len(cells)):
+            self.assertEqual((rows[index] - rows[index - 1], cols[index] - cols[index - 1]), step)
+
+    def test_words_are_spelled_along_straight_lines(self):
+        for seed in range(10):
+            puzzle = build_word_search(self.WORDS, 12, seed=seed)
+            letters = puzzle.letters
+
+            self.assertEqual(len(letters), 144)
+            self.assertTrue(all('A' <= letter <= 'Z' for letter in letters))
+            for word, cells in puzzle.word_positions.items():
+                self.assertEqual(''.join(letters[cell] for cell in cells), word)
+                self.assert_straight_line(cells, 12)
+            self.assertEqual(set(puzzle.word_positions) | set(puzzle.unplaced_words), set(self.WORDS))
+
+    def test_words_that_cannot_fit_are_reported(self):
+        puzzle = build_word_search(['CAT', 'ELEPHANT'], 5, seed=1)
+
+        self.assertEqual(puzzle.placed_words, ['CAT'])
+        self.assertEqual(puzzle.unplaced_words, ['ELEPHANT'])
+
+    def test_same_seed_gives_same_grid(self):
+        self.assertEqual(build_word_search(self.WORDS, 10, seed=3).cells, build_word_search(self.WORDS, 10, seed=3).cells)
+
+    def test_packed_positions_round_trip(self):
+        for seed in range(10):
+            puzzle = build_word_search(self.WORDS, 15, seed=seed)
+            packed = puzzle.packed_positions
+
+            self.assertEqual(len(packed), 3 * len(puzzle.placed_words))
+            self.assertEqual(unpack_positions(puzzle.placed_words, packed, 15), puzzle.word_positions)
+            self.assertEqual(unpack_grid(pack_grid(puzzle.letters)), puzzle.letters)
+
+    def test_packing_uses_the_stored_grid_width(self):
+        grid = [list('CATXXX'), list('O' * 6), list('WXXXXX')] + [list('X' * 6)] * 3
+        positions = {'CAT': [0, 1, 2], 'COW': [0, 6, 12]}
+        width = grid_width(grid)
+
+        packed = pack_positions(['CAT', 'COW'], positions, width)
+
+        self.assertEqual(width, 6)
+        self.assertEqual(packed, [0, 0, 3, 0, 1, 3])
+        self.assertEqual(unpack_positions(['CAT', 'COW'], packed, width), positions)
+
+    def test_words_without_positions_survive_packing(self):
+        packed = pack_positions(['CAT', 'DOG'], {'DOG': [5, 6, 7]}, 8)
+
+        self.assertEqual(unpack_positions(['CAT', 'DOG'], packed, 8), {'DOG': [5, 6, 7]})
+
+
+class WordSearchFarmTests(TestCase):
+    def setUp(self):
+        self.level = WordSearchLevel.objects.create(level_number=1, difficulty='easy', grid_size=8, word_count=4)
+        self.category = WordSearchCategory.objects.create(name='Animals')
+        WordSearchCategory.objects.create(name='Retired', is_active=False)
+        # Same work in threads; forking a process pool under the test runner is not needed
+        patcher = mock.patch('core.word_search_bank.ProcessPoolExecutor', ThreadPoolExecutor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_active_pairs_are_topped_up_to_the_target(self):
+        self.assertEqual(farm_puzzles(6, seed=1), 6)
+        self.assertEqual(farm_puzzles(8, seed=2), 2)
+
+        puzzles = WordSearchPuzzle.objects.filter(level=self.level)
+        self.assertEqual(puzzles.count(), 8)
+        self.assertEqual(set(puzzles.values_list('category__name', flat=True)), {'Animals'})
+        self.assertEqual(len({str(puzzle.grid_data) for puzzle in puzzles}), 8)
+
+    def test_duplicate_grids_are_dropped(self):
+        build_grids = word_search_bank.build_grids
+
+        def same_grid(task):
+            return build_grids(task)[:1] * task[3]
+
+        with mock.patch('core.word_search_bank.build_grids', same_grid):
+            self.assertEqual(farm_puzzles(5, seed=1), 1)
+            # Also when the grid is already stored
+            self.assertEqual(farm_puzzles(5, seed=1), 0)
+
+    def test_rows_are_inserted_in_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            farm_puzzles(7, batch_size=3, seed=1)
+
+        inserts = [query for query in queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 3)
+
+
+class WordSearchCatalogueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        word_search_catalogue.invalidate()
+        self.level = WordSearchLevel.objects.create(level_number=1, difficulty='easy', grid_size=8, word_count=1)
+        self.animals = WordSearchCategory.objects.create(name='Animals')
+        retired = WordSearchCategory.objects.create(name='Retired', is_active=False)
+        self.puzzle = self.add_puzzle(self.animals)
+        self.add_puzzle(self.animals, is_active=False)
+        self.add_puzzle(retired)
+
+    def add_puzzle(self, category, is_active=True):
+        return WordSearchPuzzle.objects.create(
+            title='Challenge', category=category, level=self.level, words=['CAT'],
+            grid_data='CAT' + 'X' * 61, word_positions=[0, 0, 3], is_active=is_active,
+        )
+
+    def test_pick_draws_from_active_rows_only(self):
+        for _ in range(10):
+            self.assertEqual(word_search_catalogue.pick(1), (self.level, self.animals, self.puzzle.pk))
+
+    def test_unknown_level_or_no_categories(self):
+        self.assertIsNone(word_search_catalogue.pick(2))
+        WordSearchCategory.objects.update(is_active=False)
+        word_search_catalogue.invalidate()
+
+        self.assertIsNone(word_search_catalogue.pick(1))
+
+    def test_picks_are_served_from_memory(self):
+        word_search_catalogue.pick(1)
+
+        with self.assertNumQueries(0):
+            word_search_catalogue.pick(1)
+
+    def test_saved_rows_refresh_the_catalogue(self):
+        word_search_catalogue.pick(1)
+        newer = self.add_puzzle(self.animals)
+
+        puzzle_ids = word_search_catalogue.get().puzzle_ids[(1, self.animals.pk)]
+        self.assertEqual(sorted(puzzle_ids), [self.puzzle.pk, newer.pk])
+
+    @override_settings(WORD_SEARCH_CATALOGUE_TTL_SECONDS=0)
+    def test_catalogue_expires_after_its_ttl(self):
+        word_search_catalogue.pick(1)
+        # Queryset updates send no signals; only the TTL catches them
+        WordSearchPuzzle.objects.filter(pk=self.puzzle.pk).update(is_active=False)
+
+        self.assertEqual(word_search_catalogue.pick(1), (self.level, self.animals, None))
@@ -17,6 +17,11 @@ from .forms import *
 from .models import *
 from .game_utils import filter_by_age_appropriate, get_age_from_birthdate, get_difficulty_by_age
 from . import riddles_game as riddles_views
+from .word_search_bank import WORD_LISTS, word_hints
+from .word_search_catalogue import word_search_catalogue
+from .word_search_engine import (
+    build_word_search, grid_width, pack_grid, pack_positions, unpack_grid, unpack_positions
+)
 from datetime import date
 from dateutil.relativedelta import relativedelta
 logger = logging.getLogger(__name__)
@@ -238,171 +243,73 @@ def words_search(request):
 
 def generate_word_search_puzzle(level_number, user=None):
     """Generate a word search puzzle for the given level, filtered by user age"""
-    try:
-        # Filter levels by age-appropriate difficulty
-        levels = WordSearchLevel.objects.filter(level_number=level_number)
-        levels_query = filter_by_age_appropriate(user, levels, 'difficulty')
-        level = levels_query.first()
-        
-        if not level:
-            # Fallback to default level if age filtering removes it
-            level = WordSearchLevel.objects.get(level_number=level_number)
-        
-        # Get active categories
-        categories = WordSearchCategory.objects.filter(is_active=True)
-        if not categories.exists():
-            return None
-        
-        # Pick a random category
-        category = random.choice(categories)
-        
-        # Get puzzles for this level and category
-        puzzles = WordSearchPuzzle.objects.filter(
-            level=level,
-            category=category,
-            is_active=True
-        )
-        
-        if puzzles.exists():
-            # Use pre-generated puzzle
-            puzzle = random.choice(puzzles)
-            return {
-                'words': puzzle.words,
-                'grid_data': puzzle.grid_data,
-                'word_positions': puzzle.word_positions,
-                'hints': puzzle.hints,
-                'category': category.name,
-                'title': puzzle.title,
-                'grid_size': level.grid_size,
-                'time_limit': level.time_limit
-            }
-        else:
-            # Generate puzzle on the fly (with age filtering)
-            words = generate_words_for_level(level, category, user)
-            if not words:
-                return None
-            
-            grid_data, word_positions = generate_grid_data(words, level.grid_size)
-            
-            return {
-                'words': words,
-                'grid_data': grid_data,
-                'word_positions': word_positions,
-                'hints': generate_hints(words),
-                'category': category.name,
-                'title': f"{category.name} Challenge",
-                'grid_size': level.grid_size,
-                'time_limit': level.time_limit
-            }
-            
-    except WordSearchLevel.DoesNotExist:
+    # The age filter used to fall back to the same level_number, so it never
+    # changed the level served; the catalogue looks the level up directly.
+    picked = word_search_catalogue.pick(level_number)
+    if not picked:
+        return None
+    level, category, puzzle_id = picked
+    
+    # Pre-generated puzzle: one primary-key lookup
+    puzzle = None
+    if puzzle_id is not None:
+        puzzle = WordSearchPuzzle.objects.filter(pk=puzzle_id, is_active=True).values(
+            'words', 'grid_data', 'word_positions', 'hints', 'title'
+        ).first()
+    if puzzle:
+        return {
+            'words': puzzle['words'],
+            'grid_data': puzzle['grid_data'],
+            'word_positions': puzzle['word_positions'],
+            'hints': puzzle['hints'],
+            'category': category.name,
+            'title': puzzle['title'],
+            'grid_size': level.grid_size,
+            'time_limit': level.time_limit
+        }
+    
+    # Generate puzzle on the fly (with age filtering)
+    words = generate_words_for_level(level, category, user)
+    if not words:
         return None
+    
+    grid_data, word_positions, unplaced_words = generate_grid_data(words, level.grid_size)
+    # Only words that are really in the grid are given to the player
+    words = list(word_positions)
+    
+    return {
+        'words': words,
+        'grid_data': grid_data,
+        'word_positions': word_positions,
+        'unplaced_words': unplaced_words,
+        'hints': generate_hints(words),
+        'category': category.name,
+        'title': f"{category.name} Challenge",
+        'grid_size': level.grid_size,
+        'time_limit': level.time_limit
+    }
 
 def generate_words_for_level(level, category, user=None):
     """Generate appropriate words for the level and category, filtered by user age"""
-    # This would be enhanced with actual word databases
-    word_lists = {
-        'easy': ['CAT', 'DOG', 'SUN', 'MOON', 'STAR', 'FISH', 'BIRD', 'TREE', 'BOOK', 'BALL'],
-        'medium': ['APPLE', 'GRAPE', 'TIGER', 'ZEBRA', 'HAPPY', 'SMILE', 'OCEAN', 'RIVER', 'PIZZA', 'BREAD'],
-        'hard': ['DRAGON', 'CASTLE', 'ROCKET', 'PLANET', 'JUNGLE', 'FOREST', 'RAINBOW', 'DOLPHIN', 'PENGUIN', 'OCTOPUS'],
-        'expert': ['ADVENTURE', 'DISCOVERY', 'MYSTERIOUS', 'TREASURE', 'EXPLORATION', 'CHALLENGE', 'VICTORY', 'CELEBRATION']
-    }
-    
     difficulty = level.difficulty
     word_count = level.word_count
     
-    if difficulty in word_lists:
-        words = word_lists[difficulty][:word_count]
+    if difficulty in WORD_LISTS:
+        words = WORD_LISTS[difficulty][:word_count]
         return [word.upper() for word in words]
     
     return []
 
 def generate_grid_data(words, grid_size):
-    """Generate grid data and word positions"""
-    # Simplified grid generation - you can enhance this with proper algorithm
-    grid = [['' for _ in range(grid_size)] for _ in range(grid_size)]
-    word_positions = {}
-    
-    # Fill grid with random letters
-    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-    for i in range(grid_size):
-        for j in range(grid_size):
-            grid[i][j] = random.choice(letters)
-    
-    # Place words (simplified - you'd want a proper algorithm)
-    for word in words:
-        placed = False
-        attempts = 0
-        while not placed and attempts < 100:
-            direction = random.choice(['horizontal', 'vertical', 'diagonal'])
-            row = random.randint(0, grid_size - 1)
-            col = random.randint(0, grid_size - 1)
-            
-            if can_place_word(grid, word, row, col, direction, grid_size):
-                positions = place_word(grid, word, row, col, direction)
-                word_positions[word] = positions
-                placed = True
-            
-            attempts += 1
-    
-    # Flatten grid for frontend
-    flat_grid = []
-    for row in grid:
-        flat_grid.extend(row)
-    
-    return flat_grid, word_positions
-
-def can_place_word(grid, word, row, col, direction, grid_size):
-    """Check if a word can be placed at the given position"""
-    word_len = len(word)
-    
-    if direction == 'horizontal':
-        if col + word_len > grid_size:
-            return False
-        for i in range(word_len):
-            if grid[row][col + i] != '' and grid[row][col + i] != word[i]:
-                return False
-    elif direction == 'vertical':
-        if row + word_len > grid_size:
-            return False
-        for i in range(word_len):
-            if grid[row + i][col] != '' and grid[row + i][col] != word[i]:
-                return False
-    elif direction == 'diagonal':
-        if row + word_len > grid_size or col + word_len > grid_size:
-            return False
-        for i in range(word_len):
-            if grid[row + i][col + i] != '' and grid[row + i][col + i] != word[i]:
-                return False
-    
-    return True
-
-def place_word(grid, word, row, col, direction):
-    """Place a word in the grid and return its positions"""
-    positions = []
-    word_len = len(word)
-    
-    if direction == 'horizontal':
-        for i in range(word_len):
-            grid[row][col + i] = word[i]
-            positions.append(row * len(grid) + (col + i))
-    elif direction == 'vertical':
-        for i in range(word_len):
-            grid[row + i][col] = word[i]
-            positions.append((row + i) * len(grid) + col)
-    elif direction == 'diagonal':
-        for i in range(word_len):
-            grid[row + i][col + i] = word[i]
-            positions.append((row + i) * len(grid) + (col + i))
-    
-    return positions
+    """Generate grid data and word positions; see core/word_search_engine.py"""
+    puzzle = build_word_search(words, grid_size)
+    if puzzle.unplaced_words:
+        logger.info("Word search %sx%s: could not fit %s", grid_size, grid_size, puzzle.unplaced_words)
+    return puzzle.letters, puzzle.word_positions, puzzle.unplaced_words
 
 def generate_hints(words):
     """Generate hints for words"""
-    hints = {}
-    for word in words:
-        hints[word] = f"A word with {len(word)} letters"
-    return hints
+    return word_hints(words)
 
 def get_word_search_level(request):
     """Get word search puzzle for a specific level, filtered by user age"""
@@ -414,15 +321,27 @@ def get_word_search_level(request):
     if not puzzle_data:
         return JsonResponse({'error': 'Could not generate puzzle'}, status=404)
     
+    # Stored puzzles are packed; unpack them unless the client asks for the packed form
+    words = puzzle_data['words']
+    # Positions index the stored grid, which may be smaller than the level's grid_size
+    grid_size = grid_width(puzzle_data['grid_data'])
+    if request.GET.get('packed') == '1':
+        grid_data = pack_grid(puzzle_data['grid_data'])
+        word_positions = pack_positions(words, puzzle_data['word_positions'], grid_size)
+    else:
+        grid_data = unpack_grid(puzzle_data['grid_data'])
+        word_positions = unpack_positions(words, puzzle_data['word_positions'], grid_size)
+    
     return JsonResponse({
         'level_number': level_number,
-        'words': puzzle_data['words'],
-        'grid_data': puzzle_data['grid_data'],
-        'word_positions': puzzle_data['word_positions'],
+        'words': words,
+        'grid_data': grid_data,
+        'word_positions': word_positions,
+        'unplaced_words': puzzle_data.get('unplaced_words', []),
         'hints': puzzle_data['hints'],
         'category': puzzle_data['category'],
         'title': puzzle_data['title'],
-        'grid_size': puzzle_data['grid_size'],
+        'grid_size': grid_size,
         'time_limit': puzzle_data['time_limit']
     })
 
@@ -0,0 +1,123 @@
+"""
+Offline farm of pre-generated WordSearchPuzzle rows.
+
+Building a grid is pure NumPy work (see core/word_search_engine.py), so the
+grids for every (level, category) pair are built across a process pool. The
+workers never touch the database. Only the parent process reads the existing
+puzzles and writes the new ones. Grids identical to one the pair already has,
+or to one built earlier in the run, are dropped. The rest are written with
+bulk_create in batches.
+"""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .models import WordSearchCategory, WordSearchLevel, WordSearchPuzzle
+from .word_search_catalogue import word_search_catalogue
+from .word_search_engine import build_word_search, pack_grid
+
+logger = logging.getLogger(__name__)
+
+# Words per level difficulty; this would be enhanced with actual word databases
+WORD_LISTS = {
+    'easy': ['CAT', 'DOG', 'SUN', 'MOON', 'STAR', 'FISH', 'BIRD', 'TREE', 'BOOK', 'BALL'],
+    'medium': ['APPLE', 'GRAPE', 'TIGER', 'ZEBRA', 'HAPPY', 'SMILE', 'OCEAN', 'RIVER', 'PIZZA', 'BREAD'],
+    'hard': ['DRAGON', 'CASTLE', 'ROCKET', 'PLANET', 'JUNGLE', 'FOREST', 'RAINBOW', 'DOLPHIN', 'PENGUIN', 'OCTOPUS'],
+    'expert': ['ADVENTURE', 'DISCOVERY', 'MYSTERIOUS', 'TREASURE', 'EXPLORATION', 'CHALLENGE', 'VICTORY', 'CELEBRATION']
+}
+# Grids each worker task builds; small enough to spread evenly over the pool
+GRIDS_PER_TASK = 25
+
+
+def word_hints(words):
+    return {word: f"A word with {len(word)} letters" for word in words}
+
+
+def build_grids(task):
+    """
+    Worker: `count` grids for one (level, category) pair, each from a random
+    pick of `word_count` words. Returns (cells, words, packed positions) triples.
+    """
+    words, word_count, grid_size, count, seed = task
+    rng = np.random.default_rng(seed)
+    grids = []
+    for _ in range(count):
+        picked = list(rng.permutation(words)[:word_count]) if len(words) > word_count else list(words)
+        puzzle = build_word_search(picked, grid_size, seed=rng)
+        if puzzle.word_positions:
+            grids.append((puzzle.cells, puzzle.placed_words, puzzle.packed_positions))
+    return grids
+
+
+def grid_key(grid_data):
+    """The grid's letters as bytes, whichever form grid_data is stored in"""
+    return pack_grid(grid_data).encode()
+
+
+def farm_tasks(level, category, missing, seed=None):
+    words = WORD_LISTS.get(level.difficulty, [])
+    tasks = []
+    for start in range(0, max(0, missing) if words else 0, GRIDS_PER_TASK):
+        task_seed = None if seed is None else [seed, level.pk, category.pk, start]
+        tasks.append((words, level.word_count, level.grid_size, min(GRIDS_PER_TASK, missing - start), task_seed))
+    return tasks
+
+
+def farm_puzzles(target, levels=None, categories=None, workers=None, batch_size=500, seed=None):
+    """
+    Top every (level, active category) pair up to `target` active puzzles.
+    Returns the number of rows created.
+    """
+    levels = list(levels if levels is not None else WordSearchLevel.objects.all())
+    categories = list(categories if categories is not None else WordSearchCategory.objects.filter(is_active=True))
+
+    pairs = []  # [level, category, puzzles so far, grids seen]
+    tasks, owners = [], []
+    for level in levels:
+        for category in categories:
+            puzzles = WordSearchPuzzle.objects.filter(level=level, category=category)
+            have = puzzles.filter(is_active=True).count()
+            pair_tasks = farm_tasks(level, category, target - have, seed)
+            if pair_tasks:
+                seen = {grid_key(grid_data) for grid_data in puzzles.values_list('grid_data', flat=True) if grid_data}
+                pairs.append([level, category, have, seen])
+                tasks += pair_tasks
+                owners += [pairs[-1]] * len(pair_tasks)
+    if not tasks:
+        return 0
+
+    created = 0
+    pending = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for pair, grids in zip(owners, pool.map(build_grids, tasks)):
+            level, category, _, seen = pair
+            for cells, words, positions in grids:
+                if cells in seen or pair[2] >= target:
+                    continue
+                seen.add(cells)
+                pair[2] += 1
+                pending.append(WordSearchPuzzle(
+                    title=f"{category.name} Challenge {pair[2]}",
+                    category=category,
+                    level=level,
+                    words=words,
+                    grid_data=cells.decode(),
+                    word_positions=positions,
+                    hints=word_hints(words),
+                    is_active=True,
+                ))
+            if len(pending) >= batch_size:
+                created += len(WordSearchPuzzle.objects.bulk_create(pending, batch_size=batch_size))
+                pending = []
+    if pending:
+        created += len(WordSearchPuzzle.objects.bulk_create(pending, batch_size=batch_size))
+    if created:
+        # bulk_create sends no post_save, so the catalogue is refreshed here
+        word_search_catalogue.invalidate()
+
+    for level, category, count, _ in pairs:
+        if count < target:
+            logger.info(
+                "Word search level %s / %s: %s of %s puzzles (duplicate grids dropped)",
+                level.level_number, category.name, count, target,
+            )
+    return created
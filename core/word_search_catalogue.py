@@ -0,0 +1,80 @@
+"""
+Process-level catalogue of the word search levels, active categories and
+active puzzle ids per (level_number, category).
+
+Serving a puzzle used to take a level query (plus a fallback), a categories
+query, a puzzles query, and two random.choice calls that each load a whole
+queryset. With the catalogue, the level, category and puzzle id are picked
+in memory, and only the chosen puzzle row is read, by primary key.
+
+The catalogue is rebuilt in three queries after a level, category or puzzle
+is saved or deleted (see core.signals), after the puzzle farm writes, and
+after WORD_SEARCH_CATALOGUE_TTL_SECONDS. A version key in the cache carries
+invalidations to other workers that share the cache backend.
+"""
+import random
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from .models import WordSearchCategory, WordSearchLevel, WordSearchPuzzle
+
+VERSION_KEY = "word_search_catalogue_version"
+
+
+class Catalogue:
+    def __init__(self, levels, categories, puzzle_ids):
+        self.levels = levels  # level_number -> WordSearchLevel
+        self.categories = categories  # active WordSearchCategory rows
+        self.puzzle_ids = puzzle_ids  # (level_number, category_id) -> [puzzle pk, ...]
+
+    @classmethod
+    def load(cls):
+        levels = {level.level_number: level for level in WordSearchLevel.objects.all()}
+        categories = list(WordSearchCategory.objects.filter(is_active=True))
+        puzzle_ids = {}
+        rows = WordSearchPuzzle.objects.filter(
+            is_active=True, category__is_active=True,
+        ).values_list('pk', 'level__level_number', 'category_id')
+        for pk, level_number, category_id in rows:
+            puzzle_ids.setdefault((level_number, category_id), []).append(pk)
+        return cls(levels, categories, puzzle_ids)
+
+    def pick(self, level_number):
+        """(level, category, puzzle pk or None), or None when the level or categories are missing"""
+        level = self.levels.get(level_number)
+        if level is None or not self.categories:
+            return None
+        category = random.choice(self.categories)
+        ids = self.puzzle_ids.get((level_number, category.pk))
+        return level, category, random.choice(ids) if ids else None
+
+
+class WordSearchCatalogue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entry = None  # (version, loaded_at, Catalogue)
+
+    def get(self):
+        version = cache.get(VERSION_KEY, 0)
+        ttl = getattr(settings, 'WORD_SEARCH_CATALOGUE_TTL_SECONDS', 300)
+        entry = self._entry
+        if entry is None or entry[0] != version or time.monotonic() - entry[1] > ttl:
+            entry = (version, time.monotonic(), Catalogue.load())
+            with self._lock:
+                self._entry = entry
+        return entry[2]
+
+    def pick(self, level_number):
+        return self.get().pick(level_number)
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, None)
+
+
+word_search_catalogue = WordSearchCatalogue()
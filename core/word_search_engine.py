@@ -0,0 +1,188 @@
+"""
+Word-search grid engine.
+
+Words are placed on an empty grid, held as a NumPy uint8 char array where 0
+means an empty cell, before any filler letter is drawn. Every placement in
+all eight directions is checked at once against the grid. A placement is
+legal when each of its cells is empty or already holds the same letter. Legal
+placements that share more letters with words already placed are tried
+first, with random tie-breaks so puzzles vary.
+
+Longest words go first, and a depth-first search backtracks when a word has
+no legal placement. The search is bounded by SEARCH_MAX_NODES and
+SEARCH_DEADLINE_SECONDS. When every word cannot fit, the best partial layout
+found is kept and the missing words are reported, rather than silently
+dropped. Empty cells are filled with random letters only at the end.
+
+Stored puzzles use a packed form: the grid as one string of grid_size²
+letters, and the positions as one flat list of (start, direction, length)
+triples in word order. The older form, a list of letters and a dict of cell
+index lists, is still read; unpack_grid / unpack_positions return that older
+shape from either form.
+"""
+import time
+from functools import lru_cache
+from math import isqrt
+import numpy as np
+
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (-1, 1), (0, -1), (-1, 0), (-1, -1), (1, -1)]
+# Placements tried per word before backtracking further up
+CANDIDATES_PER_WORD = 12
+SEARCH_MAX_NODES = 3000
+SEARCH_DEADLINE_SECONDS = 0.5
+EMPTY = 0
+
+
+@lru_cache(maxsize=None)
+def placements(grid_size, length):
+    """(n, length) array of the flat cell indices of every in-bounds placement"""
+    rows = []
+    steps = np.arange(length)
+    for dr, dc in DIRECTIONS:
+        end_r = np.arange(grid_size)[:, None] + dr * (length - 1)
+        end_c = np.arange(grid_size)[None, :] + dc * (length - 1)
+        fits = (end_r >= 0) & (end_r < grid_size) & (end_c >= 0) & (end_c < grid_size)
+        for r, c in zip(*np.nonzero(fits)):
+            rows.append((r + dr * steps) * grid_size + (c + dc * steps))
+    if not rows:
+        return np.empty((0, length), dtype=np.intp)
+    return np.array(rows, dtype=np.intp)
+
+
+def clean_word(word):
+    return ''.join(ch for ch in str(word).upper() if 'A' <= ch <= 'Z')
+
+
+class WordSearchGrid:
+    """A finished grid: its letters, where each word sits and what could not fit"""
+
+    def __init__(self, grid_size, cells, word_positions, unplaced_words):
+        self.grid_size = grid_size
+        self.cells = cells  # bytes, one uppercase letter per cell, row by row
+        self.word_positions = word_positions  # word -> [flat cell index, ...]
+        self.unplaced_words = unplaced_words
+
+    @property
+    def letters(self):
+        return list(self.cells.decode())
+
+    @property
+    def placed_words(self):
+        return list(self.word_positions)
+
+    @property
+    def packed_positions(self):
+        return pack_positions(self.placed_words, self.word_positions, self.grid_size)
+
+
+def pack_grid(grid_data):
+    """Grid letters as one string, from the packed string or a (nested) letter list"""
+    if isinstance(grid_data, str):
+        return grid_data
+    return ''.join(''.join(cell) for cell in grid_data or ())
+
+
+def unpack_grid(grid_data):
+    """Grid letters as a flat list of one-letter strings, from either form"""
+    return list(pack_grid(grid_data))
+
+
+def grid_width(grid_data):
+    """Side of the stored square grid, which need not match its level's grid_size"""
+    return isqrt(len(pack_grid(grid_data)))
+
+
+def pack_positions(words, word_positions, grid_size):
+    """Flat [start, direction, length, ...] list, one triple per word of `words`"""
+    if isinstance(word_positions, list):
+        return word_positions
+    packed = []
+    for word in words:
+        cells = word_positions.get(word)
+        if not cells:
+            packed += [-1, 0, 0]  # not in the grid
+            continue
+        start = cells[0]
+        direction = 0
+        if len(cells) > 1:
+            row_step = cells[1] // grid_size - start // grid_size
+            direction = DIRECTIONS.index((row_step, cells[1] - start - row_step * grid_size))
+        packed += [start, direction, len(cells)]
+    return packed
+
+
+def unpack_positions(words, word_positions, grid_size):
+    """Word -> [flat cell index, ...] dict, from either form"""
+    if isinstance(word_positions, dict):
+        return word_positions
+    positions = {}
+    for word, offset in zip(words, range(0, len(word_positions), 3)):
+        start, direction, length = word_positions[offset:offset + 3]
+        if start < 0:
+            continue
+        dr, dc = DIRECTIONS[direction]
+        positions[word] = [start + (dr * grid_size + dc) * step for step in range(length)]
+    return positions
+
+
+def build_word_search(words, grid_size, seed=None):
+    """Place `words` on a `grid_size` square grid and fill the rest"""
+    rng = np.random.default_rng(seed)
+    words = list(dict.fromkeys(word for word in map(clean_word, words) if word))
+    fits_empty = [word for word in words if len(placements(grid_size, len(word)))]
+    order = sorted(fits_empty, key=len, reverse=True)
+    letters = {word: np.frombuffer(word.encode(), dtype=np.uint8) for word in order}
+
+    grid = np.zeros(grid_size * grid_size, dtype=np.uint8)
+    placed = {}
+    best = {'count': -1, 'grid': grid.copy(), 'placed': {}}
+    budget = {'nodes': 0, 'deadline': time.monotonic() + SEARCH_DEADLINE_SECONDS}
+
+    def out_of_budget():
+        return budget['nodes'] >= SEARCH_MAX_NODES or time.monotonic() > budget['deadline']
+
+    def search(index):
+        budget['nodes'] += 1
+        if index == len(order):
+            if len(placed) > best['count']:
+                best.update(count=len(placed), grid=grid.copy(), placed=dict(placed))
+            return len(placed) == len(order)
+        # Even placing every remaining word would not beat the best layout
+        if len(placed) + len(order) - index <= best['count'] or out_of_budget():
+            return False
+
+        word = order[index]
+        cells = placements(grid_size, len(word))
+        current = grid[cells]
+        matches = current == letters[word]
+        overlaps = matches.sum(axis=1)
+        legal = ((current == EMPTY) | matches).all(axis=1) & (overlaps < len(word))
+        candidates = np.flatnonzero(legal)
+        if len(candidates):
+            # Most shared letters first, ties broken at random
+            score = overlaps[candidates] + rng.random(len(candidates))
+            for candidate in candidates[np.argsort(-score)[:CANDIDATES_PER_WORD]]:
+                target = cells[candidate]
+                previous = grid[target].copy()
+                grid[target] = letters[word]
+                placed[word] = target
+                if search(index + 1):
+                    return True
+                grid[target] = previous
+                del placed[word]
+                if out_of_budget():
+                    break
+        # Leave this word out and see how many of the rest still fit
+        return search(index + 1)
+
+    if order:
+        search(0)
+
+    grid = best['grid']
+    empty = grid == EMPTY
+    grid[empty] = rng.integers(ord('A'), ord('Z') + 1, size=int(empty.sum()), dtype=np.uint8)
+    word_positions = {
+        word: best['placed'][word].tolist() for word in words if word in best['placed']
+    }
+    unplaced = [word for word in words if word not in word_positions]
+    return WordSearchGrid(grid_size, grid.tobytes(), word_positions, unplaced)